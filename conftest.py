@@ -0,0 +1 @@
+# Makes the repository root importable for the tests, the modules import each other as core.*, hardware.*, util.*
@@ -23,8 +23,8 @@ class HeaterController:
     _heaterMaxSafeRuntimeTimer = None
     _heaterHealthLastRefPointTemp = None
     # Heater timers
-    _heaterOnCycleTimer = Timer()
-    _heaterOffCycleTimer = Timer()
+    _heaterOnCycleTimer = None
+    _heaterOffCycleTimer = None
 
 
     def __init__(self, sd: SaunaDevices, ctx: SaunaContext, errorMgr: SaunaErrorMgr):
@@ -37,6 +37,8 @@ class HeaterController:
         self._heaterHealthCoolDownTimer = Timer(self._ctx.getHeaterHealthCooldownTimeMin() * 60)
         self._heaterHealthWarmUpTimer = Timer(self._ctx.getHeaterHealthWarmUpTimeMin() * 60)
         self._heaterMaxSafeRuntimeTimer = Timer(self._ctx.getHeaterMaxSafeRuntimeMin() * 60)
+        self._heaterOnCycleTimer = Timer()
+        self._heaterOffCycleTimer = Timer()
         # Initialize member variables
         self._heaterHealthLastRefPointTemp = self._sd.getHotRoomTemperature('F')
 
@@ -75,6 +77,9 @@ class HeaterController:
         # If sauna is off, ensure the heater is off.
         if self._ctx.isSaunaOff():
             self._turnHeaterOff()
+        # Do not heat based on the last known temperature while the sensor module does not respond
+        elif self._sd.isHotRoomDataStale():
+            self._turnHeaterOff()
         # Make sure sauna is not on longer than configured
         elif self._ctx.isSaunaOn() and not self._ctx.getSaunaOnTimer().isRunning():
             self._ctx.turnSaunaOff()
@@ -83,8 +88,7 @@ class HeaterController:
         elif (not self._isHeaterOn
               and tempFalling
               and not self._coolingGracePeriodTimer.isRunning()):
-                # Restart to accept any changes in configuration
-                self._coolingGracePeriodTimer.restart(self._ctx.getCoolingGracePeriodMin() * 60)
+                self._coolingGracePeriodTimer.start()
         # Turn Heater Off if temperature reached
         elif self._isHeaterOn and heatingTargetReached:
             self._turnHeaterOff()
@@ -117,6 +121,38 @@ class HeaterController:
             self._heaterHealthCoolDownTimer.start()
             self._errorMgr.eraseHeaterError()
 
+    # Switches the heater for a user command (sauna on/off, target temperature) or an expired timer right away,
+    # between the control cycles. Decides on the last reading and skips the health checks, which need a fresh
+    # reading every cycle.
+    def processCommand(self) -> None:
+        currentHotRoomTemp = self._ctx.getHotRoomTempF()
+        heatingTargetReached = currentHotRoomTemp >= self._ctx.getHotRoomTargetTempF() - self._ctx.getWarmUpHysteresisF()
+        coolingTargetReached = currentHotRoomTemp <= self._ctx.getHotRoomTargetTempF() - self._ctx.getCoolDownHysteresisF()
+        if self._ctx.isSaunaOn() and not self._ctx.getSaunaOnTimer().isRunning():
+            # Turning the sauna off wakes the loop up again to turn the heater off
+            self._ctx.turnSaunaOff()
+        elif self._isHeaterOn and (self._ctx.isSaunaOff() or heatingTargetReached
+                                   or not self._heaterOnCycleTimer.isRunning()):
+            self._turnHeaterOff()
+        elif (not self._isHeaterOn and coolingTargetReached
+              and self._ctx.isSaunaOn()
+              and not self._sd.isHotRoomDataStale()
+              and not self._coolingGracePeriodTimer.isRunning()
+              and not self._heaterOffCycleTimer.isRunning()):
+            self._turnHeaterOn()
+
+    # Applies changed heater and cooling grace settings to the timers, running timers keep their start time.
+    # Cycle periods depend on the temperature in the high temperature mode and are read at every heater switch.
+    def applySettings(self) -> None:
+        self._coolingGracePeriodTimer.setTimeInterval(self._ctx.getCoolingGracePeriodMin() * 60)
+        self._heaterHealthCoolDownTimer.setTimeInterval(self._ctx.getHeaterHealthCooldownTimeMin() * 60)
+        self._heaterHealthWarmUpTimer.setTimeInterval(self._ctx.getHeaterHealthWarmUpTimeMin() * 60)
+        self._heaterMaxSafeRuntimeTimer.setTimeInterval(self._ctx.getHeaterMaxSafeRuntimeMin() * 60)
+        if self._heaterOnCycleTimer.isRunning():
+            self._heaterOnCycleTimer.setTimeInterval(self._ctx.getHeaterCycleOnPeriodMin() * 60)
+        if self._heaterOffCycleTimer.isRunning():
+            self._heaterOffCycleTimer.setTimeInterval(self._ctx.getHeaterCycleOffPeriodMin() * 60)
+
     def _turnHeaterOff(self):
         if self._isHeaterOn:
             self._ctx.getLogger().info(f'{datetime.now()} turn heat off')
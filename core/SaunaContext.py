@@ -1,19 +1,40 @@
+import atexit
+import io
 import logging
 from typing import Any
 from configobj import ConfigObj
 import os
 import subprocess
 import secrets
+import threading
 from util.Timer import Timer
+from util.CommandTracer import CommandTracer
 
 
 class SaunaContext:
     _logger: logging.Logger = logging.getLogger('sauna-controller')
+    # Modbus Transport Default Settings: serial, tcp or rtu_over_tcp
+    _modbusTransport = 'serial'
+    _modbusTcpHost = '127.0.0.1'
+    _modbusTcpPort: int = 502
+    # Traffic capture and replay, empty - disabled
+    _modbusCaptureFile = ''
+    _modbusReplayFile = ''
+    _modbusReplaySpeed: float = 1.0
+    # Bus of every module, empty - the transport above
+    _saunaSensorsBus = ''
+    _relayModuleBus = ''
+    _fanControlModuleBus = ''
     # Modbus Serial Port Default Settings
     _modbusSerialPort = '/dev/ttyAMA0'
     _modbusSerialBaudRate: int = 9600
     _modbusSerialTimeout: float = 0.3
     _modbusSerialRetries: int = 3
+    _modbusMaxReadGap: int = 16
+    _modbusWriteReassertPeriodSec: int = 60
+    _modbusBreakerFailureThreshold: int = 3
+    _modbusBreakerInitialBackoffSec: float = 5
+    _modbusBreakerMaxBackoffSec: float = 300
     # Modbus Device IDs
     _saunaSensorsDeviceId: int = 1
     _relayModuleDeviceId: int = 2
@@ -32,6 +53,15 @@ class SaunaContext:
     _fanFaultStatusAddr: int = 14
     _fanModuleGovernorAddr: int = 32
     _fanModuleResetGovernorValue: int = 170
+    # Device Polling Default Settings, 0 - every control cycle
+    _hotRoomPollingIntervalSec: float = 0
+    _relayPollingIntervalSec: float = 0
+    _fanStatusPollingIntervalSec: float = 5
+    _fanRpmPollingIntervalSec: float = 5
+    _restingRoomPollingIntervalSec: float = 30
+    # Minimum intervals while the heater is off and while the sauna is off and the fans have stopped
+    _activePollingIntervalSec: float = 2
+    _idlePollingIntervalSec: float = 30
     # Heater Default Settings
     _hotRoomTargetTempF: int = 190
     _coolingGracePeriodMin: int = 3
@@ -66,14 +96,86 @@ class SaunaContext:
     _httpHost = '0.0.0.0'
     _httpPort: int = 8080
     _cpuWarnTempC: int = 90
+    _controlLoopPeriodSec: float = 0.5
+    _cycleProfilerEnabled: bool = True
+    _systemMetricsIntervalSec: float = 5
+    # Changes are written to sauna.ini at most this often
+    _persistDelaySec: float = 2
     _logLevel: int = logging.WARNING
     _maxSaunaOnTimeHrs: int = 6
     # Authentication Settings
     _webPassword: str = 'sauna123'
     _secretKey: str = None  # Will be generated if not set
+    # Valid ranges of the numeric settings, {(section, key): (min, max)}, checked by updateSettings(). Modbus
+    # register and coil addresses ('*_addr') are 0 to 65535.
+    _settingLimits = {
+        ('modbus', 'sensors_module_device_id'): (1, 247),
+        ('modbus', 'relay_module_device_id'): (1, 247),
+        ('modbus', 'fan_module_device_id'): (1, 247),
+        ('modbus', 'tcp_port'): (1, 65535),
+        ('modbus', 'replay_speed'): (0, 1000),
+        ('modbus', 'serial_baud_rate'): (300, 921600),
+        ('modbus', 'serial_timeout'): (0.01, 60),
+        ('modbus', 'serial_retries'): (0, 10),
+        ('modbus', 'max_read_gap'): (0, 125),
+        ('modbus', 'write_reassert_period_sec'): (0, 3600),
+        ('modbus', 'breaker_failure_threshold'): (1, 1000),
+        ('modbus', 'breaker_initial_backoff_sec'): (0, 3600),
+        ('modbus', 'breaker_max_backoff_sec'): (0, 3600),
+        ('modbus', 'fan_module_reset_governor_value'): (0, 65535),
+        ('polling', 'hot_room_interval_sec'): (0, 3600),
+        ('polling', 'relay_interval_sec'): (0, 3600),
+        ('polling', 'fan_status_interval_sec'): (0, 3600),
+        ('polling', 'fan_rpm_interval_sec'): (0, 3600),
+        ('polling', 'resting_room_interval_sec'): (0, 3600),
+        ('polling', 'active_interval_sec'): (0, 3600),
+        ('polling', 'idle_interval_sec'): (0, 3600),
+        ('hot_room_temp_control', 'target_temp_f'): (32, 260),
+        ('hot_room_temp_control', 'max_temp_f'): (32, 260),
+        ('hot_room_temp_control', 'target_temp_preset_medium'): (32, 260),
+        ('hot_room_temp_control', 'target_temp_preset_high'): (32, 260),
+        ('hot_room_temp_control', 'warm_up_hysteresis_below_target_f'): (0, 50),
+        ('hot_room_temp_control', 'cool_down_hysteresis_below_target_f'): (0, 50),
+        ('hot_room_temp_control', 'cooling_grace_period_min'): (0, 240),
+        ('heater_control', 'heater_health_warmup_time_min'): (0, 240),
+        ('heater_control', 'heater_health_cooldown_time_min'): (0, 240),
+        ('heater_control', 'heater_max_safe_runtime_min'): (1, 1440),
+        ('heater_control', 'cycle_on_period_min'): (1, 240),
+        ('heater_control', 'cycle_off_period_min'): (0, 240),
+        ('heater_control', 'high_temp_threshold_f'): (32, 260),
+        ('heater_control', 'high_temp_cycle_on_period_min'): (1, 240),
+        ('heater_control', 'high_temp_cycle_off_period_min'): (0, 240),
+        ('fan_control', 'fan_speed_pct'): (0, 100),
+        ('fan_control', 'number_of_fans'): (0, 8),
+        ('fan_control', 'running_time_after_sauna_off_hrs'): (0, 24),
+        ('display', 'display_brightness'): (0, 255),
+        ('system', 'http_port'): (1, 65535),
+        ('system', 'cpu_warn_temp_c'): (0, 120),
+        ('system', 'control_loop_period_sec'): (0.01, 60),
+        ('system', 'metrics_interval_sec'): (0.1, 3600),
+        ('system', 'persist_delay_sec'): (0, 3600),
+        ('system', 'log_level'): (0, 50),
+        ('system', 'max_sauna_on_time_hrs'): (1, 24)
+    }
     # Dependencies
     _configObj = None
     _configFileName = 'sauna.ini'
+    # Typed snapshot of the config, {(section, key): value}. It is filled on the first read of a key rather than
+    # on load, the type of a value is only known from the default its getter passes. Setters drop their keys,
+    # settings updates swap in a new dict.
+    _typedConfig: dict = None
+    _configLock: threading.Lock = None
+    # Write-behind persistence: unwritten changes, the pending write and the lock serializing the writes
+    _configDirty = False
+    _persistTimer: threading.Timer = None
+    _flushLock: threading.Lock = None
+    # Delay of the next retry after a failed write, doubled on every failure up to the max
+    _persistRetryDelaySec: float = None
+    _maxPersistRetryDelaySec: float = 300
+    # Settings update in progress on the calling thread, see updateSettings()
+    _settingsUpdate: threading.local = None
+    # Config change subscriptions, [(callback, keys, dispatcher)], replaced on every change
+    _subscribers: list = None
     # Runtime-only, not saved to config
     _isSaunaOn = False
     _isHeaterOn = False
@@ -84,24 +186,54 @@ class SaunaContext:
     _leftFanOnStatus = False
     _rightFanOnStatus = True
     _cpuTempC = 0
+    _modbusStats = None
+    _modbusCircuitBreaker = None
+    _controlLoopScheduler = None
+    _cycleProfiler = None
+    _systemMetrics: dict = {}
     # Timers
     _fanAfterSaunaOffTimer: Timer = None
     _saunaOnTimer: Timer = None
-
-    def __init__(self):
-        iniFileExists = os.path.exists(self._configFileName)
-        self._configObj = ConfigObj(self._configFileName)
-        if not iniFileExists:
+    # Set by user commands to wake up the control loop
+    _commandEvent: threading.Event = None
+    _commandTracer: CommandTracer = None
+
+    # configFileName - None keeps the default configuration in memory only, e.g. for simulations
+    def __init__(self, configFileName: str = 'sauna.ini'):
+        self._configFileName = configFileName
+        self._typedConfig = {}
+        self._configLock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._settingsUpdate = threading.local()
+        self._subscribers = []
+        iniFileExists = configFileName is not None and os.path.exists(configFileName)
+        self._configObj = ConfigObj(configFileName)
+        if configFileName is None:
+            self.setDefaultSettings()
+        elif not iniFileExists:
             self._logger.warning('File sauna.ini not found. Creating a new file with default configuration.')
             self.setDefaultSettings()
-            self.persist()
+            self._configDirty = True
+            self.flushConfig()
+        # Write the changes still pending on exit
+        if configFileName is not None:
+            atexit.register(self.flushConfig)
         # Set log level from config
         self._logger.setLevel(self.getLogLevel())
         # Initialize timers
         self._fanAfterSaunaOffTimer = Timer(round(self.getFanRunningTimeAfterSaunaOffHrs() * 60 * 60))
         self._saunaOnTimer = Timer(round(self.getMaxSaunaOnTimeHrs() * 60 * 60))
-        # Set initial brightness
-        self.setDisplayBrightness(self.getDisplayBrightness())
+        # Side effects of the settings run after the change commits, so settings updates apply them with the
+        # new values and a failed update does not apply them at all
+        self.subscribe(self._applySettings, [('system', 'max_sauna_on_time_hrs'),
+                                             ('fan_control', 'running_time_after_sauna_off_hrs'),
+                                             ('system', 'log_level'),
+                                             ('display', 'display_brightness')])
+        self._commandEvent = threading.Event()
+        self._commandTracer = CommandTracer()
+        # Set initial brightness, in-memory contexts do not run on the display
+        if configFileName is not None:
+            self.setDisplayBrightness(self.getDisplayBrightness())
 
     def getLogger(self) -> logging.Logger:
         return self._logger
@@ -111,10 +243,24 @@ class SaunaContext:
         self._configObj['modbus']['sensors_module_device_id'] = self._saunaSensorsDeviceId
         self._configObj['modbus']['relay_module_device_id'] = self._relayModuleDeviceId
         self._configObj['modbus']['fan_module_device_id'] = self._fanControlModuleDeviceId
+        self._configObj['modbus']['transport'] = self._modbusTransport
+        self._configObj['modbus']['tcp_host'] = self._modbusTcpHost
+        self._configObj['modbus']['tcp_port'] = self._modbusTcpPort
+        self._configObj['modbus']['capture_file'] = self._modbusCaptureFile
+        self._configObj['modbus']['replay_file'] = self._modbusReplayFile
+        self._configObj['modbus']['replay_speed'] = self._modbusReplaySpeed
+        self._configObj['modbus']['sensors_module_bus'] = self._saunaSensorsBus
+        self._configObj['modbus']['relay_module_bus'] = self._relayModuleBus
+        self._configObj['modbus']['fan_module_bus'] = self._fanControlModuleBus
         self._configObj['modbus']['serial_port_name'] = self._modbusSerialPort
         self._configObj['modbus']['serial_baud_rate'] = self._modbusSerialBaudRate
         self._configObj['modbus']['serial_timeout'] = self._modbusSerialTimeout
         self._configObj['modbus']['serial_retries'] = self._modbusSerialRetries
+        self._configObj['modbus']['max_read_gap'] = self._modbusMaxReadGap
+        self._configObj['modbus']['write_reassert_period_sec'] = self._modbusWriteReassertPeriodSec
+        self._configObj['modbus']['breaker_failure_threshold'] = self._modbusBreakerFailureThreshold
+        self._configObj['modbus']['breaker_initial_backoff_sec'] = self._modbusBreakerInitialBackoffSec
+        self._configObj['modbus']['breaker_max_backoff_sec'] = self._modbusBreakerMaxBackoffSec
         self._configObj['modbus']['temp_sensor_addr'] = self._tempSensorAddr
         self._configObj['modbus']['humidity_sensor_addr'] = self._humiditySensorAddr
         self._configObj['modbus']['heater_relay_coil_addr'] = self._heaterRelayCoilAddr
@@ -128,6 +274,14 @@ class SaunaContext:
         self._configObj['modbus']['fan_fault_status_addr'] = self._fanFaultStatusAddr
         self._configObj['modbus']['fan_module_governor_addr'] = self._fanModuleGovernorAddr
         self._configObj['modbus']['fan_module_reset_governor_value'] = self._fanModuleResetGovernorValue
+        self._configObj['polling'] = {}
+        self._configObj['polling']['hot_room_interval_sec'] = self._hotRoomPollingIntervalSec
+        self._configObj['polling']['relay_interval_sec'] = self._relayPollingIntervalSec
+        self._configObj['polling']['fan_status_interval_sec'] = self._fanStatusPollingIntervalSec
+        self._configObj['polling']['fan_rpm_interval_sec'] = self._fanRpmPollingIntervalSec
+        self._configObj['polling']['resting_room_interval_sec'] = self._restingRoomPollingIntervalSec
+        self._configObj['polling']['active_interval_sec'] = self._activePollingIntervalSec
+        self._configObj['polling']['idle_interval_sec'] = self._idlePollingIntervalSec
         self._configObj['hot_room_temp_control'] = {}
         self._configObj['hot_room_temp_control']['target_temp_f'] = self._hotRoomTargetTempF
         self._configObj['hot_room_temp_control']['cooling_grace_period_min'] = self._coolingGracePeriodMin
@@ -164,40 +318,209 @@ class SaunaContext:
         self._configObj['system']['http_host'] = self._httpHost
         self._configObj['system']['http_port'] = self._httpPort
         self._configObj['system']['cpu_warn_temp_c'] = self._cpuWarnTempC
+        self._configObj['system']['control_loop_period_sec'] = self._controlLoopPeriodSec
+        self._configObj['system']['cycle_profiler_enabled'] = self._cycleProfilerEnabled
+        self._configObj['system']['metrics_interval_sec'] = self._systemMetricsIntervalSec
+        self._configObj['system']['persist_delay_sec'] = self._persistDelaySec
         self._configObj['system']['log_level'] = self._logLevel
         self._configObj['system']['max_sauna_on_time_hrs'] = self._maxSaunaOnTimeHrs
         self._configObj['system']['web_password'] = self._webPassword
         self._configObj['system']['secret_key'] = secrets.token_hex(32)
+        with self._configLock:
+            self._typedConfig.clear()
 
+    # Schedules writing the changes to sauna.ini. Changes made within persist_delay_sec are written at once,
+    # so dragging a slider does not rewrite the file on every step and setters never wait for the disk.
     def persist(self):
-        self._configObj.write()
         self._logger.setLevel(self.getLogLevel())
+        if self._configFileName is None:
+            return
+        delaySec = self.getPersistDelaySec()
+        with self._configLock:
+            self._configDirty = True
+            self._schedulePersist(delaySec)
+
+    # Call with _configLock held
+    def _schedulePersist(self, delaySec: float) -> None:
+        if self._persistTimer is None:
+            self._persistTimer = threading.Timer(delaySec, self.flushConfig)
+            self._persistTimer.daemon = True
+            self._persistTimer.start()
+
+    # Writes the pending changes to sauna.ini right away. The file is replaced atomically, so a power cut
+    # leaves either the old or the new configuration, never a truncated one. A failed write is retried with
+    # a growing delay until it succeeds.
+    def flushConfig(self) -> None:
+        with self._flushLock:
+            with self._configLock:
+                if self._persistTimer is not None:
+                    self._persistTimer.cancel()
+                    self._persistTimer = None
+                if not self._configDirty:
+                    return
+                self._configDirty = False
+                output = io.BytesIO()
+                self._configObj.write(output)
+            tempFileName = self._configFileName + '.tmp'
+            try:
+                with open(tempFileName, 'wb') as file:
+                    file.write(output.getvalue())
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tempFileName, self._configFileName)
+                # Make the rename itself durable
+                dirFd = os.open(os.path.dirname(os.path.abspath(self._configFileName)), os.O_RDONLY)
+                try:
+                    os.fsync(dirFd)
+                finally:
+                    os.close(dirFd)
+            except OSError as e:
+                retryDelaySec = min(self._maxPersistRetryDelaySec, self._persistRetryDelaySec * 2) \
+                    if self._persistRetryDelaySec else self.getPersistDelaySec()
+                self._logger.error(f'Failed to write {self._configFileName}, retrying in {retryDelaySec} s: {e}')
+                with self._configLock:
+                    self._configDirty = True
+                    self._persistRetryDelaySec = retryDelaySec
+                    self._schedulePersist(retryDelaySec)
+                return
+            self._persistRetryDelaySec = None
 
     # ----------------------- Modbus configuration attributes --------------------------
 
+    # Call with _configLock held, the reader threads add missing sections too
     def _initSection(self, section: str):
         if section not in self._configObj:
             self._configObj[section] = {}
 
+    # Getters run on the control loop, UI and web server threads. A value is parsed by the type of the default
+    # on the first read only, later reads return the parsed value from the snapshot until the key is set again.
+    # A missing key is set to the default.
     def _get(self, section: str, key: str, default: Any) -> Any:
         try:
-            if type(default) == float:
-                return self._configObj[section].as_float(key)
-            elif type(default) == int:
-                return self._configObj[section].as_int(key)
-            elif type(default) == bool:
-                return self._configObj[section].as_bool(key)
-            elif type(default) == str:
-                return self._configObj[section][key]
+            return self._typedConfig[(section, key)]
+        except KeyError:
+            pass
+        try:
+            with self._configLock:
+                value = self._parse(section, key, default)
+                if value is not None:
+                    self._typedConfig[(section, key)] = value
+                return value
         except KeyError:
-            self._initSection(section)
             self._set(section, key, default)
             return default
 
+    def _parse(self, section: str, key: str, default: Any) -> Any:
+        if type(default) == float:
+            return self._configObj[section].as_float(key)
+        elif type(default) == int:
+            return self._configObj[section].as_int(key)
+        elif type(default) == bool:
+            return self._configObj[section].as_bool(key)
+        elif type(default) == str:
+            return self._configObj[section][key]
+
     def _set(self, section: str, key: str, value: Any) -> None:
-        self._initSection(section)
-        self._configObj[section][key] = value
+        changes = getattr(self._settingsUpdate, 'changes', None)
+        if changes is not None:
+            changes[(section, key)] = value
+            return
+        with self._configLock:
+            self._initSection(section)
+            self._configObj[section][key] = value
+            self._typedConfig.pop((section, key), None)
         self.persist()
+        self._publish({(section, key)})
+
+    # Applies {setterName: value} as a unit, e.g. {'setTempSensorAddr': 1, 'setHumiditySensorAddr': 0}.
+    # The setters run in the given order, their config changes are collected and applied at once, so other
+    # threads never see some of them only, and are persisted with one write. All values are validated before
+    # any is applied. User commands and side effects of the settings (timers, log level, display brightness)
+    # run after the changes are applied. If a setter fails or a value is invalid, nothing is applied and the
+    # error is raised. Getters return the values before the update until it ends.
+    def updateSettings(self, changes: dict) -> None:
+        for name in changes:
+            if not name.startswith('set') or not callable(getattr(self, name, None)):
+                raise ValueError(f'Unknown setting {name}')
+        if getattr(self._settingsUpdate, 'changes', None) is not None:
+            raise RuntimeError('Settings update already in progress')
+        self._settingsUpdate.changes = {}
+        self._settingsUpdate.commands = []
+        try:
+            for name, value in changes.items():
+                getattr(self, name)(value)
+            configChanges = self._settingsUpdate.changes
+            commands = self._settingsUpdate.commands
+        finally:
+            self._settingsUpdate.changes = None
+            self._settingsUpdate.commands = None
+        self._validateSettings(configChanges)
+        with self._configLock:
+            for (section, key), value in configChanges.items():
+                self._initSection(section)
+                self._configObj[section][key] = value
+            # Replaced at once, readers see either all old or all new values
+            self._typedConfig = {cacheKey: value for cacheKey, value in self._typedConfig.items()
+                                 if cacheKey not in configChanges}
+        if configChanges:
+            self.persist()
+            self._publish(set(configChanges))
+        for commandType in dict.fromkeys(commands):
+            self.notifyCommand(commandType)
+
+    # Calls callback(changedKeys) with the set of (section, key) changed after they are applied, once per
+    # setter or settings update. keys lists the sections and (section, key) to watch, None - all.
+    # dispatcher(function) runs the call on the subscriber's thread, e.g. with Kivy's Clock or the control
+    # loop queue, None - on the thread changing the config. Returns the subscription to unsubscribe.
+    def subscribe(self, callback, keys: list = None, dispatcher=None) -> tuple:
+        subscription = (callback, set(keys) if keys else None, dispatcher)
+        with self._configLock:
+            self._subscribers = self._subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: tuple) -> None:
+        with self._configLock:
+            self._subscribers = [item for item in self._subscribers if item is not subscription]
+
+    def _applySettings(self, changedKeys: set) -> None:
+        if ('fan_control', 'running_time_after_sauna_off_hrs') in changedKeys:
+            self._fanAfterSaunaOffTimer.setTimeInterval(self.getFanRunningTimeAfterSaunaOffHrs() * 60 * 60)
+        if ('system', 'max_sauna_on_time_hrs') in changedKeys:
+            self._saunaOnTimer.setTimeInterval(round(self.getMaxSaunaOnTimeHrs() * 60 * 60))
+        if ('system', 'log_level') in changedKeys:
+            self._logger.setLevel(self.getLogLevel())
+        # In-memory contexts do not run on the display
+        if ('display', 'display_brightness') in changedKeys and self._configFileName is not None:
+            subprocess.getstatusoutput(f'echo {self.getDisplayBrightness()} > {self.getDisplayDeviceBrightnessPath()}')
+
+    # Raises ValueError if a value of {(section, key): value} is out of its range in _settingLimits or a
+    # target temperature is above the max hot room temperature after the changes
+    def _validateSettings(self, changes: dict) -> None:
+        for (section, key), value in changes.items():
+            limits = (0, 65535) if key.endswith('_addr') else self._settingLimits.get((section, key))
+            if limits is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not limits[0] <= value <= limits[1]:
+                raise ValueError(f'{section} {key} must be a number from {limits[0]} to {limits[1]}, got {value!r}')
+        maxTempF = changes.get(('hot_room_temp_control', 'max_temp_f'), self.getHotRoomMaxTempF())
+        for key in ('target_temp_f', 'target_temp_preset_medium', 'target_temp_preset_high'):
+            tempF = changes.get(('hot_room_temp_control', key))
+            if tempF is not None and tempF > maxTempF:
+                raise ValueError(f'hot_room_temp_control {key} {tempF} is above the max temperature {maxTempF}')
+
+    def _publish(self, changedKeys: set) -> None:
+        for callback, keys, dispatcher in self._subscribers:
+            matching = changedKeys if keys is None else {changedKey for changedKey in changedKeys
+                                                         if changedKey in keys or changedKey[0] in keys}
+            if not matching:
+                continue
+            if dispatcher:
+                dispatcher(lambda callback=callback, matching=matching: callback(matching))
+                continue
+            try:
+                callback(matching)
+            except Exception as e:
+                self._logger.error(f'Config change subscriber failed: {e}')
 
     # ------------------------ Modbus Configuration -----------------------
 
@@ -219,6 +542,68 @@ class SaunaContext:
     def setFanControlModuleDeviceId(self, fanControlModuleDeviceId: int) -> None:
         self._set('modbus', 'fan_module_device_id', fanControlModuleDeviceId)
 
+    # serial - local RS485 port, tcp - Modbus TCP gateway, rtu_over_tcp - RS485 gateway forwarding raw RTU frames,
+    # replay - answers from a traffic capture
+    def getModbusTransport(self) -> str:
+        return self._get('modbus', 'transport', self._modbusTransport)
+
+    def setModbusTransport(self, transport: str) -> None:
+        self._set('modbus', 'transport', transport)
+
+    def getModbusTcpHost(self) -> str:
+        return self._get('modbus', 'tcp_host', self._modbusTcpHost)
+
+    def setModbusTcpHost(self, host: str) -> None:
+        self._set('modbus', 'tcp_host', host)
+
+    def getModbusTcpPort(self) -> int:
+        return self._get('modbus', 'tcp_port', self._modbusTcpPort)
+
+    def setModbusTcpPort(self, port: int) -> None:
+        self._set('modbus', 'tcp_port', port)
+
+    # Every Modbus request and response is appended to this file, empty - no capture
+    def getModbusCaptureFile(self) -> str:
+        return self._get('modbus', 'capture_file', self._modbusCaptureFile)
+
+    def setModbusCaptureFile(self, fileName: str) -> None:
+        self._set('modbus', 'capture_file', fileName)
+
+    # Capture answering the requests with transport = replay
+    def getModbusReplayFile(self) -> str:
+        return self._get('modbus', 'replay_file', self._modbusReplayFile)
+
+    def setModbusReplayFile(self, fileName: str) -> None:
+        self._set('modbus', 'replay_file', fileName)
+
+    # 1 - original pace, 10 - ten times faster, 0 - as fast as possible
+    def getModbusReplaySpeed(self) -> float:
+        return self._get('modbus', 'replay_speed', self._modbusReplaySpeed)
+
+    def setModbusReplaySpeed(self, speed: float) -> None:
+        self._set('modbus', 'replay_speed', speed)
+
+    # Buses let modules on separate serial ports or gateways be polled concurrently. Empty - the transport
+    # configured above, a serial port like /dev/ttyAMA2, tcp://host:port or rtu_over_tcp://host:port.
+    # Slave IDs must be unique across all buses.
+    def getSaunaSensorsBus(self) -> str:
+        return self._get('modbus', 'sensors_module_bus', self._saunaSensorsBus)
+
+    def setSaunaSensorsBus(self, busUrl: str) -> None:
+        self._set('modbus', 'sensors_module_bus', busUrl)
+
+    def getRelayModuleBus(self) -> str:
+        return self._get('modbus', 'relay_module_bus', self._relayModuleBus)
+
+    def setRelayModuleBus(self, busUrl: str) -> None:
+        self._set('modbus', 'relay_module_bus', busUrl)
+
+    def getFanControlModuleBus(self) -> str:
+        return self._get('modbus', 'fan_module_bus', self._fanControlModuleBus)
+
+    def setFanControlModuleBus(self, busUrl: str) -> None:
+        self._set('modbus', 'fan_module_bus', busUrl)
+
     def getModbusSerialPort(self) -> str:
         return self._get('modbus', 'serial_port_name', self._modbusSerialPort)
 
@@ -243,6 +628,40 @@ class SaunaContext:
     def setModbusSerialRetries(self, modbus_serial_retries: int) -> None:
         self._set('modbus', 'serial_retries', modbus_serial_retries)
 
+    # Max number of unused registers read along to combine register reads into a single request
+    def getModbusMaxReadGap(self) -> int:
+        return self._get('modbus', 'max_read_gap', self._modbusMaxReadGap)
+
+    def setModbusMaxReadGap(self, maxReadGap: int) -> None:
+        self._set('modbus', 'max_read_gap', maxReadGap)
+
+    # Unchanged register and coil values are written to the devices again after this period, 0 - on every write
+    def getModbusWriteReassertPeriodSec(self) -> int:
+        return self._get('modbus', 'write_reassert_period_sec', self._modbusWriteReassertPeriodSec)
+
+    def setModbusWriteReassertPeriodSec(self, periodSec: int) -> None:
+        self._set('modbus', 'write_reassert_period_sec', periodSec)
+
+    # Requests to a device are suspended after this many consecutive failed attempts
+    def getModbusBreakerFailureThreshold(self) -> int:
+        return self._get('modbus', 'breaker_failure_threshold', self._modbusBreakerFailureThreshold)
+
+    def setModbusBreakerFailureThreshold(self, failureThreshold: int) -> None:
+        self._set('modbus', 'breaker_failure_threshold', failureThreshold)
+
+    # Suspended device is probed again after this period, doubled after every failed probe
+    def getModbusBreakerInitialBackoffSec(self) -> float:
+        return self._get('modbus', 'breaker_initial_backoff_sec', self._modbusBreakerInitialBackoffSec)
+
+    def setModbusBreakerInitialBackoffSec(self, backoffSec: float) -> None:
+        self._set('modbus', 'breaker_initial_backoff_sec', backoffSec)
+
+    def getModbusBreakerMaxBackoffSec(self) -> float:
+        return self._get('modbus', 'breaker_max_backoff_sec', self._modbusBreakerMaxBackoffSec)
+
+    def setModbusBreakerMaxBackoffSec(self, backoffSec: float) -> None:
+        self._set('modbus', 'breaker_max_backoff_sec', backoffSec)
+
     def getTempSensorAddr(self) -> int:
         return self._get('modbus', 'temp_sensor_addr', self._tempSensorAddr)
 
@@ -303,6 +722,10 @@ class SaunaContext:
     def setNumberOfFansAddr(self, addr: int) -> None:
         self._set('modbus', 'number_of_fans_addr', addr)
 
+    # Fan speed registers follow the number of fans register: +1 - fan 1, +2 - fan 2, etc.
+    def getFanSpeedRpmAddr(self, fanId: int) -> int:
+        return self.getNumberOfFansAddr() + fanId
+
     def getFanFaultStatusAddr(self) -> int:
         return self._get('modbus', 'fan_fault_status_addr', self._fanFaultStatusAddr)
 
@@ -321,6 +744,52 @@ class SaunaContext:
     def setFanModuleResetGovernorValue(self, value: int) -> None:
         self._set('modbus', 'fan_module_reset_governor_value', value)
 
+    # ----------------------- Device Polling attributes --------------------------
+
+    def getHotRoomPollingIntervalSec(self) -> float:
+        return self._get('polling', 'hot_room_interval_sec', self._hotRoomPollingIntervalSec)
+
+    def setHotRoomPollingIntervalSec(self, intervalSec: float) -> None:
+        self._set('polling', 'hot_room_interval_sec', intervalSec)
+
+    def getRelayPollingIntervalSec(self) -> float:
+        return self._get('polling', 'relay_interval_sec', self._relayPollingIntervalSec)
+
+    def setRelayPollingIntervalSec(self, intervalSec: float) -> None:
+        self._set('polling', 'relay_interval_sec', intervalSec)
+
+    def getFanStatusPollingIntervalSec(self) -> float:
+        return self._get('polling', 'fan_status_interval_sec', self._fanStatusPollingIntervalSec)
+
+    def setFanStatusPollingIntervalSec(self, intervalSec: float) -> None:
+        self._set('polling', 'fan_status_interval_sec', intervalSec)
+
+    def getFanRpmPollingIntervalSec(self) -> float:
+        return self._get('polling', 'fan_rpm_interval_sec', self._fanRpmPollingIntervalSec)
+
+    def setFanRpmPollingIntervalSec(self, intervalSec: float) -> None:
+        self._set('polling', 'fan_rpm_interval_sec', intervalSec)
+
+    def getRestingRoomPollingIntervalSec(self) -> float:
+        return self._get('polling', 'resting_room_interval_sec', self._restingRoomPollingIntervalSec)
+
+    def setRestingRoomPollingIntervalSec(self, intervalSec: float) -> None:
+        self._set('polling', 'resting_room_interval_sec', intervalSec)
+
+    # All signals are polled at most this often while the heater is off
+    def getActivePollingIntervalSec(self) -> float:
+        return self._get('polling', 'active_interval_sec', self._activePollingIntervalSec)
+
+    def setActivePollingIntervalSec(self, intervalSec: float) -> None:
+        self._set('polling', 'active_interval_sec', intervalSec)
+
+    # All signals are polled at most this often while the sauna is off and the fans have stopped
+    def getIdlePollingIntervalSec(self) -> float:
+        return self._get('polling', 'idle_interval_sec', self._idlePollingIntervalSec)
+
+    def setIdlePollingIntervalSec(self, intervalSec: float) -> None:
+        self._set('polling', 'idle_interval_sec', intervalSec)
+
     # ----------------------- Hot Room Temp Control attributes --------------------------
 
     def getHotRoomTargetTempF(self) -> int:
@@ -328,6 +797,7 @@ class SaunaContext:
 
     def setHotRoomTargetTempF(self, targetTemperatureF: int) -> None:
         self._set('hot_room_temp_control', 'target_temp_f', targetTemperatureF)
+        self.notifyCommand('target_temp')
 
     def getCoolingGracePeriodMin(self) -> int:
         return self._get('hot_room_temp_control', 'cooling_grace_period_min', self._coolingGracePeriodMin)
@@ -442,6 +912,7 @@ class SaunaContext:
 
     def setFanSpeedPct(self, fanSpeedPct: int) -> None:
         self._set('fan_control', 'fan_speed_pct', fanSpeedPct)
+        self.notifyCommand('fan_speed')
 
     def getNumberOfFans(self) -> int:
         return self._get('fan_control', 'number_of_fans', self._numberOfFans)
@@ -454,19 +925,20 @@ class SaunaContext:
 
     def setRightFanEnabled(self, status: bool) -> None:
         self._set('fan_control', 'right_fan_enabled', status)
+        self.notifyCommand('right_fan')
 
     def isLeftFanEnabled(self) -> bool:
         return self._get('fan_control', 'left_fan_enabled', self._leftFanOnStatus)
 
     def setLeftFanEnabled(self, status: bool) -> None:
         self._set('fan_control', 'left_fan_enabled', status)
+        self.notifyCommand('left_fan')
 
     def getFanRunningTimeAfterSaunaOffHrs(self) -> float:
         return self._get('fan_control', 'running_time_after_sauna_off_hrs', self._fanRunningTimeAfterSaunaOffHrs)
 
     def setFanRunningTimeAfterSaunaOffHrs(self, hours: float) -> None:
         self._set('fan_control', 'running_time_after_sauna_off_hrs', hours)
-        self._fanAfterSaunaOffTimer.setTimeInterval(self.getFanRunningTimeAfterSaunaOffHrs() * 60 * 60)
 
     # ----------------------- Display attributes --------------------------
 
@@ -505,7 +977,6 @@ class SaunaContext:
 
     def setDisplayBrightness(self, brightness: int) -> None:
         self._set('display', 'display_brightness', brightness)
-        subprocess.getstatusoutput(f'echo {brightness} > {self.getDisplayDeviceBrightnessPath()}')
 
 
     # -------------------------- System Settings --------------------------------
@@ -528,19 +999,44 @@ class SaunaContext:
     def setCpuWarnTempC(self, temp: int) -> None:
         self._set('system', 'cpu_warn_temp_c', temp)
 
+    # The sauna control loop starts a cycle this often
+    def getControlLoopPeriodSec(self) -> float:
+        return self._get('system', 'control_loop_period_sec', self._controlLoopPeriodSec)
+
+    def setControlLoopPeriodSec(self, periodSec: float) -> None:
+        self._set('system', 'control_loop_period_sec', periodSec)
+
+    # Times the control cycle stages and their Modbus calls
+    def isCycleProfilerEnabled(self) -> bool:
+        return self._get('system', 'cycle_profiler_enabled', self._cycleProfilerEnabled)
+
+    def setCycleProfilerEnabled(self, enabled: bool) -> None:
+        self._set('system', 'cycle_profiler_enabled', enabled)
+
+    # CPU temperature, load and memory are collected this often
+    def getSystemMetricsIntervalSec(self) -> float:
+        return self._get('system', 'metrics_interval_sec', self._systemMetricsIntervalSec)
+
+    def setSystemMetricsIntervalSec(self, intervalSec: float) -> None:
+        self._set('system', 'metrics_interval_sec', intervalSec)
+
+    def getPersistDelaySec(self) -> float:
+        return self._get('system', 'persist_delay_sec', self._persistDelaySec)
+
+    def setPersistDelaySec(self, delaySec: float) -> None:
+        self._set('system', 'persist_delay_sec', delaySec)
+
     def getLogLevel(self) -> int:
         return self._get('system', 'log_level', self._logLevel)
 
     def setLogLevel(self, level: int) -> None:
         self._set('system', 'log_level', level)
-        self._logger.setLevel(level)
 
     def getMaxSaunaOnTimeHrs(self) -> int:
         return self._get('system', 'max_sauna_on_time_hrs', self._maxSaunaOnTimeHrs)
 
     def setMaxSaunaOnTimeHrs(self, time: int) -> None:
         self._set('system', 'max_sauna_on_time_hrs', time)
-        self._saunaOnTimer.setTimeInterval(round(self.getMaxSaunaOnTimeHrs() * 60 * 60))
 
     def getWebPassword(self) -> str:
         return self._get('system', 'web_password', self._webPassword)
@@ -572,12 +1068,12 @@ class SaunaContext:
         if  self._isSaunaOn:
             self._fanAfterSaunaOffTimer.stop()
             self._saunaOnTimer.start()
-            if self.getHotRoomLightAutoOnOff():
-                self.setHotRoomLightOn()
         else:
             self._fanAfterSaunaOffTimer.start()
-            if self.getHotRoomLightAutoOnOff():
-                self.setHotRoomLightOff()
+        # The light follows the sauna as part of the same command
+        if self.getHotRoomLightAutoOnOff():
+            self._hotRoomLightOn = state
+        self.notifyCommand('sauna_on' if state else 'sauna_off')
 
     def isHotRoomLightOn(self) -> bool:
         return self._hotRoomLightOn
@@ -593,6 +1089,46 @@ class SaunaContext:
 
     def setHotRoomLightOnOff(self, state: bool):
         self._hotRoomLightOn = state
+        self.notifyCommand('light_on' if state else 'light_off')
+
+    # Wakes up the control loop to switch the relays right away instead of at the next cycle.
+    # Returns the command ID for tracing, None within a settings update.
+    def notifyCommand(self, commandType: str) -> int:
+        commands = getattr(self._settingsUpdate, 'commands', None)
+        if commands is not None:
+            # Notified when the settings update is applied
+            commands.append(commandType)
+            return None
+        commandId = self._commandTracer.begin(commandType, self._getCommandTargets(commandType))
+        self._commandEvent.set()
+        return commandId
+
+    # Returns the (device ID, address) pairs a user command may write, None if it may write any
+    def _getCommandTargets(self, commandType: str) -> list:
+        relayModuleId = self.getRelayModuleDeviceId()
+        heater = (relayModuleId, self.getHeaterRelayCoilAddr())
+        light = (relayModuleId, self.getHotRoomLightCoilAddr())
+        rightFan = (relayModuleId, self.getRightFanRelayCoilAddr())
+        leftFan = (relayModuleId, self.getLeftFanRelayCoilAddr())
+        targets = {
+            'target_temp': [heater],
+            'fan_speed': [(self.getFanControlModuleDeviceId(), self.getFanSpeedAddr())],
+            'right_fan': [rightFan],
+            'left_fan': [leftFan],
+            'sauna_on': [heater, light, rightFan, leftFan],
+            'sauna_off': [heater, light, rightFan, leftFan],
+            'light_on': [light],
+            'light_off': [light]
+        }
+        return targets.get(commandType)
+
+    # Set while a user command waits for the control loop
+    def getCommandEvent(self) -> threading.Event:
+        return self._commandEvent
+
+    # Latencies of the user commands from issue to the relay or register write
+    def getCommandTracer(self) -> CommandTracer:
+        return self._commandTracer
 
     def getSaunaOnTimer(self) -> Timer:
         return self._saunaOnTimer
@@ -639,4 +1175,39 @@ class SaunaContext:
     def setCpuTemp(self, temp: float) -> None:
         self._cpuTempC = temp
 
+    # CPU, memory and throttling metrics of the last collection
+    def getSystemMetrics(self) -> dict:
+        return self._systemMetrics
+
+    def setSystemMetrics(self, metrics: dict) -> None:
+        self._systemMetrics = metrics
+
+    # Modbus request counts and latencies, None until the devices have been initialized
+    def getModbusStats(self):
+        return self._modbusStats
+
+    def setModbusStats(self, stats) -> None:
+        self._modbusStats = stats
+
+    # Modbus devices with suspended requests, None until the devices have been initialized
+    def getModbusCircuitBreaker(self):
+        return self._modbusCircuitBreaker
+
+    def setModbusCircuitBreaker(self, breaker) -> None:
+        self._modbusCircuitBreaker = breaker
+
+    # Control loop cycle timing, None until the control loop has been started
+    def getControlLoopScheduler(self):
+        return self._controlLoopScheduler
+
+    def setControlLoopScheduler(self, scheduler) -> None:
+        self._controlLoopScheduler = scheduler
+
+    # Control cycle stage timings, None until the controller has been initialized
+    def getCycleProfiler(self):
+        return self._cycleProfiler
+
+    def setCycleProfiler(self, profiler) -> None:
+        self._cycleProfiler = profiler
+
 
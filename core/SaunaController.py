@@ -1,11 +1,15 @@
 import atexit
+import queue
 import threading
-import re, subprocess
 
 from core.HeaterController import HeaterController
 from core.SaunaErrorMgr import SaunaErrorMgr
 from core.SaunaContext import SaunaContext
 from hardware.SaunaDevices import SaunaDevices
+from hardware.SystemMetricsCollector import SystemMetricsCollector
+from util.LoopScheduler import LoopScheduler
+from util.CycleProfiler import CycleProfiler
+from util.Clock import Clock
 
 
 class SaunaController:
@@ -14,16 +18,38 @@ class SaunaController:
     _errorMgr : SaunaErrorMgr = None
     _sd : SaunaDevices = None
     _hc : HeaterController = None
+    _loopScheduler : LoopScheduler = None
+    _profiler : CycleProfiler = None
+    _metricsCollector : SystemMetricsCollector = None
+    # Calls to run on the control loop thread, e.g. config change callbacks
+    _pendingCalls : queue.SimpleQueue = None
+    _configSubscription : tuple = None
 
     # Is the app in the exiting process
     _isOnExit = False
 
-    def __init__(self, ctx: SaunaContext, errorMgr: SaunaErrorMgr):
+    # sd - devices to control, e.g. simulated ones, None - the Modbus devices
+    def __init__(self, ctx: SaunaContext, errorMgr: SaunaErrorMgr, sd: SaunaDevices = None):
         # Initialize dependencies/classes
         self._ctx = ctx
         self._errorMgr = errorMgr
-        self._sd = SaunaDevices(self._ctx, self._errorMgr)
+        # Created ahead of the devices, they record their Modbus calls in it
+        self._profiler = CycleProfiler(self._ctx.isCycleProfilerEnabled())
+        self._ctx.setCycleProfiler(self._profiler)
+        self._sd = sd if sd else SaunaDevices(self._ctx, self._errorMgr)
         self._hc = HeaterController(self._sd, self._ctx, self._errorMgr)
+        self._metricsCollector = SystemMetricsCollector(self._ctx.getSystemMetricsIntervalSec())
+        self._loopScheduler = LoopScheduler(self._ctx.getControlLoopPeriodSec())
+        self._ctx.setControlLoopScheduler(self._loopScheduler)
+        # Apply config changes made on the UI and web server threads between the cycles
+        self._pendingCalls = queue.SimpleQueue()
+        self._configSubscription = self._ctx.subscribe(self._onConfigChange,
+                                                       [('system', 'control_loop_period_sec'),
+                                                        ('system', 'cycle_profiler_enabled'),
+                                                        ('system', 'metrics_interval_sec'),
+                                                        ('hot_room_temp_control', 'cooling_grace_period_min'),
+                                                        'heater_control'],
+                                                       self._callInControlLoop)
         # Ensure safe exit
         atexit.register(self._onExit)
 
@@ -31,6 +57,13 @@ class SaunaController:
         self._isOnExit = True
         self._ctx.turnSaunaOff()
 
+    # Releases the exit handler, the config subscription and the metrics files of a controller that ends
+    # before the process does, e.g. in a simulation. The loop must not run afterwards.
+    def close(self) -> None:
+        atexit.unregister(self._onExit)
+        self._ctx.unsubscribe(self._configSubscription)
+        self._metricsCollector.close()
+
     # ----------------------------------- Sauna Controller Run Methods ------------------------------------
 
     def run(self):
@@ -40,15 +73,85 @@ class SaunaController:
 
     def _run(self):
         while True:
-            if self._isOnExit:
-                self._sd.turnHeaterOff()
-                self._sd.turnLeftFanOff()
-                self._sd.turnRightFanOff()
-            else:
-                self._hc.processHeaterControl()
-                self._processFanControl()
-                self._processHotRoomLight()
-                self._processSystemHealth()
+            try:
+                self.runCycle()
+            except Exception as e:
+                self._onCycleFailed(e)
+
+    # Keeps the control loop alive after an unexpected error in a cycle. The heater is switched off as the
+    # safe state and the next cycle runs after one loop period.
+    def _onCycleFailed(self, exception: Exception) -> None:
+        self._ctx.getLogger().exception('Control cycle failed')
+        self._errorMgr.raiseCriticalError(f'Control cycle failed: {exception}')
+        try:
+            self._sd.turnHeaterOff()
+            self._sd.flushRelays()
+        except Exception as e:
+            self._ctx.getLogger().error(f'Failed to turn the heater off: {e}')
+        Clock.getDefault().sleep(self._ctx.getControlLoopPeriodSec())
+
+    # Runs one control cycle, then waits until the next one is due and applies user commands and expired
+    # timers in the meantime
+    def runCycle(self):
+        self._runPendingCalls()
+        if self._isOnExit:
+            self._sd.turnHeaterOff()
+            self._sd.turnLeftFanOff()
+            self._sd.turnRightFanOff()
+            self._sd.flushRelays()
+        else:
+            # Read all sensor and fan module registers and relay states for this cycle at once
+            self._profiler.runStage('refresh_registers', self._sd.refreshRegisters)
+            self._profiler.runStage('refresh_relays', self._sd.refreshRelays)
+            self._profiler.runStage('heater_control', self._hc.processHeaterControl)
+            # Switch the heater right away, ahead of the fan module reads still queued on the bus
+            self._profiler.runStage('flush_relays', self._sd.flushRelays)
+            self._profiler.runStage('fan_control', self._processFanControl)
+            self._profiler.runStage('hot_room_light', self._processHotRoomLight)
+            # Switch all fan and light relays changed during this cycle at once
+            self._profiler.runStage('flush_relays', self._sd.flushRelays)
+            self._profiler.runStage('system_health', self._processSystemHealth)
+        # Sleep until the next cycle is due. User commands, config changes and expiring timers wake the loop up
+        # and are applied right away.
+        while self._loopScheduler.waitForNextCycle(self._ctx.getCommandEvent(),
+                                                   Clock.getDefault().timers.getNextDeadline()):
+            self._runPendingCalls()
+            if not self._isOnExit:
+                self._profiler.runStage('command', self._processCommand)
+
+    # Runs function on the control loop thread before the next cycle or command pass
+    def _callInControlLoop(self, function) -> None:
+        self._pendingCalls.put(function)
+        self._ctx.getCommandEvent().set()
+
+    def _runPendingCalls(self) -> None:
+        while True:
+            try:
+                function = self._pendingCalls.get_nowait()
+            except queue.Empty:
+                return
+            function()
+
+    def _onConfigChange(self, changedKeys: set) -> None:
+        if ('system', 'control_loop_period_sec') in changedKeys:
+            self._loopScheduler.setPeriod(self._ctx.getControlLoopPeriodSec())
+        if ('system', 'cycle_profiler_enabled') in changedKeys:
+            self._profiler.enabled = self._ctx.isCycleProfilerEnabled()
+        if ('system', 'metrics_interval_sec') in changedKeys:
+            self._metricsCollector.setInterval(self._ctx.getSystemMetricsIntervalSec())
+        if any(section != 'system' for section, _ in changedKeys):
+            self._hc.applySettings()
+
+    # Switches the relays for user commands and expired timers without waiting for the next cycle. Nothing
+    # is read from the devices, the heater and light relays are switched ahead of the fans.
+    def _processCommand(self):
+        self._ctx.getCommandTracer().startProcessing()
+        self._hc.processCommand()
+        self._processHotRoomLight()
+        self._sd.flushRelays()
+        self._processFanRelays()
+        self._sd.flushRelays()
+        self._ctx.getCommandTracer().finishProcessing()
 
     # ----------------------- Fan Control Methods --------------------------
 
@@ -68,6 +171,11 @@ class SaunaController:
                 self._errorMgr.raiseFanError(errMsg)
         else:
             self._errorMgr.eraseFanError()
+        self._processFanRelays()
+        self._ctx.setLeftFanRpm(self._sd.getLeftFanSpeedRpm())
+        self._ctx.setRightFanRpm(self._sd.getRightFanSpeedRpm())
+
+    def _processFanRelays(self):
         # Process SaunaOFF situation with a delayed fan turn off
         if self._sd.isRightFanOn() \
             and (not self._ctx.isRightFanEnabled() or (not self._ctx.isSaunaOn()
@@ -84,8 +192,6 @@ class SaunaController:
             and (self._ctx.isLeftFanEnabled() and (self._ctx.isSaunaOn() or self._ctx.isFanAfterSaunaOffTimerRunning())):
             self._sd.turnLeftFanOn()
         self._sd.setFanSpeed((self._ctx.getFanSpeedPct()))
-        self._ctx.setLeftFanRpm(self._sd.getLeftFanSpeedRpm())
-        self._ctx.setRightFanRpm(self._sd.getRightFanSpeedRpm())
 
     # ----------------------- Room Light Control Methods ---------------------
 
@@ -98,14 +204,19 @@ class SaunaController:
     # ---------------------------- System Health ---------------------------
 
     def _processSystemHealth(self):
-        err, msg = subprocess.getstatusoutput('vcgencmd measure_temp')
-        if not err:
-            m = re.search(r'-?\d\.?\d*', msg)
-            try:
-                self._ctx.setCpuTemp(float(m.group()))
-                if self._ctx.getCpuTemp() > self._ctx.getCpuWarnTempC():
-                    self._errorMgr.raiseSystemHealthError(f"CPU Temperature is {self._ctx.getCpuTemp()}°C")
-                else:
-                    self._errorMgr.eraseSystemHealthError()
-            except ValueError:  # catch only error needed
-                pass
\ No newline at end of file
+        # Metrics are collected at a low rate, most cycles return right here
+        if not self._metricsCollector.collect():
+            return
+        metrics = self._metricsCollector.getMetrics()
+        self._ctx.setSystemMetrics(metrics)
+        errMsg = ''
+        if metrics['cpu_temp_c'] is not None:
+            self._ctx.setCpuTemp(metrics['cpu_temp_c'])
+            if self._ctx.getCpuTemp() > self._ctx.getCpuWarnTempC():
+                errMsg += f"CPU Temperature is {self._ctx.getCpuTemp()}°C. "
+        if metrics['throttled']:
+            errMsg += f"CPU is {', '.join(metrics['throttled'])}. "
+        if errMsg:
+            self._errorMgr.raiseSystemHealthError(errMsg.strip())
+        else:
+            self._errorMgr.eraseSystemHealthError()
\ No newline at end of file
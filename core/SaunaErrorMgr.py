@@ -1,4 +1,3 @@
-from pymodbus.exceptions import ModbusException
 from core.SaunaContext import SaunaContext
 from datetime import datetime
 
@@ -100,7 +99,7 @@ class SaunaErrorMgr:
         """Backward compatibility property"""
         return self._getErrorMessage(self.ERROR_SENSOR_MODULE)
 
-    def raiseModbusError(self, exception: ModbusException) -> None:
+    def raiseModbusError(self, exception: Exception) -> None:
         self._raiseError(self.ERROR_MODBUS, str(exception))
 
     def eraseModbusError(self) -> None:
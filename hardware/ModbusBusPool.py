@@ -0,0 +1,51 @@
+import threading
+from hardware.ModbusBusWorker import ModbusBusWorker
+from hardware.ModbusTransport import ModbusTransport
+
+
+# Process wide registry of bus workers. The controller and the device utilities asking for the same
+# transport get the same worker, so they never open a serial port or a gateway connection twice and
+# their requests get serialized on the bus.
+class ModbusBusPool:
+
+    _lock = threading.Lock()
+    # {transport key: [ModbusBusWorker, ModbusTransport, reference count]}
+    _buses = {}
+
+    # Returns the worker serving the transport and creates it on first use. retries, stats, breaker and
+    # recorder only apply to a new worker. Every getBus() must be paired with releaseBus().
+    @classmethod
+    def getBus(cls, transport: ModbusTransport, retries: int = 3, stats=None, breaker=None,
+               recorder=None) -> ModbusBusWorker:
+        with cls._lock:
+            entry = cls._buses.get(transport.getKey())
+            if entry is None:
+                bus = ModbusBusWorker(transport.createClient, retries, f'modbus-bus {transport.getName()}',
+                                      stats, breaker, recorder)
+                entry = [bus, transport, 0]
+                cls._buses[transport.getKey()] = entry
+            elif transport.isSerial() and entry[1].baudRate != transport.baudRate:
+                raise ValueError(f'Serial port {transport.serialPort} is in use at {entry[1].baudRate} baud.')
+            entry[2] += 1
+            return entry[0]
+
+    # Returns True if a worker holds the serial port or the gateway connection of the transport
+    @classmethod
+    def isInUse(cls, transport: ModbusTransport) -> bool:
+        with cls._lock:
+            return transport.getKey() in cls._buses
+
+    # Stops the worker once its last user has released it
+    @classmethod
+    def releaseBus(cls, bus: ModbusBusWorker, timeoutSec: float = None) -> None:
+        with cls._lock:
+            for key, entry in list(cls._buses.items()):
+                if entry[0] is bus:
+                    entry[2] -= 1
+                    if entry[2] > 0:
+                        return
+                    del cls._buses[key]
+                    break
+            else:
+                return
+        bus.stop(timeoutSec)
@@ -0,0 +1,135 @@
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pymodbus.exceptions import ModbusException, ModbusIOException, ConnectionException
+from hardware.ModbusStats import ModbusStats
+from hardware.ModbusCircuitBreaker import ModbusCircuitBreaker, CircuitOpenException
+from hardware.ModbusTrafficRecorder import ModbusTrafficRecorder
+
+
+# Owns a Modbus client and its event loop on a dedicated thread and executes requests one at a time
+# in priority order. Any thread may submit requests and gets a Future back.
+class ModbusBusWorker:
+
+    # Request priorities, lower value is served first
+    PRIORITY_SAFETY = 0       # Heater relay writes
+    PRIORITY_CONTROL = 1      # Reads and writes the control decisions depend on
+    PRIORITY_TELEMETRY = 2    # Fan speed, fan status, resting room temperature, etc.
+    _PRIORITY_STOP = 3
+
+    _logger: logging.Logger = logging.getLogger('sauna-controller')
+
+    # clientFactory - creates a pymodbus async client. The client should not retry on its own: failed requests
+    #                 are retried by the worker, so more urgent requests can get onto the bus between retries.
+    # retries - number of times a failed request is retried
+    # stats - records the outcome and latency of every attempt
+    # breaker - fails requests to unresponsive slaves right away. Safety requests are always sent.
+    # recorder - captures every attempt with its response
+    def __init__(self, clientFactory, retries: int = 3, name: str = 'modbus-bus', stats: ModbusStats = None,
+                 breaker: ModbusCircuitBreaker = None, recorder: ModbusTrafficRecorder = None):
+        self._clientFactory = clientFactory
+        self._retries = retries
+        self._stats = stats
+        self._breaker = breaker
+        self._recorder = recorder
+        self._client = None
+        self._queue = queue.PriorityQueue()
+        # Keeps requests of the same priority in the submission order
+        self._sequence = itertools.count()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # request - function taking the client and returning an awaitable pymodbus response,
+    #           e.g. lambda client: client.read_coils(0, count=4, device_id=2)
+    # slave, functionCode - key the request is recorded under in the stats
+    # address, count, values - request parameters for the traffic capture, values only for writes
+    # The Future resolves to the response or raises ModbusException if all attempts failed.
+    def submit(self, request, priority: int = PRIORITY_CONTROL, slave: int = None, functionCode: int = None,
+               address: int = 0, count: int = 0, values: list = None) -> Future:
+        future = Future()
+        self._queue.put((priority, next(self._sequence), 0, request, future,
+                         (slave, functionCode, address, count, values)))
+        return future
+
+    # Executes all requests submitted so far, then closes the client and stops the worker thread
+    def stop(self, timeoutSec: float = None) -> None:
+        self._queue.put((self._PRIORITY_STOP, next(self._sequence), 0, None, None, None))
+        self._thread.join(timeoutSec)
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            priority, sequence, attempt, request, future, info = self._queue.get()
+            if request is None:
+                break
+            if attempt == 0 and not future.set_running_or_notify_cancel():
+                continue
+            slave = info[0]
+            # Also stops retries of requests to a slave whose circuit opened in the meantime
+            if (self._breaker is not None and slave is not None and priority != self.PRIORITY_SAFETY
+                    and not self._breaker.allowRequest(slave)):
+                future.set_exception(CircuitOpenException(slave))
+                continue
+            startTime = time.monotonic()
+            wallTime = time.time()
+            try:
+                response = loop.run_until_complete(self._execute(request))
+                self._record(info, startTime, wallTime, ModbusStats.OUTCOME_EXCEPTION if response.isError()
+                             else ModbusStats.OUTCOME_OK, attempt, response)
+                # Exception responses come from a live slave
+                if self._breaker is not None and slave is not None:
+                    self._breaker.recordSuccess(slave)
+                future.set_result(response)
+            except ModbusException as e:
+                self._record(info, startTime, wallTime, self._getOutcome(e), attempt, error=e)
+                if isinstance(e, ConnectionException):
+                    self._dropClient()
+                if self._breaker is not None and slave is not None:
+                    self._breaker.recordFailure(slave)
+                if attempt < self._retries:
+                    self._logger.debug(f'Retrying Modbus request after error: {e}')
+                    self._queue.put((priority, next(self._sequence), attempt + 1, request, future, info))
+                else:
+                    future.set_exception(e)
+            except Exception as e:
+                self._record(info, startTime, wallTime, ModbusStats.OUTCOME_ERROR, attempt, error=e)
+                future.set_exception(e)
+        self._dropClient()
+        loop.close()
+
+    @staticmethod
+    def _getOutcome(e: ModbusException) -> str:
+        if isinstance(e, ConnectionException):
+            return ModbusStats.OUTCOME_CONNECTION
+        if isinstance(e, ModbusIOException):
+            return ModbusStats.OUTCOME_TIMEOUT
+        return ModbusStats.OUTCOME_ERROR
+
+    def _record(self, info: tuple, startTime: float, wallTime: float, outcome: str, attempt: int, response=None,
+                error: Exception = None) -> None:
+        slave, functionCode, address, count, values = info
+        if slave is None:
+            return
+        latencySec = time.monotonic() - startTime
+        if self._stats is not None:
+            self._stats.record(slave, functionCode, latencySec, outcome, attempt)
+        if self._recorder is not None:
+            self._recorder.record(wallTime, latencySec, slave, functionCode, address, count, values, response, error)
+
+    # Reconnects with a new client on the next request, e.g. after a gateway has closed the connection
+    def _dropClient(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def _execute(self, request):
+        if self._client is None:
+            self._client = self._clientFactory()
+        if not self._client.connected and not await self._client.connect():
+            raise ConnectionException('Cannot connect to the Modbus bus.')
+        return await request(self._client)
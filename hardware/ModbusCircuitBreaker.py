@@ -0,0 +1,85 @@
+import threading
+from pymodbus.exceptions import ModbusException
+from util.Clock import Clock
+
+
+# Raised for requests to a slave whose circuit is open. No request has been sent on the bus.
+class CircuitOpenException(ModbusException):
+
+    def __init__(self, slave: int):
+        super().__init__(f'Device {slave} is not responding, requests are suspended.')
+        self.slave = slave
+
+
+# Tracks consecutive failures per slave ID. Once a slave fails failureThreshold times in a row its circuit
+# opens and requests to it fail right away instead of waiting for the timeout. After a backoff period a single
+# probe request is let through: success closes the circuit, failure reopens it with a doubled backoff.
+class ModbusCircuitBreaker:
+
+    # Circuit states
+    STATE_CLOSED = 'closed'
+    STATE_OPEN = 'open'
+    STATE_HALF_OPEN = 'half_open'    # Probe request is in flight
+
+    # clock - monotonic, so a wall clock jump neither holds a circuit open nor probes early
+    def __init__(self, failureThreshold: int = 3, initialBackoffSec: float = 5, maxBackoffSec: float = 300,
+                 clock: Clock = None):
+        self._failureThreshold = failureThreshold
+        self._initialBackoffSec = initialBackoffSec
+        self._maxBackoffSec = maxBackoffSec
+        self._clock = clock if clock else Clock.getDefault()
+        self._lock = threading.Lock()
+        # {slaveId: {'state', 'failures', 'backoffSec', 'retryTime'}}
+        self._circuits = {}
+
+    def _getCircuit(self, slave: int) -> dict:
+        circuit = self._circuits.get(slave)
+        if circuit is None:
+            circuit = {'state': self.STATE_CLOSED, 'failures': 0, 'backoffSec': self._initialBackoffSec, 'retryTime': 0}
+            self._circuits[slave] = circuit
+        return circuit
+
+    # Returns False if the request must not be sent. Lets a probe request through once the backoff has passed.
+    def allowRequest(self, slave: int) -> bool:
+        with self._lock:
+            circuit = self._getCircuit(slave)
+            if circuit['state'] == self.STATE_CLOSED:
+                return True
+            if circuit['state'] == self.STATE_OPEN and self._clock.now() >= circuit['retryTime']:
+                circuit['state'] = self.STATE_HALF_OPEN
+                return True
+            return False
+
+    def recordSuccess(self, slave: int) -> None:
+        with self._lock:
+            circuit = self._getCircuit(slave)
+            circuit['state'] = self.STATE_CLOSED
+            circuit['failures'] = 0
+            circuit['backoffSec'] = self._initialBackoffSec
+
+    def recordFailure(self, slave: int) -> None:
+        with self._lock:
+            circuit = self._getCircuit(slave)
+            circuit['failures'] += 1
+            if circuit['state'] == self.STATE_HALF_OPEN:
+                # Probe failed, wait longer before the next one
+                circuit['backoffSec'] = min(circuit['backoffSec'] * 2, self._maxBackoffSec)
+            elif circuit['state'] == self.STATE_OPEN or circuit['failures'] < self._failureThreshold:
+                return
+            circuit['state'] = self.STATE_OPEN
+            circuit['retryTime'] = self._clock.now() + circuit['backoffSec']
+
+    # Returns True while requests to the slave are suspended or probed
+    def isOpen(self, slave: int) -> bool:
+        with self._lock:
+            return self._getCircuit(slave)['state'] != self.STATE_CLOSED
+
+    # Returns a list of dicts for all slaves whose circuit is not closed
+    def getOpenCircuits(self) -> list:
+        with self._lock:
+            return [{'slave': slave,
+                     'state': circuit['state'],
+                     'failures': circuit['failures'],
+                     'retry_in_sec': max(0, round(circuit['retryTime'] - self._clock.now(), 1))}
+                    for slave, circuit in sorted(self._circuits.items())
+                    if circuit['state'] != self.STATE_CLOSED]
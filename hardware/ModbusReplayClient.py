@@ -0,0 +1,84 @@
+import asyncio
+import time
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.pdu.bit_message import ReadCoilsResponse, WriteMultipleCoilsResponse
+from pymodbus.pdu.register_message import ReadHoldingRegistersResponse, WriteSingleRegisterResponse
+from hardware.ModbusTrafficRecorder import ModbusTrafficRecorder
+
+
+# Stands in for a pymodbus async client and answers from a capture written by ModbusTrafficRecorder.
+# Every request gets the next recorded response with the same slave, function code, address and count,
+# delivered no earlier than it was recorded relative to the first record, divided by the speed.
+# Requests the capture has no answer for time out like on the bus: they fail after the timeout divided by the speed.
+class ModbusReplayClient:
+
+    # speed - 1 replays at the original pace, 10 ten times faster, 0 as fast as possible
+    # timeoutSec - response timeout of the bus the capture stands in for
+    def __init__(self, fileName: str, speed: float = 1.0, timeoutSec: float = 0.3):
+        self._records = ModbusTrafficRecorder.readCapture(fileName)
+        self._speed = speed
+        self._timeoutSec = timeoutSec
+        self._cursor = 0
+        self._startTime = None
+        self.connected = False
+
+    async def connect(self) -> bool:
+        self.connected = True
+        if self._startTime is None:
+            self._startTime = time.monotonic()
+        return True
+
+    def close(self) -> None:
+        self.connected = False
+
+    def isEndOfCapture(self) -> bool:
+        return self._cursor >= len(self._records)
+
+    def _findRecord(self, slave: int, functionCode: int, address: int, count: int):
+        for index in range(self._cursor, len(self._records)):
+            record = self._records[index]
+            if (record['slave'], record['function_code'], record['address'], record['count']) == \
+                    (slave, functionCode, address, count):
+                self._cursor = index + 1
+                return record
+        return None
+
+    async def _waitForRecord(self, record: dict) -> None:
+        if self._speed <= 0:
+            return
+        responseTime = (record['time'] - self._records[0]['time'] + record['latency']) / self._speed
+        delaySec = max(record['latency'] / self._speed, responseTime - (time.monotonic() - self._startTime))
+        await asyncio.sleep(delaySec)
+
+    async def _replay(self, slave: int, functionCode: int, address: int, count: int, createResponse):
+        record = self._findRecord(slave, functionCode, address, count)
+        if record is None:
+            if self._speed > 0:
+                await asyncio.sleep(self._timeoutSec / self._speed)
+            raise ModbusIOException(f'No recorded response for function {functionCode} of device {slave} '
+                                    f'at address {address}.')
+        await self._waitForRecord(record)
+        if record['status'] == ModbusTrafficRecorder.STATUS_EXCEPTION:
+            return ExceptionResponse(functionCode, record['exception_code'], device_id=slave)
+        if record['status'] != ModbusTrafficRecorder.STATUS_OK:
+            raise ModbusIOException(f'Recorded request to device {slave} failed.')
+        return createResponse(record['values'])
+
+    async def read_holding_registers(self, address: int, *, count: int = 1, device_id: int = 1):
+        return await self._replay(device_id, 3, address, count,
+                                  lambda values: ReadHoldingRegistersResponse(dev_id=device_id, registers=values))
+
+    async def read_coils(self, address: int, *, count: int = 1, device_id: int = 1):
+        return await self._replay(device_id, 1, address, count,
+                                  lambda values: ReadCoilsResponse(dev_id=device_id, bits=[bool(value) for value in values]))
+
+    async def write_register(self, address: int, value: int, *, device_id: int = 1):
+        return await self._replay(device_id, 6, address, 1,
+                                  lambda values: WriteSingleRegisterResponse(dev_id=device_id, address=address,
+                                                                             registers=[value]))
+
+    async def write_coils(self, address: int, values: list, *, device_id: int = 1):
+        return await self._replay(device_id, 15, address, len(values),
+                                  lambda recordedValues: WriteMultipleCoilsResponse(dev_id=device_id, address=address,
+                                                                                    count=len(values)))
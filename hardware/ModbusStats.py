@@ -0,0 +1,92 @@
+import threading
+from array import array
+
+
+# Request counters and latency percentiles per slave ID and function code. Every request keeps
+# a fixed-size ring of its latest latencies, so memory use does not grow with the uptime.
+# Updated by the bus worker thread and read by the UI and the web server.
+class ModbusStats:
+
+    # Request outcomes
+    OUTCOME_OK = 'ok'
+    OUTCOME_TIMEOUT = 'timeout'                # No valid response, frames with a bad CRC are dropped and end up here
+    OUTCOME_CONNECTION = 'connection'          # Serial port or TCP connection failed
+    OUTCOME_EXCEPTION = 'exception'            # Slave returned a Modbus exception response
+    OUTCOME_ERROR = 'error'                    # Any other pymodbus error
+
+    # Function codes used by the controller
+    FUNCTION_NAMES = {
+        1: 'read_coils',
+        3: 'read_holding_registers',
+        6: 'write_register',
+        15: 'write_coils'
+    }
+
+    def __init__(self, latencySamples: int = 256):
+        self._latencySamples = latencySamples
+        self._lock = threading.Lock()
+        # {(slaveId, functionCode): entry}
+        self._entries = {}
+
+    def _getEntry(self, slave: int, functionCode: int) -> dict:
+        key = (slave, functionCode)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = {
+                'requests': 0,
+                'retries': 0,
+                'outcomes': dict.fromkeys([self.OUTCOME_OK, self.OUTCOME_TIMEOUT, self.OUTCOME_CONNECTION,
+                                           self.OUTCOME_EXCEPTION, self.OUTCOME_ERROR], 0),
+                'latencies': array('f', [0.0] * self._latencySamples),
+                'latencyCount': 0,
+                'maxLatencySec': 0.0
+            }
+            self._entries[key] = entry
+        return entry
+
+    # Records a single attempt. Retried attempts are counted as retries, not as new requests.
+    def record(self, slave: int, functionCode: int, latencySec: float, outcome: str, attempt: int = 0) -> None:
+        with self._lock:
+            entry = self._getEntry(slave, functionCode)
+            if attempt == 0:
+                entry['requests'] += 1
+            else:
+                entry['retries'] += 1
+            entry['outcomes'][outcome] += 1
+            entry['latencies'][entry['latencyCount'] % self._latencySamples] = latencySec
+            entry['latencyCount'] += 1
+            entry['maxLatencySec'] = max(entry['maxLatencySec'], latencySec)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries = {}
+
+    @staticmethod
+    def _percentile(sortedValues: list, pct: float) -> float:
+        if not sortedValues:
+            return 0.0
+        return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * pct / 100))]
+
+    # Returns a list of dicts sorted by slave ID and function code, latencies in milliseconds
+    def getSnapshot(self) -> list:
+        snapshot = []
+        with self._lock:
+            for (slave, functionCode), entry in sorted(self._entries.items()):
+                latencies = sorted(entry['latencies'][:min(entry['latencyCount'], self._latencySamples)])
+                snapshot.append({
+                    'slave': slave,
+                    'function_code': functionCode,
+                    'function': self.FUNCTION_NAMES.get(functionCode, str(functionCode)),
+                    'requests': entry['requests'],
+                    'retries': entry['retries'],
+                    'ok': entry['outcomes'][self.OUTCOME_OK],
+                    'timeouts': entry['outcomes'][self.OUTCOME_TIMEOUT],
+                    'connection_errors': entry['outcomes'][self.OUTCOME_CONNECTION],
+                    'exception_responses': entry['outcomes'][self.OUTCOME_EXCEPTION],
+                    'other_errors': entry['outcomes'][self.OUTCOME_ERROR],
+                    'p50_ms': round(self._percentile(latencies, 50) * 1000, 1),
+                    'p95_ms': round(self._percentile(latencies, 95) * 1000, 1),
+                    'p99_ms': round(self._percentile(latencies, 99) * 1000, 1),
+                    'max_ms': round(entry['maxLatencySec'] * 1000, 1)
+                })
+        return snapshot
@@ -0,0 +1,84 @@
+import struct
+import threading
+from pymodbus.exceptions import ModbusIOException
+
+
+# Appends every Modbus request with its outcome to a binary capture file. Each record is a fixed header
+# followed by the register values or coil states read or written:
+#
+#   timestamp (double, epoch sec), latency (float, sec), slave, function code, address, count,
+#   status, exception code, number of values, values (unsigned 16 bit each)
+#
+# Records are written as complete units and flushed, so a capture cut off by a power loss stays readable.
+class ModbusTrafficRecorder:
+
+    _fileHeader = b'SMTR\x01'
+    _recordHeader = struct.Struct('<dfBBHHBBH')
+
+    # Record status
+    STATUS_OK = 0
+    STATUS_EXCEPTION = 1    # Slave returned a Modbus exception response
+    STATUS_TIMEOUT = 2      # No valid response
+    STATUS_ERROR = 3        # Connection or any other error
+
+    def __init__(self, fileName: str):
+        self._lock = threading.Lock()
+        self._file = open(fileName, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(self._fileHeader)
+            self._file.flush()
+
+    # values - values written by the request, ignored for reads
+    # response - pymodbus response, None if the request failed with error
+    def record(self, startTime: float, latencySec: float, slave: int, functionCode: int, address: int, count: int,
+               values: list, response=None, error: Exception = None) -> None:
+        exceptionCode = 0
+        if response is None:
+            status = self.STATUS_TIMEOUT if isinstance(error, ModbusIOException) else self.STATUS_ERROR
+            values = []
+        elif response.isError():
+            status = self.STATUS_EXCEPTION
+            exceptionCode = getattr(response, 'exception_code', 0)
+            values = []
+        else:
+            status = self.STATUS_OK
+            if functionCode == 3:
+                values = response.registers[:count]
+            elif functionCode == 1:
+                values = response.bits[:count]
+        values = [int(value) for value in (values or [])]
+        data = self._recordHeader.pack(startTime, latencySec, slave, functionCode, address, count, status,
+                                       exceptionCode, len(values)) + struct.pack(f'<{len(values)}H', *values)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(data)
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # Returns a list of dicts: time, latency, slave, function_code, address, count, status, exception_code, values.
+    # A truncated last record is skipped.
+    @classmethod
+    def readCapture(cls, fileName: str) -> list:
+        with open(fileName, 'rb') as captureFile:
+            data = captureFile.read()
+        if not data.startswith(cls._fileHeader):
+            raise ValueError(f'{fileName} is not a Modbus capture.')
+        records = []
+        offset = len(cls._fileHeader)
+        while offset + cls._recordHeader.size <= len(data):
+            timestamp, latencySec, slave, functionCode, address, count, status, exceptionCode, valueCount = \
+                cls._recordHeader.unpack_from(data, offset)
+            offset += cls._recordHeader.size
+            if offset + valueCount * 2 > len(data):
+                break
+            values = list(struct.unpack_from(f'<{valueCount}H', data, offset))
+            offset += valueCount * 2
+            records.append({'time': timestamp, 'latency': latencySec, 'slave': slave, 'function_code': functionCode,
+                            'address': address, 'count': count, 'status': status, 'exception_code': exceptionCode,
+                            'values': values})
+        return records
@@ -0,0 +1,95 @@
+from pymodbus import FramerType
+from pymodbus.client import AsyncModbusSerialClient, AsyncModbusTcpClient
+from core.SaunaContext import SaunaContext
+from hardware.ModbusReplayClient import ModbusReplayClient
+
+
+# Describes how to reach a Modbus bus: a local RS485 serial port, a Modbus TCP gateway, an RS485
+# gateway forwarding raw RTU frames over TCP or a recorded capture. Transports with the same key share
+# a bus worker.
+class ModbusTransport:
+
+    # Transport types
+    TYPE_SERIAL = 'serial'
+    TYPE_TCP = 'tcp'
+    TYPE_RTU_OVER_TCP = 'rtu_over_tcp'
+    TYPE_REPLAY = 'replay'
+    TYPES = [TYPE_SERIAL, TYPE_TCP, TYPE_RTU_OVER_TCP, TYPE_REPLAY]
+
+    def __init__(self, transportType: str = TYPE_SERIAL, serialPort: str = '/dev/ttyAMA0', baudRate: int = 9600,
+                 host: str = '127.0.0.1', tcpPort: int = 502, timeoutSec: float = 0.3, replayFile: str = '',
+                 replaySpeed: float = 1.0):
+        if transportType not in self.TYPES:
+            raise ValueError(f'Unknown Modbus transport "{transportType}", expected one of {", ".join(self.TYPES)}.')
+        self.transportType = transportType
+        self.serialPort = serialPort
+        self.baudRate = baudRate
+        self.host = host
+        self.tcpPort = tcpPort
+        self.timeoutSec = timeoutSec
+        self.replayFile = replayFile
+        self.replaySpeed = replaySpeed
+
+    # Transport configured in the [modbus] section. baudRate overrides the configured serial baud rate.
+    # busUrl overrides the configured transport:
+    #   /dev/ttyAMA2                 - serial port at the configured baud rate
+    #   tcp://192.168.1.20:502       - Modbus TCP gateway
+    #   rtu_over_tcp://192.168.1.20:4196 - RS485 gateway forwarding raw RTU frames
+    @classmethod
+    def fromContext(cls, ctx: SaunaContext, baudRate: int = None, busUrl: str = '') -> 'ModbusTransport':
+        transport = cls(transportType=ctx.getModbusTransport(),
+                        serialPort=ctx.getModbusSerialPort(),
+                        baudRate=baudRate if baudRate else ctx.getModbusSerialBaudRate(),
+                        host=ctx.getModbusTcpHost(),
+                        tcpPort=ctx.getModbusTcpPort(),
+                        timeoutSec=ctx.getModbusSerialTimeout(),
+                        replayFile=ctx.getModbusReplayFile(),
+                        replaySpeed=ctx.getModbusReplaySpeed())
+        # A capture replays the traffic of all buses
+        if busUrl and transport.transportType != cls.TYPE_REPLAY:
+            transport._applyUrl(busUrl)
+        return transport
+
+    def _applyUrl(self, busUrl: str) -> None:
+        if '://' not in busUrl:
+            self.transportType = self.TYPE_SERIAL
+            self.serialPort = busUrl
+            return
+        transportType, address = busUrl.split('://', 1)
+        if transportType not in [self.TYPE_TCP, self.TYPE_RTU_OVER_TCP]:
+            raise ValueError(f'Unknown Modbus bus "{busUrl}", expected a serial port, tcp://host:port '
+                             f'or rtu_over_tcp://host:port.')
+        self.transportType = transportType
+        host, _, port = address.partition(':')
+        self.host = host
+        if port:
+            self.tcpPort = int(port)
+
+    def isSerial(self) -> bool:
+        return self.transportType == self.TYPE_SERIAL
+
+    # Identifies the physical bus. A serial port can only be opened once, whatever the baud rate.
+    def getKey(self) -> tuple:
+        if self.isSerial():
+            return self.TYPE_SERIAL, self.serialPort
+        if self.transportType == self.TYPE_REPLAY:
+            return self.TYPE_REPLAY, self.replayFile
+        return self.transportType, self.host, self.tcpPort
+
+    def getName(self) -> str:
+        if self.isSerial():
+            return f'{self.serialPort}@{self.baudRate}'
+        if self.transportType == self.TYPE_REPLAY:
+            return f'replay {self.replayFile}'
+        return f'{self.transportType}://{self.host}:{self.tcpPort}'
+
+    # Retries are done by the bus worker, so the client must not retry on its own
+    def createClient(self):
+        if self.transportType == self.TYPE_REPLAY:
+            return ModbusReplayClient(self.replayFile, self.replaySpeed, self.timeoutSec)
+        if self.isSerial():
+            return AsyncModbusSerialClient(port=self.serialPort, baudrate=self.baudRate, timeout=self.timeoutSec,
+                                           retries=0)
+        return AsyncModbusTcpClient(self.host, port=self.tcpPort, timeout=self.timeoutSec, retries=0,
+                                    framer=FramerType.RTU if self.transportType == self.TYPE_RTU_OVER_TCP
+                                    else FramerType.SOCKET)
@@ -0,0 +1,52 @@
+from util.Clock import Clock
+
+
+# Decides which device signals have to be read during a control cycle. Every signal has its own polling
+# interval for each controller state, so signals that do not drive the heater are read less often and
+# everything slows down once the heater is off and again when the sauna is off and the fans have stopped.
+class PollingScheduler:
+
+    # Controller states
+    STATE_HEATING = 'heating'    # Heater is on
+    STATE_ACTIVE = 'active'      # Sauna is on or fans are running, heater is off
+    STATE_IDLE = 'idle'          # Sauna is off and fans have stopped
+
+    # Signals
+    SIGNAL_HOT_ROOM = 'hot_room'            # Hot room temperature and humidity
+    SIGNAL_RELAYS = 'relays'                # Heater, light and fan relay states
+    SIGNAL_FAN_STATUS = 'fan_status'        # Fan running and fault status, fan module settings
+    SIGNAL_FAN_RPM = 'fan_rpm'              # Fan speed
+    SIGNAL_RESTING_ROOM = 'resting_room'    # Resting room temperature
+
+    def __init__(self, clock: Clock = None):
+        self._clock = clock if clock else Clock.getDefault()
+        # {signal: {state: intervalSec}}, 0 - poll every cycle
+        self._intervals = {}
+        # {signal: time}
+        self._lastPollTimes = {}
+
+    def setInterval(self, signal: str, state: str, intervalSec: float) -> None:
+        self._intervals.setdefault(signal, {})[state] = intervalSec
+
+    # Sets intervalSec for the heating state and at least activeIntervalSec and idleIntervalSec for the
+    # active and idle states. Intervals never get shorter from heating to active to idle.
+    def setIntervals(self, signal: str, intervalSec: float, activeIntervalSec: float, idleIntervalSec: float) -> None:
+        activeIntervalSec = max(intervalSec, activeIntervalSec)
+        self.setInterval(signal, self.STATE_HEATING, intervalSec)
+        self.setInterval(signal, self.STATE_ACTIVE, activeIntervalSec)
+        self.setInterval(signal, self.STATE_IDLE, max(activeIntervalSec, idleIntervalSec))
+
+    def getInterval(self, signal: str, state: str) -> float:
+        return self._intervals.get(signal, {}).get(state, 0)
+
+    # Returns True if the signal has never been polled or its interval for the state has passed
+    def isDue(self, signal: str, state: str) -> bool:
+        lastPollTime = self._lastPollTimes.get(signal)
+        return lastPollTime is None or self._clock.now() - lastPollTime >= self.getInterval(signal, state)
+
+    def markPolled(self, signal: str) -> None:
+        self._lastPollTimes[signal] = self._clock.now()
+
+    # Makes the signal due during the next cycle, e.g. after a failed read
+    def reset(self, signal: str) -> None:
+        self._lastPollTimes.pop(signal, None)
@@ -1,4 +1,12 @@
-from pymodbus.client import ModbusSerialClient
+import argparse
+import asyncio
+import math
+import time
+from pymodbus.exceptions import ModbusException
+from core.SaunaContext import SaunaContext
+from hardware.ModbusBusPool import ModbusBusPool
+from hardware.ModbusBusWorker import ModbusBusWorker
+from hardware.ModbusTransport import ModbusTransport
 
 
 class SaunaDevUtils:
@@ -12,43 +20,77 @@ class SaunaDevUtils:
     _sensorBaudRate9600 = 2
     _sensorDefaultBaudRate = _sensorBaudRate4800
     _sensorDefaultSlaveId = 1
+    _relayModuleCoilCount = 4
 
-    # Instantiates Modbus Serial Port client
-    def getModbusSerialClient(self, baudrate):
-        return ModbusSerialClient(port='/dev/ttyAMA0', baudrate=baudrate, timeout=3, retries=3)
+    # Discovered device types
+    DEVICE_SENSOR = 'sensor'
+    DEVICE_FAN_MODULE = 'fan_module'
+    DEVICE_RELAY_MODULE = 'relay_module'
+    DEVICE_UNKNOWN = 'unknown'
+
+    _discoveryBaudRates = [2400, 4800, 9600]
+    _discoveryMinTimeoutSec = 0.02
+    # Timeout before the first device on a bus has responded, covers slow device turnaround
+    _discoveryInitialTimeoutSec = 0.1
+    _discoveryTcpTimeoutSec = 0.2
+
+    # Recommended timeout is this many times the slowest measured response
+    _calibrationSafetyFactor = 3
+    _calibrationMinTimeoutSec = 0.02
+
+    def __init__(self, ctx: SaunaContext):
+        self._ctx = ctx
+
+    # Returns the bus worker of the configured transport, shared with the controller if it is running.
+    # Release it with ModbusBusPool.releaseBus().
+    def getModbusBus(self, baudrate=None, busUrl: str = '') -> ModbusBusWorker:
+        return ModbusBusPool.getBus(ModbusTransport.fromContext(self._ctx, baudrate, busUrl),
+                                    self._ctx.getModbusSerialRetries())
+
+    # Executes a request on the bus and waits for the response. Returns None if the request failed.
+    def _execute(self, bus: ModbusBusWorker, request):
+        try:
+            response = bus.submit(request).result()
+        except ModbusException:
+            return None
+        return None if response.isError() else response
+
+    def _writeRegister(self, bus: ModbusBusWorker, address: int, value: int, slave: int):
+        return self._execute(bus, lambda client: client.write_register(address=address, value=value, device_id=slave))
+
+    def _readRegister(self, bus: ModbusBusWorker, address: int, slave: int):
+        return self._execute(bus, lambda client: client.read_holding_registers(address=address, device_id=slave))
 
     # ------------------------------- Modbus Device Configuration Functions ---------------------------------
 
     def setJpf4816SlaveId(self, baudrate, currentId, newId) -> str:
-        client = self.getModbusSerialClient(baudrate)
-        response = client.write_register(address=self._fanModuleSlaveIdAddress, value=newId, slave=currentId)
-        if response.isError():
-            return "Error Setting up New Slave ID for JPF4816 Fn Control Module."
-        else:
-            response = client.read_holding_registers(address=self._fanModuleSlaveIdAddress, slave=newId)
-            if response.isError():
+        bus = self.getModbusBus(baudrate)
+        try:
+            if self._writeRegister(bus, self._fanModuleSlaveIdAddress, newId, currentId) is None:
+                return "Error Setting up New Slave ID for JPF4816 Fn Control Module."
+            response = self._readRegister(bus, self._fanModuleSlaveIdAddress, newId)
+            if response is None:
                 return "Error Setting up New Slave ID for JPF4816 Fn Control Module. Cannot read device after configuring new SlaveId."
-        client.close()
+        finally:
+            ModbusBusPool.releaseBus(bus)
         return f"Success. Response: {response.registers}"
 
 
     def setSensorSlaveId(self, baudrate, currentId, newId) -> str:
-        client = self.getModbusSerialClient(baudrate)
-        response = client.write_register(address=self._sensorSlaveIdAddress, value=newId, slave=currentId)
-        if response.isError():
-            return "Error Setting up New Slave ID for Temp/Humidity Sensor."
-        else:
-            response = client.read_holding_registers(address=self._sensorSlaveIdAddress, slave=newId)
-            if response.isError():
+        bus = self.getModbusBus(baudrate)
+        try:
+            if self._writeRegister(bus, self._sensorSlaveIdAddress, newId, currentId) is None:
+                return "Error Setting up New Slave ID for Temp/Humidity Sensor."
+            response = self._readRegister(bus, self._sensorSlaveIdAddress, newId)
+            if response is None:
                 return "Error Setting up New Slave ID for Temp/Humidity Sensor. Cannot read device after configuring new SlaveId."
-        client.close()
+        finally:
+            ModbusBusPool.releaseBus(bus)
         return f"Success. Response: {response.registers}"
 
 
-    # This function is not going to work with the current modbus functions as the baudrate is set up during client
-    # initialization.
+    # The sensor is read back at the new baud rate, so the controller must not be running on the same serial port.
     def setSensorBaudRate(self, currentBaudRate, newBaudrate, slaveId) -> str:
-        client = self.getModbusSerialClient(currentBaudRate)
         br = self._sensorDefaultBaudRate
         if newBaudrate == 2400:
             br = self._sensorBaudRate2400
@@ -58,14 +100,254 @@ class SaunaDevUtils:
             br = self._sensorBaudRate9600
         else:
             return f"Baud Rate {newBaudrate} is not supported."
-        response = client.write_register(address=self._sensorBaudRateAddress, value=br, slave=slaveId)
-        if response.isError():
-            return "Error Setting up New Baud Rate for Temp/Humidity Sensor."
-        else:
-            client.close()
-            client = self.getModbusSerialClient(newBaudrate)
-            response = client.read_holding_registers(address=self._sensorBaudRateAddress, slave=slaveId)
-            if response.isError():
+        bus = self.getModbusBus(currentBaudRate, self._ctx.getSaunaSensorsBus())
+        try:
+            if self._writeRegister(bus, self._sensorBaudRateAddress, br, slaveId) is None:
+                return "Error Setting up New Baud Rate for Temp/Humidity Sensor."
+        finally:
+            ModbusBusPool.releaseBus(bus)
+        bus = self.getModbusBus(newBaudrate, self._ctx.getSaunaSensorsBus())
+        try:
+            response = self._readRegister(bus, self._sensorBaudRateAddress, slaveId)
+            if response is None:
                 return "Error Setting up New Baud Rate for Temp/Humidity Sensor. Cannot read device after configuring new SlaveId."
-        client.close()
+        finally:
+            ModbusBusPool.releaseBus(bus)
         return f"Success. Response: {response.registers}"
+
+
+    # ------------------------------- Bus Discovery ---------------------------------
+
+    # Time to transfer a request and a short response at the baud rate plus the device turnaround
+    def _getMinDiscoveryTimeoutSec(self, transport: ModbusTransport) -> float:
+        if not transport.isSerial():
+            return self._discoveryMinTimeoutSec
+        return max(self._discoveryMinTimeoutSec, (8 + 7) * 10 / transport.baudRate + 0.01)
+
+    # Returns the response, None if the slave did not respond. Exception responses are returned as well.
+    @staticmethod
+    async def _tryRequest(request):
+        try:
+            return await request
+        except ModbusException:
+            return None
+
+    @staticmethod
+    def _isSlaveIdEcho(response, slave: int) -> bool:
+        return response is not None and not response.isError() and response.registers[:1] == [slave]
+
+    # Tells the device type by registers only the sensor and the fan module echo the slave ID from
+    async def _identifyDevice(self, client, slave: int) -> str:
+        response = await self._tryRequest(client.read_holding_registers(self._sensorSlaveIdAddress, device_id=slave))
+        if self._isSlaveIdEcho(response, slave):
+            return self.DEVICE_SENSOR
+        response = await self._tryRequest(client.read_holding_registers(self._fanModuleSlaveIdAddress, device_id=slave))
+        if self._isSlaveIdEcho(response, slave):
+            return self.DEVICE_FAN_MODULE
+        response = await self._tryRequest(client.read_coils(0, count=self._relayModuleCoilCount, device_id=slave))
+        if response is not None and not response.isError():
+            return self.DEVICE_RELAY_MODULE
+        return self.DEVICE_UNKNOWN
+
+    # Sweeps the slave IDs on one bus at each of its baud rates. The timeout starts short and gets shorter
+    # once the first devices have responded.
+    async def _scanBus(self, busUrl: str, transports: list, slaveIds) -> list:
+        devices = []
+        for transport in transports:
+            minTimeoutSec = self._getMinDiscoveryTimeoutSec(transport)
+            transport.timeoutSec = max(minTimeoutSec, self._discoveryInitialTimeoutSec if transport.isSerial()
+                                       else self._discoveryTcpTimeoutSec)
+            client = transport.createClient()
+            maxLatencySec = 0
+            try:
+                for slave in slaveIds:
+                    # pymodbus drops the connection after several requests in a row without a response
+                    if not client.connected and not await client.connect():
+                        raise ModbusException(f'Cannot connect to Modbus bus {transport.getName()}.')
+                    startTime = time.monotonic()
+                    response = await self._tryRequest(client.read_holding_registers(0, device_id=slave))
+                    if response is None:
+                        continue
+                    latencySec = time.monotonic() - startTime
+                    devices.append({'bus': busUrl,
+                                    'baud_rate': transport.baudRate if transport.isSerial() else None,
+                                    'slave': slave,
+                                    'device': await self._identifyDevice(client, slave),
+                                    'latency_ms': round(latencySec * 1000, 1)})
+                    # Reconnect with a timeout fitting the measured response times
+                    if latencySec > maxLatencySec:
+                        maxLatencySec = latencySec
+                        timeoutSec = max(minTimeoutSec, 2 * maxLatencySec)
+                        if timeoutSec < transport.timeoutSec:
+                            transport.timeoutSec = timeoutSec
+                            client.close()
+                            client = transport.createClient()
+            finally:
+                client.close()
+        return devices
+
+    async def _scanBuses(self, buses: dict, slaveIds) -> list:
+        results = await asyncio.gather(*[self._scanBus(busUrl, transports, slaveIds)
+                                         for busUrl, transports in buses.items()])
+        return [device for devices in results for device in devices]
+
+    # Finds all devices on the given buses, all buses are scanned concurrently. Every serial bus is swept at
+    # each baud rate, gateways only once. The controller must not be running on the scanned buses.
+    # busUrls - serial ports, tcp://host:port or rtu_over_tcp://host:port, '' - the configured transport
+    # Returns a list of dicts: bus, baud_rate, slave, device, latency_ms
+    def discoverDevices(self, busUrls: list = None, baudRates: list = None, slaveIds=range(1, 248)) -> list:
+        buses = {}
+        for busUrl in busUrls if busUrls else ['']:
+            transport = ModbusTransport.fromContext(self._ctx, busUrl=busUrl)
+            if ModbusBusPool.isInUse(transport):
+                raise ValueError(f'Modbus bus {transport.getName()} is in use. Stop the controller first.')
+            if transport.isSerial():
+                buses[busUrl] = [ModbusTransport.fromContext(self._ctx, baudRate, busUrl)
+                                 for baudRate in (baudRates if baudRates else self._discoveryBaudRates)]
+            else:
+                buses[busUrl] = [transport]
+        return asyncio.run(self._scanBuses(buses, slaveIds))
+
+    # Writes the first sensor, relay module and fan module found into the [modbus] section
+    def applyDiscoveredLayout(self, devices: list) -> str:
+        found = {}
+        for device in devices:
+            found.setdefault(device['device'], device)
+        missing = [deviceType for deviceType in [self.DEVICE_SENSOR, self.DEVICE_RELAY_MODULE, self.DEVICE_FAN_MODULE]
+                   if deviceType not in found]
+        if missing:
+            return f"Error. Devices not found: {', '.join(missing)}."
+        baudRates = {device['baud_rate'] for device in found.values() if device['baud_rate'] is not None}
+        if len(baudRates) > 1:
+            return (f"Error. Devices use different baud rates: {', '.join(str(rate) for rate in sorted(baudRates))}. "
+                    f"Set them to the same baud rate first.")
+        if baudRates:
+            self._ctx.setModbusSerialBaudRate(baudRates.pop())
+        sensor = found[self.DEVICE_SENSOR]
+        relayModule = found[self.DEVICE_RELAY_MODULE]
+        fanModule = found[self.DEVICE_FAN_MODULE]
+        self._ctx.setSaunaSensorsDeviceId(sensor['slave'])
+        self._ctx.setSaunaSensorsBus(sensor['bus'])
+        self._ctx.setRelayModuleDeviceId(relayModule['slave'])
+        self._ctx.setRelayModuleBus(relayModule['bus'])
+        self._ctx.setFanControlModuleDeviceId(fanModule['slave'])
+        self._ctx.setFanControlModuleBus(fanModule['bus'])
+        return (f"Success. Sensors: {sensor['slave']}, relay module: {relayModule['slave']}, "
+                f"fan module: {fanModule['slave']}.")
+
+    # ------------------------------- Bus Calibration ---------------------------------
+
+    # The request every device gets polled with during each control cycle, [(device, slave, busUrl, request)]
+    def _getCalibrationRequests(self) -> list:
+        sensorsId = self._ctx.getSaunaSensorsDeviceId()
+        sensorAddresses = [self._ctx.getTempSensorAddr(), self._ctx.getHumiditySensorAddr()]
+        relayModuleId = self._ctx.getRelayModuleDeviceId()
+        coils = [self._ctx.getHeaterRelayCoilAddr(), self._ctx.getHotRoomLightCoilAddr(),
+                 self._ctx.getRightFanRelayCoilAddr(), self._ctx.getLeftFanRelayCoilAddr()]
+        fanModuleId = self._ctx.getFanControlModuleDeviceId()
+        # Fan module registers up to the fan speed of both fans
+        fanAddresses = [self._ctx.getFanModuleRoomTempAddr(), self._ctx.getFanStatusAddr(),
+                        self._ctx.getFanSpeedAddr(), self._ctx.getNumberOfFansAddr(),
+                        self._ctx.getFanFaultStatusAddr(), self._ctx.getFanSpeedRpmAddr(1),
+                        self._ctx.getFanSpeedRpmAddr(2)]
+        return [
+            (self.DEVICE_SENSOR, sensorsId, self._ctx.getSaunaSensorsBus(),
+             lambda client: client.read_holding_registers(min(sensorAddresses), device_id=sensorsId,
+                                                          count=max(sensorAddresses) - min(sensorAddresses) + 1)),
+            (self.DEVICE_RELAY_MODULE, relayModuleId, self._ctx.getRelayModuleBus(),
+             lambda client: client.read_coils(min(coils), device_id=relayModuleId,
+                                              count=max(coils) - min(coils) + 1)),
+            (self.DEVICE_FAN_MODULE, fanModuleId, self._ctx.getFanControlModuleBus(),
+             lambda client: client.read_holding_registers(min(fanAddresses), device_id=fanModuleId,
+                                                          count=max(fanAddresses) - min(fanAddresses) + 1))
+        ]
+
+    # Measures the round trip of the polling request of every device. Stop the controller first, queued
+    # controller requests would add to the measured times.
+    # Returns a list of dicts: device, slave, samples, failures, p50_ms, p99_ms, max_ms
+    def measureLatencies(self, samples: int = 20) -> list:
+        results = []
+        for device, slave, busUrl, request in self._getCalibrationRequests():
+            bus = self.getModbusBus(busUrl=busUrl)
+            latencies = []
+            failures = 0
+            try:
+                # Warm up, the first request also opens the connection
+                self._execute(bus, request)
+                for sample in range(samples):
+                    startTime = time.monotonic()
+                    if self._execute(bus, request) is None:
+                        failures += 1
+                    else:
+                        latencies.append(time.monotonic() - startTime)
+            finally:
+                ModbusBusPool.releaseBus(bus)
+            latencies.sort()
+            results.append({'device': device,
+                            'slave': slave,
+                            'samples': samples,
+                            'failures': failures,
+                            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                            'p99_ms': round(latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000, 1)
+                            if latencies else None,
+                            'max_ms': round(latencies[-1] * 1000, 1) if latencies else None})
+        return results
+
+    # Expected cycle times: every device polled once plus a relay write, and the same cycle with one lost frame
+    @staticmethod
+    def _estimateCycleSec(latencies: list, timeoutSec: float) -> tuple:
+        relayLatency = [latency['p50_ms'] for latency in latencies if latency['device'] == SaunaDevUtils.DEVICE_RELAY_MODULE]
+        cycleSec = (sum(latency['p50_ms'] for latency in latencies) + sum(relayLatency)) / 1000
+        return cycleSec, cycleSec + timeoutSec
+
+    # Measures the bus and recommends the shortest safe timeout. The baud rate stays as configured: only the
+    # sensor baud rate can be switched through its registers and the baud rates the relay and fan modules
+    # support cannot be queried.
+    # apply - writes the timeout into the [modbus] section.
+    # Returns a report.
+    def calibrateBusTiming(self, samples: int = 20, apply: bool = False) -> str:
+        latencies = self.measureLatencies(samples)
+        currentTimeoutSec = self._ctx.getModbusSerialTimeout()
+        failed = [f"{latency['device']} ({latency['failures']}/{latency['samples']} failed)"
+                  for latency in latencies if latency['failures'] > 0]
+        if failed:
+            return f"Error. Requests failed during calibration: {', '.join(failed)}. Fix the bus first."
+        slowestSec = max(latency['max_ms'] for latency in latencies) / 1000
+        timeoutSec = max(self._calibrationMinTimeoutSec,
+                         math.ceil(slowestSec * self._calibrationSafetyFactor * 100) / 100)
+        baudRate = self._ctx.getModbusSerialBaudRate()
+
+        lines = [f"{latency['device']} {latency['slave']}: p50 {latency['p50_ms']} ms, p99 {latency['p99_ms']} ms, "
+                 f"max {latency['max_ms']} ms" for latency in latencies]
+        cycleSec, lostFrameCycleSec = self._estimateCycleSec(latencies, currentTimeoutSec)
+        lines.append(f"Current: timeout {currentTimeoutSec} s, {baudRate} baud, cycle {cycleSec:.3f} s, "
+                     f"{lostFrameCycleSec:.3f} s with a lost frame")
+        cycleSec, lostFrameCycleSec = self._estimateCycleSec(latencies, timeoutSec)
+        lines.append(f"Recommended: timeout {timeoutSec} s, cycle {cycleSec:.3f} s, "
+                     f"{lostFrameCycleSec:.3f} s with a lost frame")
+        if apply:
+            self._ctx.setModbusSerialTimeout(timeoutSec)
+            lines.append('Applied.')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Finds the sauna Modbus devices and calibrates the bus timing.')
+    parser.add_argument('--calibrate', action='store_true', help='measure the bus instead of scanning it')
+    parser.add_argument('--bus', action='append', default=[],
+                        help='serial port, tcp://host:port or rtu_over_tcp://host:port, default from sauna.ini')
+    parser.add_argument('--baud-rate', type=int, action='append', default=[], help='baud rate to scan')
+    parser.add_argument('--samples', type=int, default=20, help='requests per device during calibration')
+    parser.add_argument('--apply', action='store_true', help='write the results into sauna.ini')
+    args = parser.parse_args()
+
+    devUtils = SaunaDevUtils(SaunaContext())
+    if args.calibrate:
+        print(devUtils.calibrateBusTiming(args.samples, args.apply))
+    else:
+        discovered = devUtils.discoverDevices(args.bus, args.baud_rate)
+        for device in discovered:
+            print(f"{device['bus'] or 'default bus'} {device['baud_rate'] or ''} slave {device['slave']}: "
+                  f"{device['device']} ({device['latency_ms']} ms)")
+        if args.apply:
+            print(devUtils.applyDiscoveredLayout(discovered))
@@ -1,11 +1,18 @@
-import asyncio
 import time
 import logging
-from pymodbus.client import AsyncModbusSerialClient
-from pymodbus.exceptions import ModbusException
+from concurrent.futures import Future
 from core.SaunaErrorMgr import SaunaErrorMgr
 from core.SaunaContext import SaunaContext
+from hardware.ModbusBusWorker import ModbusBusWorker
+from hardware.ModbusBusPool import ModbusBusPool
+from hardware.ModbusTransport import ModbusTransport
+from hardware.ModbusTrafficRecorder import ModbusTrafficRecorder
+from hardware.ModbusStats import ModbusStats
+from hardware.ModbusCircuitBreaker import ModbusCircuitBreaker
+from hardware.PollingScheduler import PollingScheduler
 from util.Timer import Timer
+from util.CycleProfiler import CycleProfiler
+from util.Clock import Clock
 
 
 class ModbusResponseError():
@@ -13,6 +20,103 @@ class ModbusResponseError():
         return True
 
 
+class ModbusReadPlanner:
+
+    # Modbus limits a single read holding registers request to 125 registers
+    _maxRegistersPerRead = 125
+
+    # maxGap - max number of unused registers read along to join two addresses into one request.
+    # At 9600 baud an extra register adds ~2ms to a response while every extra request costs tens of milliseconds.
+    def __init__(self, maxGap: int = 16):
+        self._maxGap = maxGap
+
+    # Groups register addresses into the fewest contiguous read holding registers requests per slave.
+    # addresses - {slaveId: iterable of register addresses}
+    # Returns a list of (slaveId, startAddress, count) requests.
+    def plan(self, addresses: dict) -> list:
+        requests = []
+        for slave in sorted(addresses):
+            start = end = None
+            for address in sorted(set(addresses[slave])):
+                if start is not None \
+                        and address - end - 1 <= self._maxGap \
+                        and address - start + 1 <= self._maxRegistersPerRead:
+                    end = address
+                    continue
+                if start is not None:
+                    requests.append((slave, start, end - start + 1))
+                start = end = address
+            if start is not None:
+                requests.append((slave, start, end - start + 1))
+        return requests
+
+
+class RelayBank:
+
+    # reassertPeriodSec - an unchanged coil state gets written again after this period, 0 writes it every time
+    # clock - monotonic, so a wall clock jump neither suppresses nor forces a re-assert
+    def __init__(self, reassertPeriodSec: float = 60, clock: Clock = None):
+        self._reassertPeriodSec = reassertPeriodSec
+        self._clock = clock if clock else Clock.getDefault()
+        # Last known coil states, {coilAddress: bool}
+        self._states = {}
+        # Coil changes not yet written to the relay module, {coilAddress: bool}
+        self._pending = {}
+        # Last time each coil has been written, {coilAddress: time}
+        self._writeTimes = {}
+
+    # Returns (startAddress, count) of a single read coils request covering all coils
+    def getReadRange(self, coils: list) -> tuple:
+        start = min(coils)
+        return start, max(coils) - start + 1
+
+    # Updates the snapshot from a read coils response that started at startAddress
+    def update(self, startAddress: int, bits: list, coils: list) -> None:
+        for coil in coils:
+            self._states[coil] = bool(bits[coil - startAddress])
+
+    # Returns the pending state if the coil is about to change, the last known state otherwise
+    def get(self, coil: int) -> bool:
+        return self._pending.get(coil, self._states.get(coil, False))
+
+    # Queues a change only if the coil is not known to be in this state already or the re-assert is due.
+    # The snapshot gets re-read every cycle, so a relay module reset shows up as a change and gets rewritten.
+    def set(self, coil: int, state: bool) -> None:
+        if coil not in self._pending \
+                and self._states.get(coil) == state \
+                and coil in self._writeTimes \
+                and self._clock.now() - self._writeTimes[coil] < self._reassertPeriodSec:
+            return
+        self._pending[coil] = state
+
+    def hasPendingChanges(self) -> bool:
+        return len(self._pending) > 0
+
+    # Returns a list of (startAddress, [states]) write coils requests for all pending changes.
+    # Known coils between pending changes are written with their current state to keep a single request.
+    def getPendingWrites(self) -> list:
+        writes = []
+        for coil in sorted(self._pending):
+            if writes:
+                start, states = writes[-1]
+                gap = range(start + len(states), coil)
+                if all(c in self._states or c in self._pending for c in gap):
+                    states.extend(self.get(c) for c in gap)
+                    states.append(self._pending[coil])
+                    continue
+            writes.append((coil, [self._pending[coil]]))
+        return writes
+
+    # Marks a write coils request as completed
+    def commit(self, startAddress: int, states: list) -> None:
+        for offset, state in enumerate(states):
+            coil = startAddress + offset
+            self._states[coil] = state
+            self._writeTimes[coil] = self._clock.now()
+            if self._pending.get(coil) == state:
+                del self._pending[coil]
+
+
 class SaunaDevices:
 
     # Sauna Context Manager
@@ -23,8 +127,7 @@ class SaunaDevices:
     _lastHotRoomHumidity = 0
 
     # Relay Module Configuration
-    _lastFanRelayStatus = [False, False]
-    _lastHotRoomLightOnStatus = False
+    _relayBank: RelayBank = None
 
     # Fan Module Configuration
     _lastRestingRoomTemp = 0
@@ -39,7 +142,6 @@ class SaunaDevices:
     # Heater Data
     _lastTimeHeaterOff = time.time()
     _lastTimeHeaterOn = time.time()
-    _lastHeaterOnStatus = False
 
     # Fan Timer
     _fanAccelerationTimer = None
@@ -48,6 +150,24 @@ class SaunaDevices:
     _leftFanPriorState = False
     _rightFanPriorState = False
 
+    # Holding registers decoded from the last refresh, {(slaveId, address): value}
+    _registerSnapshot: dict = None
+    # Block reads submitted by the last refresh and not decoded yet, [(slaveId, startAddress, count, Future)]
+    _pendingRegisterReads: list = None
+    # Signals read by the last refresh, {signal: (slaveId, [addresses])}
+    _polledSignals: dict = None
+    _pollingScheduler: PollingScheduler = None
+    # Last value written to each holding register and when, {(slaveId, address): (value, time)}
+    _registerShadow: dict = None
+    _readPlanner: ModbusReadPlanner = None
+    _modbusStats: ModbusStats = None
+    _circuitBreaker: ModbusCircuitBreaker = None
+    # Bus worker of every module, {slaveId: ModbusBusWorker}
+    _buses: dict = None
+    _trafficRecorder: ModbusTrafficRecorder = None
+    # Control cycle profiler set up by the controller, None if the devices run without it
+    _profiler: CycleProfiler = None
+
 
     def __init__(self, ctx: SaunaContext, errorMgr: SaunaErrorMgr):
         # Set modbus Logging Level
@@ -58,9 +178,41 @@ class SaunaDevices:
         self._errorMgr = errorMgr
         # Configure logging for asyncio
         logging.getLogger('asyncio').setLevel(ctx.getLogLevel())
-        # Create persistent event loop for async operations
-        self._loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self._loop)
+        self._profiler = self._ctx.getCycleProfiler()
+        # Request counts and latencies are published through the context for the UI and the web server
+        self._modbusStats = ModbusStats()
+        self._ctx.setModbusStats(self._modbusStats)
+        # A dead module must not slow down the requests to the other modules
+        self._circuitBreaker = ModbusCircuitBreaker(self._ctx.getModbusBreakerFailureThreshold(),
+                                                    self._ctx.getModbusBreakerInitialBackoffSec(),
+                                                    self._ctx.getModbusBreakerMaxBackoffSec())
+        self._ctx.setModbusCircuitBreaker(self._circuitBreaker)
+        # Captures all Modbus traffic for a later replay
+        if self._ctx.getModbusCaptureFile():
+            self._trafficRecorder = ModbusTrafficRecorder(self._ctx.getModbusCaptureFile())
+        # Every bus has its own worker thread executing its requests in priority order,
+        # so requests to modules on different buses run concurrently
+        self._buses = {}
+        for slave, busUrl in [(self._ctx.getSaunaSensorsDeviceId(), self._ctx.getSaunaSensorsBus()),
+                              (self._ctx.getRelayModuleDeviceId(), self._ctx.getRelayModuleBus()),
+                              (self._ctx.getFanControlModuleDeviceId(), self._ctx.getFanControlModuleBus())]:
+            self._buses[slave] = ModbusBusPool.getBus(ModbusTransport.fromContext(self._ctx, busUrl=busUrl),
+                                                      self._ctx.getModbusSerialRetries(),
+                                                      self._modbusStats, self._circuitBreaker,
+                                                      self._trafficRecorder)
+        # Every signal is polled at its own rate depending on the controller state
+        self._pollingScheduler = PollingScheduler()
+        self._configurePollingScheduler()
+        # Read all relay coils at once
+        self._relayBank = RelayBank(self._ctx.getModbusWriteReassertPeriodSec())
+        self.refreshRelays()
+        # Read all polled registers with as few requests as possible
+        self._registerSnapshot = {}
+        self._pendingRegisterReads = []
+        self._polledSignals = {}
+        self._registerShadow = {}
+        self._readPlanner = ModbusReadPlanner(self._ctx.getModbusMaxReadGap())
+        self.refreshRegisters()
         # Initialize Hot Room Light
         self._setRelayStatus(self._ctx.getHotRoomLightCoilAddr(), self._ctx.getHotRoomLightAutoOnOff() or self._ctx.isSaunaOn())
         # Initialize Fans
@@ -70,9 +222,6 @@ class SaunaDevices:
         # Fans are off initially and get managed by the SaunaController
         self._setFanRelayStatus(self._ctx.getRightFanRelayCoilAddr(), False)
         self._setFanRelayStatus(self._ctx.getLeftFanRelayCoilAddr(), False)
-        # These 2 functions will populate _lastFanRelayStatus[]
-        self._getFanRelayStatus(self._ctx.getRightFanRelayCoilAddr())
-        self._getFanRelayStatus(self._ctx.getLeftFanRelayCoilAddr())
         # This function will populate _lastRestingRoomTemp
         self.getRestingRoomTemp()
         # This function will populate _lastFanSpeed[]
@@ -89,6 +238,8 @@ class SaunaDevices:
         self.turnHeaterOff()
         # Initialize hot room light
         self.turnHotRoomLightOnOff(self._ctx.getHotRoomLightAutoOnOff() or self._ctx.isSaunaOn())
+        # Write all initial relay states at once
+        self.flushRelays()
         # Initialize fan timer to prevent false errors during fan acceleration
         self._fanAccelerationTimer = Timer(10)
         # Release resources on exit
@@ -99,41 +250,203 @@ class SaunaDevices:
     def _onExit(self):
         # Give it a chance to turn equipment off
         time.sleep(10)
-        if self._client:
-            self._loop.run_until_complete(self._client.close())
-        if self._loop:
-            self._loop.close()
+        # Executes requests still in the queue and closes the clients
+        for bus in self._buses.values():
+            ModbusBusPool.releaseBus(bus,
+                                     self._ctx.getModbusSerialTimeout() * (self._ctx.getModbusSerialRetries() + 1) * 10)
+        if self._trafficRecorder:
+            self._trafficRecorder.close()
+
+    # ---------------------------------------- Polling Schedule ---------------------------------------
+
+    def _configurePollingScheduler(self) -> None:
+        activeIntervalSec = self._ctx.getActivePollingIntervalSec()
+        idleIntervalSec = self._ctx.getIdlePollingIntervalSec()
+        self._pollingScheduler.setIntervals(PollingScheduler.SIGNAL_HOT_ROOM,
+                                            self._ctx.getHotRoomPollingIntervalSec(), activeIntervalSec,
+                                            idleIntervalSec)
+        self._pollingScheduler.setIntervals(PollingScheduler.SIGNAL_RELAYS,
+                                            self._ctx.getRelayPollingIntervalSec(), activeIntervalSec, idleIntervalSec)
+        self._pollingScheduler.setIntervals(PollingScheduler.SIGNAL_FAN_STATUS,
+                                            self._ctx.getFanStatusPollingIntervalSec(), activeIntervalSec,
+                                            idleIntervalSec)
+        self._pollingScheduler.setIntervals(PollingScheduler.SIGNAL_FAN_RPM,
+                                            self._ctx.getFanRpmPollingIntervalSec(), activeIntervalSec, idleIntervalSec)
+        self._pollingScheduler.setIntervals(PollingScheduler.SIGNAL_RESTING_ROOM,
+                                            self._ctx.getRestingRoomPollingIntervalSec(), activeIntervalSec,
+                                            idleIntervalSec)
+
+    def _getPollingState(self) -> str:
+        if self.isHeaterOn():
+            return PollingScheduler.STATE_HEATING
+        if self._ctx.isSaunaOn() or self.isRightFanOn() or self.isLeftFanOn():
+            return PollingScheduler.STATE_ACTIVE
+        return PollingScheduler.STATE_IDLE
+
+    # ---------------------------------------- Register Snapshot ---------------------------------------
+
+    # Holding registers of every polled signal, {signal: (slaveId, [addresses])}
+    def _getSignalRegisters(self) -> dict:
+        fanModuleId = self._ctx.getFanControlModuleDeviceId()
+        return {
+            PollingScheduler.SIGNAL_HOT_ROOM: (self._ctx.getSaunaSensorsDeviceId(),
+                                               [self._ctx.getTempSensorAddr(), self._ctx.getHumiditySensorAddr()]),
+            PollingScheduler.SIGNAL_FAN_STATUS: (fanModuleId,
+                                                 [self._ctx.getFanStatusAddr(),
+                                                  self._ctx.getNumberOfFansAddr(),
+                                                  self._ctx.getFanFaultStatusAddr(),
+                                                  # Read back the fan speed setting to verify the last write
+                                                  self._ctx.getFanSpeedAddr()]),
+            PollingScheduler.SIGNAL_FAN_RPM: (fanModuleId,
+                                              [self._ctx.getFanSpeedRpmAddr(self._rightFanId),
+                                               self._ctx.getFanSpeedRpmAddr(self._leftFanId)]),
+            PollingScheduler.SIGNAL_RESTING_ROOM: (fanModuleId, [self._ctx.getFanModuleRoomTempAddr()])
+        }
+
+    # Holding registers of all signals due in this control cycle, {slaveId: set of register addresses}
+    def _getPolledRegisters(self) -> dict:
+        state = self._getPollingState()
+        self._polledSignals = {}
+        registers = {}
+        for signal, (slave, addresses) in self._getSignalRegisters().items():
+            if self._pollingScheduler.isDue(signal, state):
+                self._pollingScheduler.markPolled(signal)
+                self._polledSignals[signal] = (slave, addresses)
+                registers.setdefault(slave, set()).update(addresses)
+        return registers
+
+    # Sensor readings drive the heater. Fan module readings are telemetry and must not delay heater control.
+    def _getRegisterReadPriority(self, slave: int) -> int:
+        if slave == self._ctx.getSaunaSensorsDeviceId():
+            return ModbusBusWorker.PRIORITY_CONTROL
+        return ModbusBusWorker.PRIORITY_TELEMETRY
+
+    # Submits reads of all registers due in this cycle with the fewest requests. Getters decode values from
+    # this snapshot, so call it once at the beginning of every control cycle. Registers not due keep their last
+    # value. A getter only waits for the block holding its register, so heater control does not wait for slow
+    # fan module reads.
+    def refreshRegisters(self) -> None:
+        self._pendingRegisterReads = []
+        for slave, start, count in self._readPlanner.plan(self._getPolledRegisters()):
+            submitTime = time.monotonic()
+            future = self._submit_read_holding_registers(start, slave, count, self._getRegisterReadPriority(slave))
+            self._pendingRegisterReads.append((slave, start, count, future, submitTime))
+
+    def _decodeRegisterRead(self, slave: int, start: int, count: int, future: Future, submitTime: float) -> None:
+        response = self._waitForResponse(future, slave, 3, submitTime)
+        if response.isError():
+            # Getters report errors for registers missing from the snapshot
+            for address in range(start, start + count):
+                self._registerSnapshot.pop((slave, address), None)
+            # Retry the signals of this block during the next cycle
+            for signal, (signalSlave, addresses) in self._polledSignals.items():
+                if signalSlave == slave and any(start <= address < start + count for address in addresses):
+                    self._pollingScheduler.reset(signal)
+            return
+        for offset, value in enumerate(response.registers):
+            key = (slave, start + offset)
+            self._registerSnapshot[key] = value
+            # A register that does not hold the value written last (e.g. the module has been reset) must be rewritten
+            if key in self._registerShadow and self._registerShadow[key][0] != value:
+                del self._registerShadow[key]
+
+    # Returns False if the value has been written already and the periodic re-assert is not due yet. Timed on
+    # the monotonic clock, so a wall clock jump neither suppresses nor forces a re-assert.
+    def _isRegisterWriteNeeded(self, address: int, value: int, slave: int) -> bool:
+        shadow = self._registerShadow.get((slave, address))
+        return shadow is None \
+            or shadow[0] != value \
+            or Clock.getDefault().now() - shadow[1] >= self._ctx.getModbusWriteReassertPeriodSec()
+
+    def _shadowRegisterWrite(self, address: int, value: int, slave: int) -> None:
+        self._registerShadow[(slave, address)] = (value, Clock.getDefault().now())
+
+    # Returns None if the register could not be read during the last refresh
+    def _getRegister(self, address: int, slave: int):
+        for read in list(self._pendingRegisterReads):
+            readSlave, start, count, future, submitTime = read
+            if readSlave == slave and start <= address < start + count:
+                self._pendingRegisterReads.remove(read)
+                self._decodeRegisterRead(readSlave, start, count, future, submitTime)
+        return self._registerSnapshot.get((slave, address))
+
+    # ---------------------------------------- Relay Bank ---------------------------------------
+
+    def _getRelayCoils(self) -> dict:
+        return {self._ctx.getHeaterRelayCoilAddr(): 'Heater',
+                self._ctx.getHotRoomLightCoilAddr(): 'Hot Room Light',
+                self._ctx.getRightFanRelayCoilAddr(): 'Right Fan',
+                self._ctx.getLeftFanRelayCoilAddr(): 'Left Fan'}
+
+    # Reads all relay coils with a single request if the relay states are due in this cycle. Relay status
+    # queries are served from this snapshot, so call it once at the beginning of every control cycle.
+    def refreshRelays(self) -> None:
+        if not self._pollingScheduler.isDue(PollingScheduler.SIGNAL_RELAYS, self._getPollingState()):
+            return
+        self._pollingScheduler.markPolled(PollingScheduler.SIGNAL_RELAYS)
+        coils = list(self._getRelayCoils())
+        start, count = self._relayBank.getReadRange(coils)
+        response = self._modbus_read_coils(start, self._ctx.getRelayModuleDeviceId(), count)
+        if response.isError():
+            self._errorMgr.raiseRelayModuleError('Cannot Get Relay Status.')
+            self._pollingScheduler.reset(PollingScheduler.SIGNAL_RELAYS)
+        else:
+            self._errorMgr.eraseRelayModuleError()
+            self._relayBank.update(start, response.bits, coils)
+
+    # Writes all pending relay changes, normally with a single request. Call it once per control cycle
+    # after all relays have been set. Failed changes stay pending and get retried during the next flush.
+    # Writes that switch the heater jump ahead of all other queued Modbus requests.
+    def flushRelays(self) -> None:
+        coils = self._getRelayCoils()
+        heaterCoil = self._ctx.getHeaterRelayCoilAddr()
+        for start, states in self._relayBank.getPendingWrites():
+            priority = ModbusBusWorker.PRIORITY_SAFETY if start <= heaterCoil < start + len(states) \
+                else ModbusBusWorker.PRIORITY_CONTROL
+            response = self._modbus_write_coils(start, states, self._ctx.getRelayModuleDeviceId(), priority)
+            if response.isError():
+                names = ', '.join(coils.get(start + offset, f'Relay {start + offset}') for offset in range(len(states)))
+                self._errorMgr.raiseRelayModuleError(f'Cannot Turn {names} On or Off.')
+            else:
+                self._errorMgr.eraseRelayModuleError()
+                self._relayBank.commit(start, states)
 
     # ---------------------------------------- Sauna Sensors ---------------------------------------
 
     def getHotRoomTemperature(self, system='F') -> int:
-        response=self._modbus_read_holding_registers(self._ctx.getTempSensorAddr(), self._ctx.getSaunaSensorsDeviceId())
-        if response.isError():
+        value = self._getRegister(self._ctx.getTempSensorAddr(), self._ctx.getSaunaSensorsDeviceId())
+        if value is None:
             self._errorMgr.raiseSensorModuleError('Cannot Read Temperature Sensor.')
         else:
             self._errorMgr.eraseSensorModuleError()
-            self._lastHotRoomTemperatureC = response.registers[0] / 10
+            self._lastHotRoomTemperatureC = value / 10
         if system == 'F':
             return round((self._lastHotRoomTemperatureC * 9 / 5) + 32)
         else:
             return round(self._lastHotRoomTemperatureC)
 
     def getHotRoomHumidity(self) -> int:
-        response=self._modbus_read_holding_registers(self._ctx.getHumiditySensorAddr(), self._ctx.getSaunaSensorsDeviceId())
-        if response.isError():
+        value = self._getRegister(self._ctx.getHumiditySensorAddr(), self._ctx.getSaunaSensorsDeviceId())
+        if value is None:
             self._errorMgr.raiseSensorModuleError('Cannot Read Humidity Sensor.')
         else:
             self._errorMgr.eraseSensorModuleError()
-            self._lastHotRoomHumidity = response.registers[0] / 10
+            self._lastHotRoomHumidity = value / 10
         return round(self._lastHotRoomHumidity)
 
+    # Hot room readings are stale while the sensor module does not respond. The getters return
+    # the last known values then.
+    def isHotRoomDataStale(self) -> bool:
+        return self._circuitBreaker.isOpen(self._ctx.getSaunaSensorsDeviceId())
+
     def getRestingRoomTemp(self, system='F') -> int:
-        response=self._modbus_read_holding_registers(self._ctx.getFanModuleRoomTempAddr(), self._ctx.getSaunaSensorsDeviceId())
-        if response.isError():
+        # Resting room temperature sensor is connected to the fan module
+        value = self._getRegister(self._ctx.getFanModuleRoomTempAddr(), self._ctx.getFanControlModuleDeviceId())
+        if value is None:
             self._errorMgr.raiseFanModuleError('Cannot get Resting Room Temperature.')
         else:
             self._errorMgr.eraseFanModuleError()
-            self._lastRestingRoomTemp = response.registers[0] - 40
+            self._lastRestingRoomTemp = value - 40
         if system == 'F':
             return round((self._lastRestingRoomTemp * 9 / 5) + 32)
         return self._lastRestingRoomTemp
@@ -142,30 +455,20 @@ class SaunaDevices:
     # ---------------------------------- Sauna Heater Functions ----------------------------------
 
     def isHeaterOn(self) -> bool:
-        response = self._modbus_read_coils(self._ctx.getHeaterRelayCoilAddr(), self._ctx.getRelayModuleDeviceId())
-        if response.isError():
-            self._errorMgr.raiseRelayModuleError('Cannot get Heater Status.')
-        else:
-            self._errorMgr.eraseRelayModuleError()
-            self._lastHeaterOnStatus = response.bits[self._ctx.getHeaterRelayCoilAddr()]
-        return self._lastHeaterOnStatus
+        return self._relayBank.get(self._ctx.getHeaterRelayCoilAddr())
 
     def isHeaterOff(self) -> bool:
         return not self.isHeaterOn()
 
+    # The relay gets switched by the next flushRelays()
     def setHeaterRelay(self, status: bool) -> None:
-        response = self._modbus_write_coil(self._ctx.getHeaterRelayCoilAddr(), status, self._ctx.getRelayModuleDeviceId())
-        if response.isError():
-            self._errorMgr.raiseRelayModuleError('Cannot Turn the Heater On or Off.')
-        else:
-            self._errorMgr.eraseRelayModuleError()
-            # If heater is actually getting turned on with this call
-            if status and not self._lastHeaterOnStatus:
-                self._lastTimeHeaterOff = time.time()
-            # If heater is actually getting turned off with this call
-            if not status and self._lastHeaterOnStatus:
-                self._lastTimeHeaterOn = time.time()
-            self._lastHeaterOnStatus = status
+        # If heater is actually getting turned on with this call
+        if status and not self.isHeaterOn():
+            self._lastTimeHeaterOff = time.time()
+        # If heater is actually getting turned off with this call
+        if not status and self.isHeaterOn():
+            self._lastTimeHeaterOn = time.time()
+        self._relayBank.set(self._ctx.getHeaterRelayCoilAddr(), status)
 
     def turnHeaterOn(self) -> None:
         self.setHeaterRelay(True)
@@ -176,77 +479,56 @@ class SaunaDevices:
         self._ctx.setHeaterOff()
 
     def getHotRoomLightStatus(self) -> bool:
-        response = self._modbus_read_coils(self._ctx.getHotRoomLightCoilAddr(), self._ctx.getRelayModuleDeviceId())
-        if response.isError():
-            self._errorMgr.raiseRelayModuleError('Cannot get Hot Room Light status.')
-        else:
-            self._errorMgr.eraseRelayModuleError()
-            self._lastHotRoomLightOnStatus = response.bits[self._ctx.getHotRoomLightCoilAddr()]
-        return self._lastHotRoomLightOnStatus
+        return self._relayBank.get(self._ctx.getHotRoomLightCoilAddr())
 
+    # The relay gets switched by the next flushRelays()
     def turnHotRoomLightOnOff(self, status: bool) -> None:
-        response = self._modbus_write_coil(self._ctx.getHotRoomLightCoilAddr(), status, self._ctx.getRelayModuleDeviceId())
-        if response.isError():
-            self._errorMgr.raiseRelayModuleError('Cannot Turn the Hot Room Light On or Off.')
-        else:
-            self._errorMgr.eraseRelayModuleError()
-            self._lastHotRoomLightOnStatus = status
+        self._relayBank.set(self._ctx.getHotRoomLightCoilAddr(), status)
 
 
     # ------------------------------------- Vent Fans Functions -------------------------------------
 
+    # Relays get switched by the next flushRelays()
     def _setRelayStatus(self, relayCoilId: int, state: bool) -> None:
-        response = self._modbus_write_coil(relayCoilId, state, self._ctx.getRelayModuleDeviceId())
-        if response.isError():
-            self._errorMgr.raiseRelayModuleError('Cannot Manipulate Relays.')
-        else:
-            self._errorMgr.eraseRelayModuleError()
+        self._relayBank.set(relayCoilId, state)
 
     def _getFanRelayStatus(self, fanCoilId: int) -> bool:
-        response = self._modbus_read_coils(fanCoilId, self._ctx.getRelayModuleDeviceId())
-        if response.isError():
-            self._errorMgr.raiseRelayModuleError('Cannot Get Fan Status.')
-        else:
-            self._errorMgr.eraseRelayModuleError()
-            self._lastFanRelayStatus[fanCoilId - 2] = response.bits[0]
-        return self._lastFanRelayStatus[fanCoilId - 2]
+        return self._relayBank.get(fanCoilId)
 
     def _setFanRelayStatus(self, fanCoilId: int, state: bool) -> None:
-        response = self._modbus_write_coil(fanCoilId, state, self._ctx.getRelayModuleDeviceId())
-        if response.isError():
-            self._errorMgr.raiseRelayModuleError('Cannot Turn a Fan On or Off.')
-        else:
-            self._errorMgr.eraseRelayModuleError()
-            self._lastFanRelayStatus[fanCoilId - 2] = state
+        self._relayBank.set(fanCoilId, state)
 
     # fanId - either _rightFanId or _leftFanId
     def _getFanStatus(self, fanId) -> bool:
         # low 4 bits correspond to 4 fans, from right to left, the most right bit corresponds to fan 1,
         # 0 means the fan stops and 1 means the fan is running
-        response = self._modbus_read_holding_registers(self._ctx.getFanStatusAddr(), self._ctx.getFanControlModuleDeviceId())
-        if response.isError():
+        value = self._getRegister(self._ctx.getFanStatusAddr(), self._ctx.getFanControlModuleDeviceId())
+        if value is None:
             self._errorMgr.raiseFanModuleError('Cannot Get Fan Status from Fan Module.RelayModule')
         else:
             self._errorMgr.eraseFanModuleError()
-            self._lastFanStatus[fanId-1] = (response.registers[0] & fanId) > 0
+            self._lastFanStatus[fanId-1] = (value & fanId) > 0
         return self._lastFanStatus[fanId-1]
 
     def _getFanSpeedRpm(self, fanId: int) -> int:
-        response = self._modbus_read_holding_registers(6 + fanId, self._ctx.getFanControlModuleDeviceId())
-        if response.isError():
+        value = self._getRegister(self._ctx.getFanSpeedRpmAddr(fanId), self._ctx.getFanControlModuleDeviceId())
+        if value is None:
             self._errorMgr.raiseFanModuleError('Cannot Get Fan Speed.')
         else:
             self._errorMgr.eraseFanModuleError()
-            self._lastFanSpeed[fanId - 1] = response.registers[0]
+            self._lastFanSpeed[fanId - 1] = value
         return self._lastFanSpeed[fanId - 1]
 
     # Sets speed for all fans. 0% ... 100%. Most fans will start running at 10% or more
     def setFanSpeed(self, speedPct: int) -> None:
+        if not self._isRegisterWriteNeeded(self._ctx.getFanSpeedAddr(), speedPct, self._ctx.getFanControlModuleDeviceId()):
+            return
         response = self._modbus_write_register(self._ctx.getFanSpeedAddr(), speedPct, self._ctx.getFanControlModuleDeviceId())
         if response.isError():
             self._errorMgr.raiseFanModuleError('Cannot Change Fan Speed.')
         else:
             self._errorMgr.eraseFanModuleError()
+            self._shadowRegisterWrite(self._ctx.getFanSpeedAddr(), speedPct, self._ctx.getFanControlModuleDeviceId())
 
     def getLeftFanSpeedRpm(self) -> int:
         return self._getFanSpeedRpm(self._leftFanId)
@@ -291,37 +573,39 @@ class SaunaDevices:
         self._rightFanPriorState = state
 
     def getNumberOfFans(self) -> int:
-        response = self._modbus_read_holding_registers(self._ctx.getNumberOfFansAddr(), self._ctx.getFanControlModuleDeviceId())
-        if response.isError():
+        value = self._getRegister(self._ctx.getNumberOfFansAddr(), self._ctx.getFanControlModuleDeviceId())
+        if value is None:
             self._errorMgr.raiseFanModuleError('Cannot Get Number of Fans.')
             return self._ctx.getNumberOfFans()
         else:
             self._errorMgr.eraseFanModuleError()
-            return response.registers[0]
+            return value
 
     def setNumberOfFans(self, nFans: int) -> None:
+        if not self._isRegisterWriteNeeded(self._ctx.getNumberOfFansAddr(), nFans, self._ctx.getFanControlModuleDeviceId()):
+            return
         response = self._modbus_write_register(self._ctx.getNumberOfFansAddr(), nFans, self._ctx.getFanControlModuleDeviceId())
         if response.isError():
             self._errorMgr.raiseFanModuleError('Cannot Set Number of Fans.')
         else:
             self._errorMgr.eraseFanModuleError()
+            self._shadowRegisterWrite(self._ctx.getNumberOfFansAddr(), nFans, self._ctx.getFanControlModuleDeviceId())
 
     def _checkFanFaultStatus(self, fanId: int) -> bool:
         # Give fan a chance to gain speed
         if self._fanAccelerationTimer.isRunning():
             return False
-        response = self._modbus_read_holding_registers(self._ctx.getFanFaultStatusAddr(), self._ctx.getFanControlModuleDeviceId())
-        if response.isError():
+        value = self._getRegister(self._ctx.getFanFaultStatusAddr(), self._ctx.getFanControlModuleDeviceId())
+        if value is None:
             self._errorMgr.raiseFanModuleError('Cannot Read Fan Status.')
             return True
         else:
             self._errorMgr.eraseFanModuleError()
             # Bit set to 0 corresponds to error
-            return (response.registers[0] & fanId) == 0
+            return (value & fanId) == 0
 
     def isLeftFanOk(self) -> bool:
         # Fan controller reports fan staus failed if the fan is off managed by a relay
-        a = self._checkFanFaultStatus(self._leftFanId)
         return not self._ctx.isLeftFanEnabled() or not self._checkFanFaultStatus(self._leftFanId)
 
     def isRightFanOk(self) -> bool:
@@ -340,69 +624,70 @@ class SaunaDevices:
 
     # ----------------------------------- Modbus Client Functions -------------------------------------
 
-    _client: AsyncModbusSerialClient = None
-
-    def _modbus_read_holding_registers(self, address: int, slave: int, count: int=1):
-        async def _read():
-            try:
-                if self._client is None:
-                    self._client = AsyncModbusSerialClient(port=self._ctx.getModbusSerialPort(),
-                                                           baudrate=self._ctx.getModbusSerialBaudRate(),
-                                                           timeout=self._ctx.getModbusSerialTimeout(),
-                                                           retries=self._ctx.getModbusSerialRetries())
-                    await self._client.connect()
-                response = await self._client.read_holding_registers(address, count=1, slave=slave)
-                return response
-            except ModbusException as e:
-                self._errorMgr.raiseModbusError(e)
-                return ModbusResponseError()
-        return self._loop.run_until_complete(_read())
-
-    def _modbus_write_register(self, address: int, value: int, slave: int):
-        async def _read():
-            try:
-                if self._client is None:
-                    self._client = AsyncModbusSerialClient(port=self._ctx.getModbusSerialPort(),
-                                                    baudrate=self._ctx.getModbusSerialBaudRate(),
-                                                    timeout=self._ctx.getModbusSerialTimeout(),
-                                                    retries=self._ctx.getModbusSerialRetries())
-                    await self._client.connect()
-                response = await self._client.write_register(address=address, value=value, slave=slave)
-                return response
-            except ModbusException as e:
-                self._errorMgr.raiseModbusError(e)
-                return ModbusResponseError()
-        return self._loop.run_until_complete(_read())
-
-    def _modbus_read_coils(self, address: int, slave: int, count: int=1):
-        async def _read():
-            try:
-                if self._client is None:
-                    self._client = AsyncModbusSerialClient(port=self._ctx.getModbusSerialPort(),
-                                                    baudrate=self._ctx.getModbusSerialBaudRate(),
-                                                    timeout=self._ctx.getModbusSerialTimeout(),
-                                                    retries=self._ctx.getModbusSerialRetries())
-                    await self._client.connect()
-                response = await self._client.read_coils(address=address, count=count, slave=slave)
-                return response
-            except ModbusException as e:
-                self._errorMgr.raiseModbusError(e)
-                return ModbusResponseError()
-        return self._loop.run_until_complete(_read())
-
-
-    def _modbus_write_coil(self, address: int, value: bool, slave: int):
-        async def _read():
-            try:
-                if self._client is None:
-                    self._client = AsyncModbusSerialClient(port=self._ctx.getModbusSerialPort(),
-                                                    baudrate=self._ctx.getModbusSerialBaudRate(),
-                                                    timeout=self._ctx.getModbusSerialTimeout(),
-                                                    retries=self._ctx.getModbusSerialRetries())
-                    await self._client.connect()
-                response = await self._client.write_coil(address=address, value=value, slave=slave)
-                return response
-            except ModbusException as e:
-                self._errorMgr.raiseModbusError(e)
-                return ModbusResponseError()
-        return self._loop.run_until_complete(_read())
\ No newline at end of file
+    # Modules are mapped to their buses by slave ID, so slave IDs must be unique across all buses
+    def _getBus(self, slave: int) -> ModbusBusWorker:
+        return self._buses[slave]
+
+    # Waits for a submitted request. Returns ModbusResponseError if the request failed on the bus. The bus
+    # worker passes on any error of the client, e.g. OSError from the serial port, they all count as Modbus errors.
+    # The wait is recorded as a call of the control cycle stage running in this thread. Successful writes
+    # of count addresses starting at address and reads submitted at submitTime (default - now) advance the traces
+    # of the user commands.
+    def _waitForResponse(self, future: Future, slave: int, functionCode: int, submitTime: float = None,
+                         address: int = None, count: int = 1):
+        submitTime = time.monotonic() if submitTime is None else submitTime
+        startTime = time.perf_counter()
+        try:
+            response = future.result()
+        except Exception as e:
+            self._errorMgr.raiseModbusError(e)
+            return ModbusResponseError()
+        finally:
+            if self._profiler:
+                self._profiler.recordCall(f'{ModbusStats.FUNCTION_NAMES[functionCode]} {slave}',
+                                          time.perf_counter() - startTime)
+        if not response.isError():
+            if functionCode in (6, 15):
+                self._ctx.getCommandTracer().recordWrite(slave, address, count)
+            else:
+                self._ctx.getCommandTracer().recordReadBack(slave, submitTime)
+        return response
+
+    def _submit_read_holding_registers(self, address: int, slave: int, count: int = 1,
+                                       priority: int = ModbusBusWorker.PRIORITY_CONTROL) -> Future:
+        return self._getBus(slave).submit(lambda client: client.read_holding_registers(address, count=count, device_id=slave),
+                                priority, slave, 3, address, count)
+
+    def _submit_write_register(self, address: int, value: int, slave: int,
+                               priority: int = ModbusBusWorker.PRIORITY_CONTROL) -> Future:
+        return self._getBus(slave).submit(lambda client: client.write_register(address=address, value=value, device_id=slave),
+                                priority, slave, 6, address, 1, [value])
+
+    def _submit_read_coils(self, address: int, slave: int, count: int = 1,
+                           priority: int = ModbusBusWorker.PRIORITY_CONTROL) -> Future:
+        return self._getBus(slave).submit(lambda client: client.read_coils(address=address, count=count, device_id=slave),
+                                priority, slave, 1, address, count)
+
+    def _submit_write_coils(self, address: int, values: list, slave: int,
+                            priority: int = ModbusBusWorker.PRIORITY_CONTROL) -> Future:
+        # pymodbus pads the values list to full bytes, pass a copy
+        return self._getBus(slave).submit(lambda client: client.write_coils(address=address, values=list(values), device_id=slave),
+                                priority, slave, 15, address, len(values), list(values))
+
+    def _modbus_read_holding_registers(self, address: int, slave: int, count: int = 1,
+                                       priority: int = ModbusBusWorker.PRIORITY_CONTROL):
+        return self._waitForResponse(self._submit_read_holding_registers(address, slave, count, priority), slave, 3)
+
+    def _modbus_write_register(self, address: int, value: int, slave: int,
+                               priority: int = ModbusBusWorker.PRIORITY_CONTROL):
+        return self._waitForResponse(self._submit_write_register(address, value, slave, priority), slave, 6,
+                                     address=address)
+
+    def _modbus_read_coils(self, address: int, slave: int, count: int = 1,
+                           priority: int = ModbusBusWorker.PRIORITY_CONTROL):
+        return self._waitForResponse(self._submit_read_coils(address, slave, count, priority), slave, 1)
+
+    def _modbus_write_coils(self, address: int, values: list, slave: int,
+                            priority: int = ModbusBusWorker.PRIORITY_CONTROL):
+        return self._waitForResponse(self._submit_write_coils(address, values, slave, priority), slave, 15,
+                                     address=address, count=len(values))
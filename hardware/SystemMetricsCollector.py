@@ -0,0 +1,129 @@
+import os
+from util.Clock import Clock
+
+
+# Collects CPU temperature, CPU load, memory use, Raspberry Pi throttling flags and the controller process
+# memory from /sys and /proc. Files stay open and are re-read from the start, so a collection forks no process
+# and opens no file. Metrics missing on the platform (e.g. throttling flags on non-Pi Linux) are None.
+# The collection piggybacks on the control cycles that run anyway: the interval is checked against the clock,
+# not kept by a timer of the clock's timer queue, which would wake the control loop just to sample the metrics.
+class SystemMetricsCollector:
+
+    _thermalZonePath = '/sys/class/thermal/thermal_zone0/temp'
+    # Exposed by the Raspberry Pi firmware driver, same value as vcgencmd get_throttled
+    _throttledPath = '/sys/devices/platform/soc/soc:firmware/get_throttled'
+    _statPath = '/proc/stat'
+    _meminfoPath = '/proc/meminfo'
+    _statmPath = '/proc/self/statm'
+
+    # Throttling flags, bits 0-3 are active now, bits 16-19 have occurred since boot
+    THROTTLED_FLAGS = {
+        0x1: 'under-voltage',
+        0x2: 'frequency capped',
+        0x4: 'throttled',
+        0x8: 'soft temperature limit'
+    }
+
+    def __init__(self, intervalSec: float = 5, clock: Clock = None):
+        self._intervalSec = intervalSec
+        self._clock = clock if clock else Clock.getDefault()
+        self._nextCollectionTime = None
+        self._files = {path: self._open(path) for path in [self._thermalZonePath, self._throttledPath,
+                                                           self._statPath, self._meminfoPath, self._statmPath]}
+        self._pageSize = os.sysconf('SC_PAGE_SIZE')
+        self._lastCpuTimes = None
+        self._metrics = {}
+
+    @staticmethod
+    def _open(path: str):
+        try:
+            return os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+
+    def _read(self, path: str):
+        fd = self._files.get(path)
+        if fd is None:
+            return None
+        try:
+            return os.pread(fd, 4096, 0).decode()
+        except OSError:
+            return None
+
+    def setInterval(self, intervalSec: float) -> None:
+        self._intervalSec = intervalSec
+
+    # Collects the metrics if the interval has passed. Returns True if the metrics have been refreshed.
+    def collect(self) -> bool:
+        now = self._clock.now()
+        if self._nextCollectionTime is not None and now < self._nextCollectionTime:
+            return False
+        self._nextCollectionTime = now + self._intervalSec
+        self._metrics = {
+            'cpu_temp_c': self._getCpuTempC(),
+            'cpu_load_pct': self._getCpuLoadPct(),
+            'load_avg_1min': round(os.getloadavg()[0], 2),
+            **self._getMemory(),
+            'process_rss_mb': self._getProcessRssMb(),
+            **self._getThrottled()
+        }
+        return True
+
+    # Returns the metrics of the last collection
+    def getMetrics(self) -> dict:
+        return dict(self._metrics)
+
+    def _getCpuTempC(self):
+        value = self._read(self._thermalZonePath)
+        try:
+            return round(int(value) / 1000, 1)
+        except (TypeError, ValueError):
+            return None
+
+    # CPU use of all cores since the previous collection
+    def _getCpuLoadPct(self):
+        value = self._read(self._statPath)
+        if not value:
+            return None
+        # cpu user nice system idle iowait irq softirq steal ...
+        times = [int(field) for field in value.split('\n', 1)[0].split()[1:]]
+        idle = times[3] + (times[4] if len(times) > 4 else 0)
+        lastCpuTimes = self._lastCpuTimes
+        self._lastCpuTimes = (sum(times), idle)
+        if lastCpuTimes is None or sum(times) == lastCpuTimes[0]:
+            return None
+        return round(100 * (1 - (idle - lastCpuTimes[1]) / (sum(times) - lastCpuTimes[0])), 1)
+
+    def _getMemory(self) -> dict:
+        value = self._read(self._meminfoPath)
+        memory = {}
+        for line in (value or '').splitlines():
+            key, _, amount = line.partition(':')
+            if key in ('MemTotal', 'MemAvailable'):
+                memory[key] = int(amount.split()[0])
+        if len(memory) < 2:
+            return {'memory_used_pct': None, 'memory_available_mb': None}
+        return {'memory_used_pct': round(100 * (1 - memory['MemAvailable'] / memory['MemTotal']), 1),
+                'memory_available_mb': round(memory['MemAvailable'] / 1024, 1)}
+
+    def _getProcessRssMb(self):
+        value = self._read(self._statmPath)
+        try:
+            return round(int(value.split()[1]) * self._pageSize / 1024 / 1024, 1)
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    def _getThrottled(self) -> dict:
+        value = self._read(self._throttledPath)
+        try:
+            flags = int(value.strip(), 16)
+        except (AttributeError, ValueError):
+            return {'throttled': None, 'throttled_since_boot': None}
+        return {'throttled': [name for bit, name in self.THROTTLED_FLAGS.items() if flags & bit],
+                'throttled_since_boot': [name for bit, name in self.THROTTLED_FLAGS.items() if flags & (bit << 16)]}
+
+    def close(self) -> None:
+        for fd in self._files.values():
+            if fd is not None:
+                os.close(fd)
+        self._files = {}
@@ -1,6 +1,8 @@
 from kivy.config import Config
 from core.SaunaController import SaunaController
 from webservices.SaunaWebUIServer import SaunaWebUIServer
+import signal
+import sys
 import threading
 
 # Enable virtual keyboard - must be before other kivy imports
@@ -14,6 +16,13 @@ if __name__ == '__main__':
     _ctx = SaunaContext()
     _errorMgr = SaunaErrorMgr(_ctx)
 
+    # SIGTERM, e.g. from systemd, ends the process without running atexit. Write the config changes still
+    # waiting for the delayed write, then exit normally.
+    def _onSigterm(signum, frame):
+        _ctx.flushConfig()
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, _onSigterm)
+
     # Initialize Sauna Controller
     _sc = SaunaController(_ctx, _errorMgr)
     _sc.run()
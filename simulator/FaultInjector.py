@@ -0,0 +1,45 @@
+import random
+import time
+
+
+# Delays, drops and corrupts simulated Modbus responses. Used as the pymodbus server packet tracer,
+# so it sees complete frames: RTU frames start with the slave ID, Modbus TCP frames carry it at byte 6.
+class FaultInjector:
+
+    def __init__(self,
+                 latencySec: float = 0,
+                 jitterSec: float = 0,
+                 timeoutRate: float = 0,
+                 crcErrorRate: float = 0,
+                 deadSlaves: set = None,
+                 tcpFraming: bool = False,
+                 seed: int = None):
+        self.latencySec = latencySec
+        self.jitterSec = jitterSec
+        self.timeoutRate = timeoutRate
+        self.crcErrorRate = crcErrorRate
+        # Slaves that never respond
+        self.deadSlaves = set(deadSlaves or [])
+        self._slaveIdOffset = 6 if tcpFraming else 0
+        self._random = random.Random(seed)
+        self.droppedResponses = 0
+        self.corruptedResponses = 0
+
+    def _getSlaveId(self, data: bytes):
+        return data[self._slaveIdOffset] if len(data) > self._slaveIdOffset else None
+
+    # pymodbus trace_packet callback. Returning empty bytes drops the response, so the client times out.
+    def tracePacket(self, sending: bool, data: bytes) -> bytes:
+        if not sending or not data:
+            return data
+        if self._getSlaveId(data) in self.deadSlaves or self._random.random() < self.timeoutRate:
+            self.droppedResponses += 1
+            return b''
+        # Blocks the server loop on purpose: a serial bus serves one request at a time
+        delaySec = self.latencySec + self._random.uniform(0, self.jitterSec)
+        if delaySec > 0:
+            time.sleep(delaySec)
+        if self._random.random() < self.crcErrorRate:
+            self.corruptedResponses += 1
+            return data[:-1] + bytes([data[-1] ^ 0xFF])
+        return data
@@ -0,0 +1,180 @@
+import argparse
+import itertools
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from configobj import ConfigObj
+from simulator.SimulationEngine import SimulationEngine, parseOpening
+from simulator.ThermalModel import ThermalModel
+
+
+# Searches heater cycle, hysteresis and cooling grace settings for a heater and room. Every parameter set runs
+# a simulated session of the unchanged controller, sessions run in parallel on a process pool. Parameter sets
+# are scored on the simulation report, lower is better, and the best one is emitted as sauna.ini sections.
+class ParameterTuner:
+
+    # {setterName: candidate values}
+    DEFAULT_GRID = {
+        'setHeaterCycleOnPeriodMin': [10, 20, 30],
+        'setHeaterCycleOffPeriodMin': [3, 5, 10],
+        'setHeaterHighTempMode': [False, True],
+        'setHeaterHighTempThresholdF': [160, 170],
+        'setHeaterHighTempCycleOnPeriodMin': [5, 10],
+        'setHeaterHighTempCycleOffPeriodMin': [3, 5],
+        'setWarmUpHysteresisF': [2, 5],
+        'setCoolDownHysteresisF': [3, 5, 8],
+        'setCoolingGracePeriodMin': [1, 3]
+    }
+
+    # sauna.ini (section, key) of the tuned settings, {setterName: (section, key)}
+    INI_KEYS = {
+        'setHeaterCycleOnPeriodMin': ('heater_control', 'cycle_on_period_min'),
+        'setHeaterCycleOffPeriodMin': ('heater_control', 'cycle_off_period_min'),
+        'setHeaterHighTempMode': ('heater_control', 'high_temp_mode'),
+        'setHeaterHighTempThresholdF': ('heater_control', 'high_temp_threshold_f'),
+        'setHeaterHighTempCycleOnPeriodMin': ('heater_control', 'high_temp_cycle_on_period_min'),
+        'setHeaterHighTempCycleOffPeriodMin': ('heater_control', 'high_temp_cycle_off_period_min'),
+        'setWarmUpHysteresisF': ('hot_room_temp_control', 'warm_up_hysteresis_below_target_f'),
+        'setCoolDownHysteresisF': ('hot_room_temp_control', 'cool_down_hysteresis_below_target_f'),
+        'setCoolingGracePeriodMin': ('hot_room_temp_control', 'cooling_grace_period_min')
+    }
+
+    # Score weights of the report values
+    DEFAULT_WEIGHTS = {
+        'overshoot_f': 2.0,
+        'time_to_target_min': 0.2,
+        'temp_variance_after_target_f2': 1.0,
+        'contactor_cycles': 0.5,
+        'health_false_positives': 10.0
+    }
+
+    # Score of a session that never reaches the target, plus its shortfall in F, so the closest one ranks first
+    UNREACHED_SCORE = 1e6
+
+    def __init__(self,
+                 modelParams: dict = None,
+                 grid: dict = None,
+                 weights: dict = None,
+                 targetTempF: int = None,
+                 durationHrs: float = 3,
+                 doorOpenings: list = None,
+                 ventOpenings: list = None):
+        # ThermalModel keyword arguments, passed to the worker processes
+        self._modelParams = modelParams if modelParams else {}
+        self._grid = grid if grid else self.DEFAULT_GRID
+        self._weights = weights if weights else self.DEFAULT_WEIGHTS
+        self._targetTempF = targetTempF
+        self._durationHrs = durationHrs
+        self._doorOpenings = doorOpenings if doorOpenings else []
+        self._ventOpenings = ventOpenings if ventOpenings else []
+
+    # Returns all valid parameter sets of the grid as {setterName: value}. The high temperature settings
+    # only vary with the high temperature mode on and the heater turns on below the temperature it turns off at.
+    def getParameterSets(self) -> list:
+        keys = list(self._grid.keys())
+        parameterSets = []
+        for values in itertools.product(*[self._grid[key] for key in keys]):
+            parameters = dict(zip(keys, values))
+            if not parameters.get('setHeaterHighTempMode', True):
+                parameters = {name: value for name, value in parameters.items()
+                              if not name.startswith('setHeaterHighTemp') or name == 'setHeaterHighTempMode'}
+            if 'setWarmUpHysteresisF' in parameters and 'setCoolDownHysteresisF' in parameters \
+                    and parameters['setCoolDownHysteresisF'] < parameters['setWarmUpHysteresisF']:
+                continue
+            if parameters not in parameterSets:
+                parameterSets.append(parameters)
+        return parameterSets
+
+    def getScore(self, report: dict) -> float:
+        if report['time_to_target_min'] is None:
+            return self.UNREACHED_SCORE + max(0.0, report['target_temp_f'] - report['max_temp_f'])
+        return sum(weight * (report[name] or 0) for name, weight in self._weights.items())
+
+    # Runs the parameter sets and returns [{'parameters', 'score', 'report'}], best first.
+    # maxRuns - random sample of the parameter sets to run, None - all
+    def run(self, maxRuns: int = None, workers: int = None, seed: int = None) -> list:
+        parameterSets = self.getParameterSets()
+        if maxRuns and maxRuns < len(parameterSets):
+            parameterSets = random.Random(seed).sample(parameterSets, maxRuns)
+        sessions = [(self._toSettings(parameters), self._modelParams, self._durationHrs,
+                     self._doorOpenings, self._ventOpenings) for parameters in parameterSets]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            reports = list(executor.map(_runSession, sessions))
+        results = [{'parameters': parameters, 'score': self.getScore(report), 'report': report}
+                   for parameters, report in zip(parameterSets, reports)]
+        return sorted(results, key=lambda result: result['score'])
+
+    def _toSettings(self, parameters: dict) -> dict:
+        settings = {'setLogLevel': logging.CRITICAL}
+        if self._targetTempF is not None:
+            settings['setHotRoomTargetTempF'] = self._targetTempF
+        settings.update(parameters)
+        return settings
+
+    # Returns the parameters as sauna.ini sections
+    @classmethod
+    def toIni(cls, parameters: dict) -> str:
+        config = ConfigObj()
+        for (section, key), value in sorted((cls.INI_KEYS[name], value) for name, value in parameters.items()):
+            if section not in config:
+                config[section] = {}
+            config[section][key] = value
+        return '\n'.join(config.write())
+
+
+# Runs in the worker processes, so it has to be a picklable module level function
+def _runSession(session: tuple) -> dict:
+    settings, modelParams, durationHrs, doorOpenings, ventOpenings = session
+    engine = SimulationEngine(settings, ThermalModel(**modelParams), doorOpenings, ventOpenings)
+    return engine.run(durationHrs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Searches heater control settings on simulated sauna sessions.')
+    parser.add_argument('--hours', type=float, default=3, help='simulated time of every session')
+    parser.add_argument('--target-temp', type=int, default=None, help='target temperature, F')
+    parser.add_argument('--ambient-temp', type=float, default=20, help='resting room temperature, C')
+    parser.add_argument('--heater-power', type=float, default=6000, help='heater power, W')
+    parser.add_argument('--room-capacity', type=float, default=108000, help='hot room air heat capacity, J/K')
+    parser.add_argument('--heat-loss', type=float, default=45, help='hot room wall heat loss, W/K')
+    parser.add_argument('--stones-capacity', type=float, default=60000, help='stones heat capacity, J/K, 0 - none')
+    parser.add_argument('--door-open', type=parseOpening, action='append', default=[],
+                        metavar='MIN:DURATION', help='door opening, minutes after turning the sauna on')
+    parser.add_argument('--vent-open', type=parseOpening, action='append', default=[],
+                        metavar='MIN:DURATION', help='vent opening, minutes after turning the sauna on')
+    parser.add_argument('--max-runs', type=int, default=200, help='random sample of the parameter sets, 0 - all')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for the sample')
+    parser.add_argument('--top', type=int, default=10, help='parameter sets to list')
+    args = parser.parse_args()
+
+    modelParams = {'ambientTempC': args.ambient_temp,
+                   'heaterPowerW': args.heater_power,
+                   'heatCapacityJPerK': args.room_capacity,
+                   'heatLossWPerK': args.heat_loss,
+                   'stonesHeatCapacityJPerK': args.stones_capacity}
+    tuner = ParameterTuner(modelParams, targetTempF=args.target_temp, durationHrs=args.hours,
+                           doorOpenings=args.door_open, ventOpenings=args.vent_open)
+    results = tuner.run(args.max_runs, args.workers, args.seed)
+
+    for rank, result in enumerate(results[:args.top], 1):
+        report = result['report']
+        parameters = ', '.join(f'{key}={value}' for (_, key), value in
+                               sorted((ParameterTuner.INI_KEYS[name], value)
+                                      for name, value in result['parameters'].items()))
+        print(f'{rank:3} score {result["score"]:9.1f}  target {report["time_to_target_min"]} min  '
+              f'max {report["max_temp_f"]} F  overshoot {report["overshoot_f"]} F  variance {report["temp_variance_after_target_f2"]}  '
+              f'cycles {report["contactor_cycles"]}  false errors {report["health_false_positives"]}  '
+              f'{parameters}')
+    if results and results[0]['score'] < ParameterTuner.UNREACHED_SCORE:
+        print('\nRecommended settings:\n')
+        print(ParameterTuner.toIni(results[0]['parameters']))
+    elif results:
+        print(f'\nNo parameter set reached the target temperature, the closest one got to '
+              f'{results[0]["report"]["max_temp_f"]} F:\n')
+        print(ParameterTuner.toIni(results[0]['parameters']))
+
+
+if __name__ == '__main__':
+    main()
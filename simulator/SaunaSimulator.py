@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import threading
+import time
+from pymodbus import FramerType
+from pymodbus.datastore import ModbusDeviceContext, ModbusServerContext, ModbusSequentialDataBlock
+from pymodbus.server import StartAsyncTcpServer, StartAsyncSerialServer
+from core.SaunaContext import SaunaContext
+from simulator.ThermalModel import ThermalModel
+from simulator.FaultInjector import FaultInjector
+
+
+# Device context taking the simulator lock on every access. The server reads and writes the values on its
+# event loop while the model thread updates them.
+class LockedDeviceContext(ModbusDeviceContext):
+
+    def __init__(self, lock: threading.RLock, **blocks):
+        super().__init__(**blocks)
+        self._lock = lock
+
+    def getValues(self, fc_as_hex, address, count=1):
+        with self._lock:
+            return super().getValues(fc_as_hex, address, count)
+
+    def setValues(self, fc_as_hex, address, values):
+        with self._lock:
+            return super().setValues(fc_as_hex, address, values)
+
+
+# Simulates the sensor, relay and JPF4816 fan modules on the register map configured in SaunaContext.
+# The hot room follows the thermal model driven by the heater relay coil, the fans follow their relay
+# coils and the fan speed register. Like on RS485, unknown slave IDs get no response. Run it instead of
+# the RS485 bus:
+#
+#   python -m simulator.SaunaSimulator --tcp 5020
+#   python -m simulator.SaunaSimulator --pty /tmp/ttySauna     (set [modbus] serial_port_name = /tmp/ttySauna)
+#
+# The register map is the default one, --config sauna.ini takes it from the controller's configuration.
+class SaunaSimulator:
+
+    _logger: logging.Logger = logging.getLogger('sauna-simulator')
+
+    # Simulated fan speed at 100%
+    _maxFanRpm: int = 1800
+    # Registers and coils per simulated device
+    _registerCount: int = 256
+    _coilCount: int = 64
+    # Registers the real devices report their slave IDs in
+    _sensorSlaveIdAddr: int = 0x07D0
+    _fanModuleSlaveIdAddr: int = 2
+    _rightFanId = 1
+    _leftFanId = 2
+
+    # timeScale - simulated seconds per real second, e.g. 60 heats the sauna up in less than a minute
+    # failedFans - fan IDs that do not spin even if powered
+    def __init__(self, ctx: SaunaContext, thermalModel: ThermalModel = None, faultInjector: FaultInjector = None,
+                 timeScale: float = 1.0, stepSec: float = 0.5, failedFans: set = None):
+        self._ctx = ctx
+        self._model = thermalModel if thermalModel else ThermalModel()
+        self._faultInjector = faultInjector if faultInjector else FaultInjector()
+        self._timeScale = timeScale
+        self._stepSec = stepSec
+        self.failedFans = set(failedFans or [])
+        # Held by every datastore access and for a whole model step, so clients never see half of a step
+        self._lock = threading.RLock()
+        self._devices = self._createDevices()
+        self._serverContext = ModbusServerContext(devices=self._devices, single=False)
+        self._initRegisters()
+        self._stopEvent = threading.Event()
+        self._modelThread = None
+
+    def _createDevices(self) -> dict:
+        blocks = {}
+        blocks.setdefault(self._ctx.getSaunaSensorsDeviceId(), {})['hr'] = \
+            ModbusSequentialDataBlock(0, [0] * (self._sensorSlaveIdAddr + 2))
+        blocks.setdefault(self._ctx.getFanControlModuleDeviceId(), {})['hr'] = \
+            ModbusSequentialDataBlock(0, [0] * self._registerCount)
+        blocks.setdefault(self._ctx.getRelayModuleDeviceId(), {})['co'] = \
+            ModbusSequentialDataBlock(0, [False] * self._coilCount)
+        return {slave: LockedDeviceContext(self._lock, **deviceBlocks) for slave, deviceBlocks in blocks.items()}
+
+    def _initRegisters(self) -> None:
+        self._setRegister(self._ctx.getSaunaSensorsDeviceId(), self._sensorSlaveIdAddr,
+                          self._ctx.getSaunaSensorsDeviceId())
+        self._setRegister(self._ctx.getFanControlModuleDeviceId(), self._fanModuleSlaveIdAddr,
+                          self._ctx.getFanControlModuleDeviceId())
+        self._setRegister(self._ctx.getFanControlModuleDeviceId(), self._ctx.getNumberOfFansAddr(),
+                          self._ctx.getNumberOfFans())
+        self._setRegister(self._ctx.getFanControlModuleDeviceId(), self._ctx.getFanSpeedAddr(),
+                          self._ctx.getFanSpeedPct())
+        self.step(0)
+
+    # Device contexts shift addresses by one, so Modbus addresses are used here as is
+    def _getRegister(self, slave: int, address: int) -> int:
+        return self._devices[slave].getValues(3, address, 1)[0]
+
+    def _setRegister(self, slave: int, address: int, value: int) -> None:
+        self._devices[slave].setValues(6, address, [int(value)])
+
+    def _getCoil(self, address: int) -> bool:
+        return bool(self._devices[self._ctx.getRelayModuleDeviceId()].getValues(1, address, 1)[0])
+
+    def _getFanRpm(self, fanId: int, relayCoilAddr: int, numberOfFans: int, speedPct: int) -> int:
+        if not self._getCoil(relayCoilAddr) or fanId > numberOfFans or fanId in self.failedFans:
+            return 0
+        return round(self._maxFanRpm * min(100, speedPct) / 100)
+
+    # Advances the simulation by dtSec simulated seconds and publishes the new state in the registers
+    def step(self, dtSec: float) -> None:
+        with self._lock:
+            fanModuleId = self._ctx.getFanControlModuleDeviceId()
+            numberOfFans = self._getRegister(fanModuleId, self._ctx.getNumberOfFansAddr())
+            speedPct = self._getRegister(fanModuleId, self._ctx.getFanSpeedAddr())
+            rightFanRpm = self._getFanRpm(self._rightFanId, self._ctx.getRightFanRelayCoilAddr(), numberOfFans,
+                                          speedPct)
+            leftFanRpm = self._getFanRpm(self._leftFanId, self._ctx.getLeftFanRelayCoilAddr(), numberOfFans,
+                                         speedPct)
+
+            self._model.step(dtSec, self._getCoil(self._ctx.getHeaterRelayCoilAddr()),
+                             (rightFanRpm + leftFanRpm) * 100 / self._maxFanRpm)
+
+            sensorsId = self._ctx.getSaunaSensorsDeviceId()
+            self._setRegister(sensorsId, self._ctx.getTempSensorAddr(), round(self._model.getHotRoomTempC() * 10))
+            self._setRegister(sensorsId, self._ctx.getHumiditySensorAddr(),
+                              round(self._model.getHotRoomHumidity() * 10))
+
+            # Low bits correspond to fans, the most right bit to fan 1. The fault bit is 0 if the fan is not
+            # running.
+            runningBits = (self._rightFanId if rightFanRpm > 0 else 0) | (self._leftFanId if leftFanRpm > 0 else 0)
+            self._setRegister(fanModuleId, self._ctx.getFanStatusAddr(), runningBits)
+            self._setRegister(fanModuleId, self._ctx.getFanFaultStatusAddr(), runningBits)
+            self._setRegister(fanModuleId, self._ctx.getFanSpeedRpmAddr(self._rightFanId), rightFanRpm)
+            self._setRegister(fanModuleId, self._ctx.getFanSpeedRpmAddr(self._leftFanId), leftFanRpm)
+            self._setRegister(fanModuleId, self._ctx.getFanModuleRoomTempAddr(),
+                              round(self._model.ambientTempC) + 40)
+
+    def _runModel(self) -> None:
+        lastTime = time.monotonic()
+        lastLogTime = lastTime
+        while not self._stopEvent.wait(self._stepSec):
+            now = time.monotonic()
+            self.step((now - lastTime) * self._timeScale)
+            lastTime = now
+            if now - lastLogTime >= 10:
+                lastLogTime = now
+                self._logger.info(f'Hot room {self._model.getHotRoomTempC():.1f} C, '
+                                  f'{self._model.getHotRoomHumidity():.0f} %, '
+                                  f'heater {"on" if self._getCoil(self._ctx.getHeaterRelayCoilAddr()) else "off"}')
+
+    # Starts the thermal model thread
+    def start(self) -> None:
+        self._stopEvent.clear()
+        self._modelThread = threading.Thread(target=self._runModel, name='sauna-simulator', daemon=True)
+        self._modelThread.start()
+
+    def stop(self) -> None:
+        self._stopEvent.set()
+        if self._modelThread:
+            self._modelThread.join()
+
+    # rtuFraming - serve RTU frames over TCP instead of Modbus TCP frames
+    async def serveTcp(self, host: str = '127.0.0.1', port: int = 5020, rtuFraming: bool = False) -> None:
+        await StartAsyncTcpServer(context=self._serverContext, address=(host, port),
+                                  framer=FramerType.RTU if rtuFraming else FramerType.SOCKET,
+                                  ignore_missing_devices=True, trace_packet=self._faultInjector.tracePacket)
+
+    async def serveSerial(self, port: str, baudrate: int = 9600) -> None:
+        await StartAsyncSerialServer(context=self._serverContext, port=port, baudrate=baudrate,
+                                     framer=FramerType.RTU, ignore_missing_devices=True,
+                                     trace_packet=self._faultInjector.tracePacket)
+
+    # Creates a linked pseudo-terminal pair with socat. The controller opens link, the simulator serves
+    # link + '.sim'. Returns the socat process.
+    @staticmethod
+    def createPtyPair(link: str, timeoutSec: float = 5) -> subprocess.Popen:
+        simLink = link + '.sim'
+        process = subprocess.Popen(['socat', f'pty,raw,echo=0,link={link}', f'pty,raw,echo=0,link={simLink}'])
+        deadline = time.monotonic() + timeoutSec
+        while not (os.path.exists(link) and os.path.exists(simLink)):
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError(f'Cannot create pseudo-terminal pair {link}')
+            time.sleep(0.05)
+        return process
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Simulates the sauna Modbus devices.')
+    transport = parser.add_mutually_exclusive_group(required=True)
+    transport.add_argument('--tcp', type=int, metavar='PORT', help='serve Modbus TCP on this port')
+    transport.add_argument('--serial', metavar='DEVICE', help='serve Modbus RTU on this serial port')
+    transport.add_argument('--pty', metavar='LINK', help='create a pseudo-terminal pair, the controller opens LINK')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP address to bind to')
+    parser.add_argument('--rtu-over-tcp', action='store_true', help='serve RTU frames over TCP')
+    parser.add_argument('--baudrate', type=int, default=None, help='serial baud rate, default from the config')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='simulated seconds per real second')
+    parser.add_argument('--ambient-temp', type=float, default=20, help='resting room temperature, C')
+    parser.add_argument('--latency-ms', type=float, default=0, help='response delay')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='random extra response delay')
+    parser.add_argument('--timeout-rate', type=float, default=0, help='share of dropped responses, 0...1')
+    parser.add_argument('--crc-error-rate', type=float, default=0, help='share of corrupted responses, 0...1')
+    parser.add_argument('--dead-slave', type=int, action='append', default=[], help='slave ID that never responds')
+    parser.add_argument('--failed-fan', type=int, action='append', default=[], help='fan ID that does not spin')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for fault injection')
+    parser.add_argument('--config', default=None, metavar='FILE',
+                        help='sauna.ini to take the register map from, default - the built-in defaults')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # The built-in defaults stay in memory, a sauna.ini in the current directory is neither read nor written
+    ctx = SaunaContext(args.config)
+    faultInjector = FaultInjector(latencySec=args.latency_ms / 1000,
+                                  jitterSec=args.jitter_ms / 1000,
+                                  timeoutRate=args.timeout_rate,
+                                  crcErrorRate=args.crc_error_rate,
+                                  deadSlaves=set(args.dead_slave),
+                                  tcpFraming=args.tcp is not None and not args.rtu_over_tcp,
+                                  seed=args.seed)
+    simulator = SaunaSimulator(ctx, ThermalModel(ambientTempC=args.ambient_temp), faultInjector,
+                               args.time_scale, failedFans=set(args.failed_fan))
+    simulator.start()
+    baudrate = args.baudrate if args.baudrate else ctx.getModbusSerialBaudRate()
+    ptyProcess = None
+    try:
+        if args.tcp is not None:
+            asyncio.run(simulator.serveTcp(args.host, args.tcp, args.rtu_over_tcp))
+        elif args.serial:
+            asyncio.run(simulator.serveSerial(args.serial, baudrate))
+        else:
+            ptyProcess = SaunaSimulator.createPtyPair(args.pty)
+            asyncio.run(simulator.serveSerial(args.pty + '.sim', baudrate))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+        if ptyProcess:
+            ptyProcess.terminate()
+
+
+if __name__ == '__main__':
+    main()
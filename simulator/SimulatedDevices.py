@@ -0,0 +1,135 @@
+from core.SaunaContext import SaunaContext
+from simulator.ThermalModel import ThermalModel
+from util.Clock import Clock
+
+
+# Stands in for SaunaDevices in offline simulations: serves the readings of the thermal model and applies the
+# relays without Modbus. Relay changes take effect at flushRelays() and readings are taken at refreshRegisters(),
+# like on the real bus. The model is advanced to the clock time before every reading and relay change.
+class SimulatedDevices:
+
+    _maxFanRpm: int = 1800
+
+    def __init__(self, ctx: SaunaContext, thermalModel: ThermalModel, clock: Clock):
+        self._ctx = ctx
+        self._model = thermalModel
+        self._clock = clock
+        self._lastStepTime = clock.now()
+        # Relay states after the last flush and the states set since then
+        self._relays = {'heater': False, 'light': False, 'left_fan': False, 'right_fan': False}
+        self._pendingRelays = dict(self._relays)
+        self._fanSpeedPct = 0
+        self._hotRoomTempC = thermalModel.getHotRoomTempC()
+        self._hotRoomHumidity = thermalModel.getHotRoomHumidity()
+        self.heaterOnCount = 0
+        self.heaterOnTimeSec = 0.0
+
+    # Advances the model to the clock time with the relay states applied so far
+    def advance(self) -> None:
+        now = self._clock.now()
+        dtSec = now - self._lastStepTime
+        if dtSec <= 0:
+            return
+        fans = (1 if self._relays['left_fan'] else 0) + (1 if self._relays['right_fan'] else 0)
+        self._model.step(dtSec, self._relays['heater'], fans * self._fanSpeedPct)
+        if self._relays['heater']:
+            self.heaterOnTimeSec += dtSec
+        self._lastStepTime = now
+
+    # ---- Bus cycle ----
+
+    def refreshRegisters(self) -> None:
+        self.advance()
+        self._hotRoomTempC = self._model.getHotRoomTempC()
+        self._hotRoomHumidity = self._model.getHotRoomHumidity()
+
+    def refreshRelays(self) -> None:
+        pass
+
+    def flushRelays(self) -> None:
+        self.advance()
+        if self._pendingRelays['heater'] and not self._relays['heater']:
+            self.heaterOnCount += 1
+        self._relays = dict(self._pendingRelays)
+
+    # ---- Hot room ----
+
+    def getHotRoomTemperature(self, system='F') -> int:
+        if system == 'F':
+            return round((self._hotRoomTempC * 9 / 5) + 32)
+        return round(self._hotRoomTempC)
+
+    def getHotRoomHumidity(self) -> int:
+        return round(self._hotRoomHumidity)
+
+    def isHotRoomDataStale(self) -> bool:
+        return False
+
+    def getRestingRoomTemp(self, system='F') -> int:
+        if system == 'F':
+            return round((self._model.ambientTempC * 9 / 5) + 32)
+        return round(self._model.ambientTempC)
+
+    # ---- Relays ----
+
+    def isHeaterOn(self) -> bool:
+        return self._pendingRelays['heater']
+
+    def isHeaterOff(self) -> bool:
+        return not self.isHeaterOn()
+
+    def turnHeaterOn(self) -> None:
+        self._pendingRelays['heater'] = True
+        self._ctx.setHeaterOn()
+
+    def turnHeaterOff(self) -> None:
+        self._pendingRelays['heater'] = False
+        self._ctx.setHeaterOff()
+
+    def turnHotRoomLightOnOff(self, status: bool) -> None:
+        self._pendingRelays['light'] = status
+
+    # ---- Fans ----
+
+    def setFanSpeed(self, speedPct: int) -> None:
+        self.advance()
+        self._fanSpeedPct = speedPct
+
+    def _getFanSpeedRpm(self, relay: str) -> int:
+        return round(self._maxFanRpm * min(100, self._fanSpeedPct) / 100) if self._relays[relay] else 0
+
+    def getLeftFanSpeedRpm(self) -> int:
+        return self._getFanSpeedRpm('left_fan')
+
+    def getRightFanSpeedRpm(self) -> int:
+        return self._getFanSpeedRpm('right_fan')
+
+    def isLeftFanOn(self) -> bool:
+        return self._pendingRelays['left_fan']
+
+    def isLeftFanOff(self) -> bool:
+        return not self.isLeftFanOn()
+
+    def isRightFanOn(self) -> bool:
+        return self._pendingRelays['right_fan']
+
+    def isRightFanOff(self) -> bool:
+        return not self.isRightFanOn()
+
+    def turnLeftFanOn(self) -> None:
+        self._pendingRelays['left_fan'] = True
+
+    def turnLeftFanOff(self) -> None:
+        self._pendingRelays['left_fan'] = False
+
+    def turnRightFanOn(self) -> None:
+        self._pendingRelays['right_fan'] = True
+
+    def turnRightFanOff(self) -> None:
+        self._pendingRelays['right_fan'] = False
+
+    def isLeftFanOk(self) -> bool:
+        return True
+
+    def isRightFanOk(self) -> bool:
+        return True
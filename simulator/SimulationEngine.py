@@ -0,0 +1,176 @@
+import argparse
+import copy
+import json
+import logging
+import time
+from core.SaunaContext import SaunaContext
+from core.SaunaController import SaunaController
+from core.SaunaErrorMgr import SaunaErrorMgr
+from simulator.SimulatedDevices import SimulatedDevices
+from simulator.ThermalModel import ThermalModel
+from util.Clock import Clock
+from util.VirtualClock import VirtualClock
+
+
+# Runs the sauna controller against the thermal model on a virtual clock, so a whole sauna session runs in seconds
+# without a heater or Modbus devices. The controller runs unchanged: every control cycle, user command pass and
+# timer expiry happens as on the real hardware, only the clock jumps over the waits.
+#
+# settings - configuration to run with, {setterName: value} as for SaunaContext.updateSettings(), e.g.
+#            {'setHeaterCycleOnPeriodMin': 20}, the defaults otherwise
+# thermalModel - sauna to simulate, every run starts from a copy of it in its initial state
+# doorOpenings, ventOpenings - [(startMin, durationMin)] after the sauna is turned on
+class SimulationEngine:
+
+    def __init__(self,
+                 settings: dict = None,
+                 thermalModel: ThermalModel = None,
+                 doorOpenings: list = None,
+                 ventOpenings: list = None):
+        self._settings = settings if settings else {}
+        self._model = thermalModel if thermalModel else ThermalModel(stonesHeatCapacityJPerK=60000)
+        self._doorOpenings = doorOpenings if doorOpenings else []
+        self._ventOpenings = ventOpenings if ventOpenings else []
+
+    @staticmethod
+    def _isOpen(openings: list, elapsedMin: float) -> bool:
+        return any(startMin <= elapsedMin < startMin + durationMin for startMin, durationMin in openings)
+
+    @staticmethod
+    def _toF(tempC: float) -> float:
+        return tempC * 9 / 5 + 32
+
+    # Turns the sauna on and runs the controller until the sauna turns itself off at the max on time or
+    # durationHrs has passed. Returns the report.
+    def run(self, durationHrs: float = None) -> dict:
+        wallStartTime = time.perf_counter()
+        defaultClock = Clock.getDefault()
+        clock = VirtualClock()
+        # Timers, schedulers and the controller created from here on run on the virtual clock
+        Clock.setDefault(clock)
+        controller = None
+        try:
+            ctx = SaunaContext(None)
+            ctx.updateSettings(self._settings)
+            model = copy.deepcopy(self._model)
+            errorMgr = SaunaErrorMgr(ctx)
+            sd = SimulatedDevices(ctx, model, clock)
+            controller = SaunaController(ctx, errorMgr, sd)
+            return self._run(ctx, errorMgr, model, sd, controller, clock,
+                             durationHrs if durationHrs else ctx.getMaxSaunaOnTimeHrs(), wallStartTime)
+        finally:
+            if controller:
+                controller.close()
+            Clock.setDefault(defaultClock)
+
+    def _run(self, ctx: SaunaContext, errorMgr: SaunaErrorMgr, model: ThermalModel, sd: SimulatedDevices,
+             controller: SaunaController, clock: VirtualClock, durationHrs: float, wallStartTime: float) -> dict:
+        targetTempF = ctx.getHotRoomTargetTempF()
+        startTime = clock.now()
+        endTime = startTime + durationHrs * 60 * 60
+        timeToTargetMin = None
+        maxTempF = self._toF(model.getHotRoomTempC())
+        minTempAfterTargetF = None
+        sumTempAfterTargetF = 0.0
+        sumSquaredTempAfterTargetF = 0.0
+        samplesAfterTarget = 0
+        heaterErrors = []
+        hadHeaterError = False
+        saunaOffMin = None
+        cycles = 0
+
+        ctx.turnSaunaOnOff(True)
+        while clock.now() < endTime and ctx.isSaunaOn():
+            elapsedMin = (clock.now() - startTime) / 60
+            sd.advance()
+            model.doorOpen = self._isOpen(self._doorOpenings, elapsedMin)
+            model.ventOpen = self._isOpen(self._ventOpenings, elapsedMin)
+            controller.runCycle()
+            cycles += 1
+
+            # True air temperature, not the rounded sensor reading
+            tempF = self._toF(model.getHotRoomTempC())
+            maxTempF = max(maxTempF, tempF)
+            if timeToTargetMin is None and tempF >= targetTempF - ctx.getWarmUpHysteresisF():
+                timeToTargetMin = (clock.now() - startTime) / 60
+            if timeToTargetMin is not None:
+                minTempAfterTargetF = tempF if minTempAfterTargetF is None else min(minTempAfterTargetF, tempF)
+                sumTempAfterTargetF += tempF
+                sumSquaredTempAfterTargetF += tempF * tempF
+                samplesAfterTarget += 1
+
+            # The model has no faults, so every heater health error is a false positive
+            errors = [error for error in errorMgr.getAllErrors() if error['type'] == SaunaErrorMgr.ERROR_HEATER]
+            if errors and not hadHeaterError:
+                heaterErrors.append({'time_min': round((clock.now() - startTime) / 60, 1),
+                                     'message': errors[0]['message']})
+            hadHeaterError = bool(errors)
+
+        if ctx.isSaunaOff():
+            saunaOffMin = (clock.now() - startTime) / 60
+        ctx.turnSaunaOnOff(False)
+        controller.runCycle()
+
+        simulatedSec = clock.now() - startTime
+        wallSec = time.perf_counter() - wallStartTime
+        meanTempF = sumTempAfterTargetF / samplesAfterTarget if samplesAfterTarget else None
+        return {
+            'target_temp_f': targetTempF,
+            'simulated_hrs': round(simulatedSec / 60 / 60, 2),
+            'control_cycles': cycles,
+            'time_to_target_min': round(timeToTargetMin, 1) if timeToTargetMin is not None else None,
+            'max_temp_f': round(maxTempF, 1),
+            'overshoot_f': round(max(0.0, maxTempF - targetTempF), 1),
+            'min_temp_after_target_f': round(minTempAfterTargetF, 1) if minTempAfterTargetF is not None else None,
+            'mean_temp_after_target_f': round(meanTempF, 1) if meanTempF is not None else None,
+            'temp_variance_after_target_f2': round(max(0.0, sumSquaredTempAfterTargetF / samplesAfterTarget
+                                                       - meanTempF * meanTempF), 2) if meanTempF is not None else None,
+            'contactor_cycles': sd.heaterOnCount,
+            'heater_on_pct': round(100 * sd.heaterOnTimeSec / simulatedSec, 1) if simulatedSec else 0.0,
+            'health_false_positives': len(heaterErrors),
+            'health_errors': heaterErrors,
+            'sauna_off_min': round(saunaOffMin, 1) if saunaOffMin is not None else None,
+            'wall_time_sec': round(wallSec, 2),
+            'speedup': round(simulatedSec / wallSec) if wallSec else None
+        }
+
+
+# "MIN:DURATION" in minutes
+def parseOpening(value: str) -> tuple:
+    startMin, durationMin = value.split(':')
+    return float(startMin), float(durationMin)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Runs the sauna controller against a simulated sauna.')
+    parser.add_argument('--hours', type=float, default=None, help='simulated time, default max sauna on time')
+    parser.add_argument('--target-temp', type=int, default=None, help='target temperature, F')
+    parser.add_argument('--cycle-on-min', type=int, default=None, help='heater on cycle period')
+    parser.add_argument('--cycle-off-min', type=int, default=None, help='heater off cycle period')
+    parser.add_argument('--ambient-temp', type=float, default=20, help='resting room temperature, C')
+    parser.add_argument('--heater-power', type=float, default=6000, help='heater power, W')
+    parser.add_argument('--stones-capacity', type=float, default=60000, help='stones heat capacity, J/K, 0 - none')
+    parser.add_argument('--door-open', type=parseOpening, action='append', default=[],
+                        metavar='MIN:DURATION', help='door opening, minutes after turning the sauna on')
+    parser.add_argument('--vent-open', type=parseOpening, action='append', default=[],
+                        metavar='MIN:DURATION', help='vent opening, minutes after turning the sauna on')
+    parser.add_argument('--verbose', action='store_true', help='log the controller messages')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = {'setLogLevel': logging.INFO if args.verbose else logging.CRITICAL}
+    if args.target_temp is not None:
+        settings['setHotRoomTargetTempF'] = args.target_temp
+    if args.cycle_on_min is not None:
+        settings['setHeaterCycleOnPeriodMin'] = args.cycle_on_min
+    if args.cycle_off_min is not None:
+        settings['setHeaterCycleOffPeriodMin'] = args.cycle_off_min
+    model = ThermalModel(ambientTempC=args.ambient_temp,
+                         heaterPowerW=args.heater_power,
+                         stonesHeatCapacityJPerK=args.stones_capacity)
+    engine = SimulationEngine(settings, model, args.door_open, args.vent_open)
+    print(json.dumps(engine.run(args.hours), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import math
+
+
+# Lumped thermal model of the hot room. The heater adds heat, the walls and the vent fans lose it
+# to the resting room. Relative humidity follows the temperature at a constant absolute humidity.
+# Defaults heat an average home sauna from 20 to 80 C in about 25 minutes, in about 55 minutes with 60 kJ/K
+# of stones and both fans at full speed. With the fans running the full heater power still holds about 110 C,
+# so the stock heater cycle settings reach the default 190 F target.
+#
+# With a stones heat capacity the heater element heats the stones, which pass the heat on to the air,
+# so the air keeps heating after the heater turns off. An open door or vent adds its own heat loss.
+class ThermalModel:
+
+    # Longest integration step, larger steps are split up
+    _maxStepSec: float = 5.0
+
+    def __init__(self,
+                 ambientTempC: float = 20,
+                 ambientHumidityPct: float = 50,
+                 heaterPowerW: float = 6000,
+                 heatCapacityJPerK: float = 108000,
+                 heatLossWPerK: float = 45,
+                 fanHeatLossWPerK: float = 10,
+                 stonesHeatCapacityJPerK: float = 0,
+                 stonesHeatTransferWPerK: float = 120,
+                 doorHeatLossWPerK: float = 250,
+                 ventHeatLossWPerK: float = 40):
+        self.ambientTempC = ambientTempC
+        self.ambientHumidityPct = ambientHumidityPct
+        self.heaterPowerW = heaterPowerW
+        self.heatCapacityJPerK = heatCapacityJPerK
+        self.heatLossWPerK = heatLossWPerK
+        self.fanHeatLossWPerK = fanHeatLossWPerK
+        self.stonesHeatCapacityJPerK = stonesHeatCapacityJPerK
+        self.stonesHeatTransferWPerK = stonesHeatTransferWPerK
+        self.doorHeatLossWPerK = doorHeatLossWPerK
+        self.ventHeatLossWPerK = ventHeatLossWPerK
+        self.doorOpen = False
+        self.ventOpen = False
+        self._hotRoomTempC = ambientTempC
+        self._stonesTempC = ambientTempC
+
+    # Saturation vapour pressure, Magnus formula
+    @staticmethod
+    def _saturationPressureHPa(tempC: float) -> float:
+        return 6.112 * math.exp(17.62 * tempC / (243.12 + tempC))
+
+    # dtSec - simulated time since the last step
+    # fanSpeedPct - sum of the speeds of all running fans, 100 per fan at full speed
+    def step(self, dtSec: float, heaterOn: bool, fanSpeedPct: float = 0) -> None:
+        steps = max(1, math.ceil(dtSec / self._maxStepSec))
+        for _ in range(steps):
+            self._step(dtSec / steps, heaterOn, fanSpeedPct)
+
+    def _step(self, dtSec: float, heaterOn: bool, fanSpeedPct: float) -> None:
+        heatLossWPerK = self.heatLossWPerK + self.fanHeatLossWPerK * fanSpeedPct / 100 \
+            + (self.doorHeatLossWPerK if self.doorOpen else 0) + (self.ventHeatLossWPerK if self.ventOpen else 0)
+        heaterW = self.heaterPowerW if heaterOn else 0
+        if self.stonesHeatCapacityJPerK > 0:
+            stonesW = self.stonesHeatTransferWPerK * (self._stonesTempC - self._hotRoomTempC)
+            self._stonesTempC += (heaterW - stonesW) * dtSec / self.stonesHeatCapacityJPerK
+            heaterW = stonesW
+        heatW = heaterW - heatLossWPerK * (self._hotRoomTempC - self.ambientTempC)
+        self._hotRoomTempC += heatW * dtSec / self.heatCapacityJPerK
+
+    def getHotRoomTempC(self) -> float:
+        return self._hotRoomTempC
+
+    def setHotRoomTempC(self, tempC: float) -> None:
+        self._hotRoomTempC = tempC
+
+    def getStonesTempC(self) -> float:
+        return self._stonesTempC if self.stonesHeatCapacityJPerK > 0 else self._hotRoomTempC
+
+    def getHotRoomHumidity(self) -> float:
+        humidity = self.ambientHumidityPct * self._saturationPressureHPa(self.ambientTempC) \
+            / self._saturationPressureHPa(self._hotRoomTempC)
+        return min(100.0, max(0.0, humidity))
@@ -0,0 +1 @@
+# Modbus device simulator for Sauna Controller
@@ -43,6 +43,33 @@ function loadErrors() {
         .catch(error => console.error('Error loading errors:', error));
 }
 
+// Load Modbus request counts and latencies per device
+function loadModbusStats() {
+    fetch('/api/modbus/stats')
+        .then(response => response.json())
+        .then(data => {
+            const statsList = document.getElementById('modbus-stats');
+            statsList.innerHTML = '';
+            if (data.devices.length === 0) {
+                return;
+            }
+            const header = document.createElement('h2');
+            header.textContent = 'Modbus Statistics';
+            statsList.appendChild(header);
+            data.devices.forEach(entry => {
+                const failures = entry.timeouts + entry.connection_errors + entry.exception_responses + entry.other_errors;
+
+                const entryDiv = document.createElement('div');
+                entryDiv.className = 'error-message';
+                entryDiv.textContent = `Device ${entry.slave} ${entry.function}: ${entry.requests} requests, ` +
+                    `${entry.retries} retries, ${failures} failed (${entry.timeouts} timeouts), ` +
+                    `p50 ${entry.p50_ms} ms, p95 ${entry.p95_ms} ms, p99 ${entry.p99_ms} ms, max ${entry.max_ms} ms`;
+                statsList.appendChild(entryDiv);
+            });
+        })
+        .catch(error => console.error('Error loading Modbus statistics:', error));
+}
+
 // Clear all errors
 function clearErrors() {
     fetch('/api/errors/clear', {
@@ -62,4 +89,6 @@ function clearErrors() {
 
 // Initialize
 loadErrors();
+loadModbusStats();
 setInterval(loadErrors, 5000);
+setInterval(loadModbusStats, 5000);
@@ -0,0 +1,35 @@
+import gc
+import weakref
+import pytest
+from core.SaunaController import SaunaController
+from simulator import SimulationEngine as simulationEngineModule
+from util.Clock import Clock
+from util.VirtualClock import VirtualClock
+
+
+# Virtual clock as the default clock of the test
+@pytest.fixture
+def clock():
+    defaultClock = Clock.getDefault()
+    clock = VirtualClock()
+    Clock.setDefault(clock)
+    yield clock
+    Clock.setDefault(defaultClock)
+
+
+# Weak references to the controllers the simulation engine creates in this process. Call it after the runs
+# to collect the garbage and get the list.
+@pytest.fixture
+def simulatedControllers(monkeypatch):
+    controllers = []
+
+    class RecordedController(SaunaController):
+        def __init__(self, *args):
+            super().__init__(*args)
+            controllers.append(weakref.ref(self))
+    monkeypatch.setattr(simulationEngineModule, 'SaunaController', RecordedController)
+
+    def collect() -> list:
+        gc.collect()
+        return controllers
+    return collect
@@ -0,0 +1,48 @@
+from util.CommandTracer import CommandTracer
+
+
+def getRecent(tracer: CommandTracer) -> dict:
+    return {command['type']: command for command in tracer.getSnapshot()['recent']}
+
+
+def test_write_is_attributed_to_the_command_that_targets_it():
+    tracer = CommandTracer()
+    tracer.begin('light_on', [(2, 1)])
+    tracer.begin('right_fan', [(2, 2)])
+    tracer.startProcessing()
+
+    tracer.recordWrite(2, 1)
+    tracer.finishProcessing()
+
+    recent = getRecent(tracer)
+    assert recent['right_fan']['written_ms'] is None
+    assert recent['right_fan']['applied_ms'] is not None
+    # Written, waits for the read-back
+    assert 'light_on' not in recent
+
+
+def test_write_of_a_coil_range_matches_any_target_in_it():
+    tracer = CommandTracer()
+    tracer.begin('sauna_on', [(2, 0), (3, 1)])
+    tracer.startProcessing()
+
+    tracer.recordWrite(3, 0)
+    tracer.recordWrite(2, 0, 4)
+    tracer.finishProcessing()
+
+    assert 'sauna_on' not in getRecent(tracer)
+    tracer.recordReadBack(2, float('inf'))
+    assert getRecent(tracer)['sauna_on']['confirmed_ms'] is not None
+
+
+def test_command_without_targets_takes_any_write():
+    tracer = CommandTracer()
+    tracer.begin('target_temp')
+    tracer.startProcessing()
+
+    tracer.recordWrite(5, 10)
+    tracer.recordReadBack(5, 0)
+    assert not getRecent(tracer)
+    tracer.recordReadBack(5, float('inf'))
+
+    assert getRecent(tracer)['target_temp']['confirmed_ms'] is not None
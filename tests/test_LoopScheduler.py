@@ -0,0 +1,64 @@
+import threading
+from util.LoopScheduler import LoopScheduler
+from util.VirtualClock import VirtualClock
+
+
+def test_cycles_start_on_a_fixed_grid():
+    clock = VirtualClock()
+    scheduler = LoopScheduler(1, clock=clock)
+    assert not scheduler.waitForNextCycle()
+
+    startTimes = []
+    for durationSec in [0.3, 0.9, 0.1]:
+        clock.advance(durationSec)
+        assert not scheduler.waitForNextCycle()
+        startTimes.append(clock.now())
+
+    assert startTimes == [1, 2, 3]
+    snapshot = scheduler.getSnapshot()
+    assert (snapshot['cycles'], snapshot['overruns'], snapshot['jitter_max_ms']) == (3, 0, 0)
+    assert snapshot['duration_max_ms'] == 900
+
+
+def test_overrun_starts_the_next_cycle_at_once_and_skips_missed_deadlines():
+    clock = VirtualClock()
+    scheduler = LoopScheduler(1, clock=clock)
+    scheduler.waitForNextCycle()
+
+    clock.advance(2.5)
+    assert not scheduler.waitForNextCycle()
+    assert clock.now() == 2.5
+    snapshot = scheduler.getSnapshot()
+    assert (snapshot['overruns'], snapshot['missed_cycles'], snapshot['jitter_max_ms']) == (1, 1, 500)
+
+    # Back on the grid
+    scheduler.waitForNextCycle()
+    assert clock.now() == 3
+
+
+def test_wake_event_cuts_the_wait_short_without_shifting_the_grid():
+    clock = VirtualClock()
+    scheduler = LoopScheduler(1, clock=clock)
+    scheduler.waitForNextCycle()
+    wakeEvent = threading.Event()
+
+    clock.advance(0.2)
+    wakeEvent.set()
+    assert scheduler.waitForNextCycle(wakeEvent)
+    assert not wakeEvent.is_set()
+    assert clock.now() == 0.2
+
+    assert not scheduler.waitForNextCycle(wakeEvent)
+    assert clock.now() == 1
+    assert scheduler.getSnapshot()['cycles'] == 1
+
+
+def test_wake_time_before_the_deadline_returns_early():
+    clock = VirtualClock()
+    scheduler = LoopScheduler(1, clock=clock)
+    scheduler.waitForNextCycle()
+
+    assert scheduler.waitForNextCycle(threading.Event(), wakeTime=0.4)
+    assert clock.now() == 0.4
+    assert not scheduler.waitForNextCycle(threading.Event(), wakeTime=5)
+    assert clock.now() == 1
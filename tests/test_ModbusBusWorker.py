@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import pytest
+from pymodbus.exceptions import ModbusIOException
+from hardware.ModbusBusWorker import ModbusBusWorker
+from hardware.ModbusStats import ModbusStats
+
+
+class FakeClient:
+
+    connected = True
+
+    async def connect(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class FakeResponse:
+
+    def __init__(self, value):
+        self.value = value
+
+    def isError(self) -> bool:
+        return False
+
+
+@pytest.fixture
+def worker():
+    stats = ModbusStats()
+    worker = ModbusBusWorker(FakeClient, retries=2, stats=stats)
+    worker.stats = stats
+    yield worker
+    worker.stop(5)
+
+
+# Returns a request that completes with value once released is set
+def blockingRequest(value, released: threading.Event):
+    async def request(client):
+        while not released.is_set():
+            await asyncio.sleep(0.001)
+        return FakeResponse(value)
+    return request
+
+
+def test_safety_request_jumps_queued_telemetry(worker):
+    served = []
+    released = threading.Event()
+
+    def request(value):
+        async def execute(client):
+            served.append(value)
+            return FakeResponse(value)
+        return execute
+
+    # Keeps the worker busy while the other requests queue up
+    busy = worker.submit(blockingRequest('busy', released))
+    futures = [worker.submit(request('telemetry'), ModbusBusWorker.PRIORITY_TELEMETRY),
+               worker.submit(request('control'), ModbusBusWorker.PRIORITY_CONTROL),
+               worker.submit(request('heater'), ModbusBusWorker.PRIORITY_SAFETY)]
+    released.set()
+
+    assert busy.result(5).value == 'busy'
+    assert [future.result(5).value for future in futures] == ['telemetry', 'control', 'heater']
+    assert served == ['heater', 'control', 'telemetry']
+
+
+def test_failed_request_is_retried_and_counted(worker):
+    attempts = []
+
+    async def request(client):
+        attempts.append(len(attempts))
+        if len(attempts) < 3:
+            raise ModbusIOException('No response')
+        return FakeResponse(len(attempts))
+
+    assert worker.submit(request, slave=2, functionCode=3).result(5).value == 3
+    entry = worker.stats.getSnapshot()[0]
+    assert (entry['requests'], entry['retries']) == (1, 2)
+
+
+def test_request_fails_once_the_retries_are_used_up(worker):
+    async def request(client):
+        raise ModbusIOException('No response')
+
+    with pytest.raises(ModbusIOException):
+        worker.submit(request, slave=2, functionCode=3).result(5)
+    assert worker.stats.getSnapshot()[0]['retries'] == 2
@@ -0,0 +1,52 @@
+from hardware.ModbusCircuitBreaker import ModbusCircuitBreaker
+from util.VirtualClock import VirtualClock
+
+
+def failTimes(breaker: ModbusCircuitBreaker, slave: int, times: int) -> None:
+    for _ in range(times):
+        breaker.recordFailure(slave)
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = ModbusCircuitBreaker(failureThreshold=3, clock=VirtualClock())
+
+    failTimes(breaker, 2, 2)
+    breaker.recordSuccess(2)
+    failTimes(breaker, 2, 2)
+    assert breaker.allowRequest(2)
+
+    breaker.recordFailure(2)
+    assert not breaker.allowRequest(2)
+    # Other slaves are not affected
+    assert breaker.allowRequest(3)
+    assert breaker.getOpenCircuits() == [{'slave': 2, 'state': 'open', 'failures': 3, 'retry_in_sec': 5}]
+
+
+def test_single_probe_is_let_through_after_the_backoff():
+    clock = VirtualClock()
+    breaker = ModbusCircuitBreaker(failureThreshold=1, initialBackoffSec=5, clock=clock)
+    breaker.recordFailure(2)
+
+    clock.advance(4.9)
+    assert not breaker.allowRequest(2)
+    clock.advance(0.1)
+    assert breaker.allowRequest(2)
+    assert breaker.getOpenCircuits()[0]['state'] == ModbusCircuitBreaker.STATE_HALF_OPEN
+    # The probe is in flight
+    assert not breaker.allowRequest(2)
+
+    breaker.recordSuccess(2)
+    assert breaker.allowRequest(2)
+    assert not breaker.isOpen(2)
+
+
+def test_failed_probe_doubles_the_backoff():
+    clock = VirtualClock()
+    breaker = ModbusCircuitBreaker(failureThreshold=1, initialBackoffSec=5, maxBackoffSec=15, clock=clock)
+    breaker.recordFailure(2)
+
+    for backoffSec in [10, 15, 15]:
+        clock.advance(breaker.getOpenCircuits()[0]['retry_in_sec'])
+        assert breaker.allowRequest(2)
+        breaker.recordFailure(2)
+        assert breaker.getOpenCircuits()[0]['retry_in_sec'] == backoffSec
@@ -0,0 +1,58 @@
+import asyncio
+import time
+import pytest
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.pdu.bit_message import ReadCoilsResponse
+from pymodbus.pdu.register_message import ReadHoldingRegistersResponse
+from hardware.ModbusReplayClient import ModbusReplayClient
+from hardware.ModbusTrafficRecorder import ModbusTrafficRecorder
+
+
+@pytest.fixture
+def capture(tmp_path):
+    fileName = str(tmp_path / 'capture.smtr')
+    recorder = ModbusTrafficRecorder(fileName)
+    recorder.record(100.0, 0.02, 1, 3, 0, 2, None, ReadHoldingRegistersResponse(dev_id=1, registers=[215, 400]))
+    recorder.record(100.5, 0.02, 2, 1, 0, 4, None, ReadCoilsResponse(dev_id=2, bits=[True, False, True, False]))
+    recorder.record(101.0, 0.02, 3, 3, 1, 1, None, ExceptionResponse(3, 2, device_id=3))
+    recorder.record(101.5, 0.3, 3, 3, 1, 1, None, error=ModbusIOException('No response'))
+    recorder.close()
+    return fileName
+
+
+def replay(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_recorded_traffic_is_replayed(capture):
+    client = ModbusReplayClient(capture, speed=0)
+    replay(client.connect())
+
+    assert replay(client.read_holding_registers(0, count=2, device_id=1)).registers == [215, 400]
+    assert replay(client.read_coils(0, count=4, device_id=2)).bits[:4] == [True, False, True, False]
+    assert replay(client.read_holding_registers(1, count=1, device_id=3)).isError()
+    with pytest.raises(ModbusIOException):
+        replay(client.read_holding_registers(1, count=1, device_id=3))
+    assert client.isEndOfCapture()
+
+
+def test_truncated_last_record_is_skipped(capture):
+    with open(capture, 'rb') as captureFile:
+        data = captureFile.read()
+    with open(capture, 'wb') as captureFile:
+        captureFile.write(data[:-3])
+
+    records = ModbusTrafficRecorder.readCapture(capture)
+    assert [record['slave'] for record in records] == [1, 2, 3]
+    assert records[0]['values'] == [215, 400]
+
+
+def test_unanswered_request_times_out(capture):
+    client = ModbusReplayClient(capture, speed=10, timeoutSec=0.5)
+    replay(client.connect())
+
+    startTime = time.monotonic()
+    with pytest.raises(ModbusIOException):
+        replay(client.write_register(5, 1, device_id=1))
+    assert time.monotonic() - startTime >= 0.05
@@ -0,0 +1,41 @@
+import pytest
+from core.SaunaContext import SaunaContext
+from hardware.ModbusTransport import ModbusTransport
+
+
+@pytest.fixture
+def ctx(clock):
+    return SaunaContext(None)
+
+
+def test_serial_port_url_keeps_the_configured_baud_rate(ctx):
+    transport = ModbusTransport.fromContext(ctx, busUrl='/dev/ttyAMA2')
+
+    assert transport.isSerial()
+    assert transport.getName() == f'/dev/ttyAMA2@{ctx.getModbusSerialBaudRate()}'
+
+
+def test_tcp_urls_select_the_gateway(ctx):
+    tcp = ModbusTransport.fromContext(ctx, busUrl='tcp://192.168.1.20:1502')
+    rtuOverTcp = ModbusTransport.fromContext(ctx, busUrl='rtu_over_tcp://192.168.1.21')
+
+    assert tcp.getKey() == (ModbusTransport.TYPE_TCP, '192.168.1.20', 1502)
+    assert rtuOverTcp.getKey() == (ModbusTransport.TYPE_RTU_OVER_TCP, '192.168.1.21', ctx.getModbusTcpPort())
+
+
+def test_serial_ports_share_a_bus_whatever_the_baud_rate(ctx):
+    assert ModbusTransport.fromContext(ctx, 9600, '/dev/ttyAMA2').getKey() \
+           == ModbusTransport.fromContext(ctx, 19200, '/dev/ttyAMA2').getKey()
+
+
+def test_unknown_url_scheme_is_rejected(ctx):
+    with pytest.raises(ValueError):
+        ModbusTransport.fromContext(ctx, busUrl='udp://192.168.1.20:502')
+
+
+def test_replay_ignores_the_bus_url(ctx):
+    ctx.setModbusTransport(ModbusTransport.TYPE_REPLAY)
+    ctx.setModbusReplayFile('capture.jsonl')
+
+    transport = ModbusTransport.fromContext(ctx, busUrl='tcp://192.168.1.20:502')
+    assert transport.getKey() == (ModbusTransport.TYPE_REPLAY, 'capture.jsonl')
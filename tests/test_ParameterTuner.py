@@ -0,0 +1,65 @@
+from configobj import ConfigObj
+from simulator.ParameterTuner import ParameterTuner, _runSession
+
+
+def test_sessions_in_one_process_repeat_and_release_the_controllers(simulatedControllers):
+    tuner = ParameterTuner(targetTempF=150, durationHrs=0.25)
+    session = (tuner._toSettings(tuner.getParameterSets()[0]), {}, 0.25, [], [])
+
+    reports = [_runSession(session) for _ in range(3)]
+
+    for report in reports:
+        report.pop('wall_time_sec')
+        report.pop('speedup')
+    assert reports[0] == reports[1] == reports[2]
+    controllers = simulatedControllers()
+    assert len(controllers) == 3
+    assert all(controller() is None for controller in controllers)
+
+
+def test_run_scores_the_sets_on_the_process_pool():
+    tuner = ParameterTuner(grid={'setHeaterCycleOnPeriodMin': [10, 30]}, targetTempF=150, durationHrs=1)
+
+    results = tuner.run(workers=1)
+
+    assert sorted(result['parameters']['setHeaterCycleOnPeriodMin'] for result in results) == [10, 30]
+    assert results[0]['score'] <= results[1]['score']
+    for result in results:
+        assert result['report']['target_temp_f'] == 150
+        assert result['score'] == tuner.getScore(result['report'])
+
+
+def test_unreached_sessions_rank_by_shortfall():
+    tuner = ParameterTuner()
+    reached = {'time_to_target_min': 60, 'target_temp_f': 190, 'max_temp_f': 191, 'overshoot_f': 1,
+               'temp_variance_after_target_f2': 2, 'contactor_cycles': 20, 'health_false_positives': 0}
+    closer = {'time_to_target_min': None, 'target_temp_f': 190, 'max_temp_f': 184}
+    farther = {'time_to_target_min': None, 'target_temp_f': 190, 'max_temp_f': 170}
+
+    assert tuner.getScore(reached) < ParameterTuner.UNREACHED_SCORE
+    assert ParameterTuner.UNREACHED_SCORE < tuner.getScore(closer) < tuner.getScore(farther)
+
+
+def test_parameter_sets_skip_unused_and_invalid_settings():
+    tuner = ParameterTuner(grid={'setHeaterHighTempMode': [False, True],
+                                 'setHeaterHighTempThresholdF': [160, 170],
+                                 'setWarmUpHysteresisF': [2, 5],
+                                 'setCoolDownHysteresisF': [3]})
+
+    parameterSets = tuner.getParameterSets()
+
+    assert parameterSets == [
+        {'setHeaterHighTempMode': False, 'setWarmUpHysteresisF': 2, 'setCoolDownHysteresisF': 3},
+        {'setHeaterHighTempMode': True, 'setHeaterHighTempThresholdF': 160, 'setWarmUpHysteresisF': 2,
+         'setCoolDownHysteresisF': 3},
+        {'setHeaterHighTempMode': True, 'setHeaterHighTempThresholdF': 170, 'setWarmUpHysteresisF': 2,
+         'setCoolDownHysteresisF': 3}
+    ]
+
+
+def test_ini_uses_the_sauna_ini_keys():
+    config = ConfigObj(ParameterTuner.toIni({'setHeaterCycleOnPeriodMin': 20, 'setWarmUpHysteresisF': 2})
+                       .splitlines())
+
+    assert config['heater_control']['cycle_on_period_min'] == '20'
+    assert config['hot_room_temp_control']['warm_up_hysteresis_below_target_f'] == '2'
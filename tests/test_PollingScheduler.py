@@ -0,0 +1,34 @@
+from hardware.PollingScheduler import PollingScheduler
+from util.VirtualClock import VirtualClock
+
+
+def test_intervals_get_longer_from_heating_to_active_to_idle():
+    scheduler = PollingScheduler(VirtualClock())
+    scheduler.setIntervals(PollingScheduler.SIGNAL_HOT_ROOM, 0, 2, 30)
+
+    assert scheduler.getInterval(PollingScheduler.SIGNAL_HOT_ROOM, PollingScheduler.STATE_HEATING) == 0
+    assert scheduler.getInterval(PollingScheduler.SIGNAL_HOT_ROOM, PollingScheduler.STATE_ACTIVE) == 2
+    assert scheduler.getInterval(PollingScheduler.SIGNAL_HOT_ROOM, PollingScheduler.STATE_IDLE) == 30
+
+
+def test_slow_signal_keeps_its_interval_in_every_state():
+    scheduler = PollingScheduler(VirtualClock())
+    scheduler.setIntervals(PollingScheduler.SIGNAL_RESTING_ROOM, 30, 2, 10)
+
+    for state in (PollingScheduler.STATE_HEATING, PollingScheduler.STATE_ACTIVE, PollingScheduler.STATE_IDLE):
+        assert scheduler.getInterval(PollingScheduler.SIGNAL_RESTING_ROOM, state) == 30
+
+
+def test_signal_is_due_after_the_interval_of_the_current_state():
+    clock = VirtualClock()
+    scheduler = PollingScheduler(clock)
+    scheduler.setIntervals(PollingScheduler.SIGNAL_HOT_ROOM, 0, 2, 30)
+
+    assert scheduler.isDue(PollingScheduler.SIGNAL_HOT_ROOM, PollingScheduler.STATE_ACTIVE)
+    scheduler.markPolled(PollingScheduler.SIGNAL_HOT_ROOM)
+    clock.advance(1)
+    assert scheduler.isDue(PollingScheduler.SIGNAL_HOT_ROOM, PollingScheduler.STATE_HEATING)
+    assert not scheduler.isDue(PollingScheduler.SIGNAL_HOT_ROOM, PollingScheduler.STATE_ACTIVE)
+    clock.advance(1)
+    assert scheduler.isDue(PollingScheduler.SIGNAL_HOT_ROOM, PollingScheduler.STATE_ACTIVE)
+    assert not scheduler.isDue(PollingScheduler.SIGNAL_HOT_ROOM, PollingScheduler.STATE_IDLE)
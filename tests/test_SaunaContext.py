@@ -0,0 +1,165 @@
+import logging
+import os
+import time
+import pytest
+from configobj import ConfigObj
+from core.SaunaContext import SaunaContext
+
+
+@pytest.fixture
+def ctx(clock):
+    return SaunaContext(None)
+
+
+def test_missing_key_is_read_as_the_default_and_added(ctx):
+    del ctx._configObj['polling']
+
+    assert ctx.getIdlePollingIntervalSec() == 30
+    assert ctx._configObj['polling']['idle_interval_sec'] == 30
+
+    ctx.setIdlePollingIntervalSec(60)
+    assert ctx.getIdlePollingIntervalSec() == 60
+
+
+def test_setter_applies_the_timer_interval(ctx, clock):
+    ctx.setMaxSaunaOnTimeHrs(1)
+    ctx.turnSaunaOn()
+
+    assert ctx.getSaunaOnTimer().getDeadline() == clock.now() + 60 * 60
+
+
+def test_settings_update_applies_the_timer_intervals(ctx, clock):
+    ctx.updateSettings({'setMaxSaunaOnTimeHrs': 1, 'setFanRunningTimeAfterSaunaOffHrs': 2})
+
+    ctx.turnSaunaOn()
+    assert ctx.getSaunaOnTimer().getDeadline() == clock.now() + 60 * 60
+    ctx.turnSaunaOff()
+    clock.advance(2 * 60 * 60 - 1)
+    assert ctx.isFanAfterSaunaOffTimerRunning()
+    clock.advance(1)
+    assert not ctx.isFanAfterSaunaOffTimerRunning()
+
+
+def test_failed_settings_update_changes_nothing(ctx, clock, monkeypatch):
+    maxSaunaOnTimeHrs = ctx.getMaxSaunaOnTimeHrs()
+    changedKeys = []
+    ctx.subscribe(changedKeys.append)
+
+    def failingSetter(value):
+        raise ValueError('Invalid target temperature')
+    monkeypatch.setattr(ctx, 'setHotRoomTargetTempF', failingSetter)
+
+    with pytest.raises(ValueError):
+        ctx.updateSettings({'setMaxSaunaOnTimeHrs': 1, 'setHotRoomTargetTempF': 300})
+
+    assert ctx.getMaxSaunaOnTimeHrs() == maxSaunaOnTimeHrs
+    assert changedKeys == []
+    ctx.turnSaunaOn()
+    assert ctx.getSaunaOnTimer().getDeadline() == clock.now() + maxSaunaOnTimeHrs * 60 * 60
+
+
+def test_invalid_value_rejects_the_whole_update(ctx):
+    logLevel = ctx.getLogger().level
+    changedKeys = []
+    ctx.subscribe(changedKeys.append)
+
+    with pytest.raises(ValueError):
+        ctx.updateSettings({'setLogLevel': logging.DEBUG, 'setHeaterCycleOnPeriodMin': 20, 'setFanSpeedPct': 150})
+
+    assert ctx.getLogLevel() != logging.DEBUG
+    assert ctx.getLogger().level == logLevel
+    assert ctx.getHeaterCycleOnPeriodMin() != 20
+    assert changedKeys == []
+
+
+def test_target_above_the_max_temperature_is_rejected(ctx):
+    with pytest.raises(ValueError):
+        ctx.updateSettings({'setHotRoomMaxTempF': 200, 'setTargetTempPresetHigh': 210})
+
+    ctx.updateSettings({'setHotRoomMaxTempF': 220, 'setTargetTempPresetHigh': 210})
+    assert ctx.getTargetTempPresetHigh() == 210
+
+
+def test_log_level_is_applied_after_the_update(ctx):
+    ctx.updateSettings({'setLogLevel': logging.DEBUG, 'setHeaterCycleOnPeriodMin': 20})
+
+    assert ctx.getLogger().level == logging.DEBUG
+
+
+def test_settings_update_publishes_once(ctx):
+    changedKeys = []
+    ctx.subscribe(changedKeys.append, ['hot_room_temp_control'])
+
+    ctx.updateSettings({'setHotRoomTargetTempF': 180, 'setWarmUpHysteresisF': 3, 'setMaxSaunaOnTimeHrs': 2})
+
+    assert changedKeys == [{('hot_room_temp_control', 'target_temp_f'),
+                            ('hot_room_temp_control', 'warm_up_hysteresis_below_target_f')}]
+    assert ctx.getHotRoomTargetTempF() == 180
+
+
+# sauna.ini in an empty directory, written with the defaults and nothing pending
+@pytest.fixture
+def fileCtx(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ctx = SaunaContext('sauna.ini')
+    ctx.setPersistDelaySec(60)
+    ctx.flushConfig()
+    yield ctx
+    ctx.flushConfig()
+
+
+def readTargetTempF() -> str:
+    return ConfigObj('sauna.ini')['hot_room_temp_control']['target_temp_f']
+
+
+def test_setters_write_behind(fileCtx):
+    targetTempF = readTargetTempF()
+
+    fileCtx.setHotRoomTargetTempF(180)
+    assert readTargetTempF() == targetTempF
+
+    fileCtx.flushConfig()
+    assert readTargetTempF() == '180'
+    assert not os.path.exists('sauna.ini.tmp')
+
+
+def test_failed_write_keeps_the_file_and_the_changes(fileCtx, monkeypatch):
+    targetTempF = readTargetTempF()
+    fileCtx.setHotRoomTargetTempF(180)
+
+    def failingFsync(fd):
+        raise OSError('No space left on device')
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'fsync', failingFsync)
+        fileCtx.flushConfig()
+    assert readTargetTempF() == targetTempF
+
+    fileCtx.flushConfig()
+    assert readTargetTempF() == '180'
+
+
+def test_failed_write_is_retried(fileCtx, monkeypatch):
+    fileCtx.setHotRoomTargetTempF(180)
+    # The pending write stays far off, the retry uses the short delay
+    fileCtx.setPersistDelaySec(0.05)
+
+    def failingFsync(fd):
+        raise OSError('No space left on device')
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'fsync', failingFsync)
+        fileCtx.flushConfig()
+        # Retries fail as long as the disk does
+        assert readTargetTempF() != '180'
+
+    # No later setter or flush, the retry writes the changes
+    deadline = time.monotonic() + 5
+    while readTargetTempF() != '180' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert readTargetTempF() == '180'
+
+
+def test_fan_speed_registers_follow_the_number_of_fans_register(ctx):
+    assert [ctx.getFanSpeedRpmAddr(1), ctx.getFanSpeedRpmAddr(2)] == [7, 8]
+
+    ctx.setNumberOfFansAddr(20)
+    assert [ctx.getFanSpeedRpmAddr(1), ctx.getFanSpeedRpmAddr(2)] == [21, 22]
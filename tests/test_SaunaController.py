@@ -0,0 +1,37 @@
+import pytest
+from core.SaunaContext import SaunaContext
+from core.SaunaController import SaunaController
+from core.SaunaErrorMgr import SaunaErrorMgr
+from simulator.SimulatedDevices import SimulatedDevices
+from simulator.ThermalModel import ThermalModel
+
+
+class StopLoop(BaseException):
+    pass
+
+
+def test_control_loop_survives_failed_cycle_with_heater_off(clock, monkeypatch):
+    ctx = SaunaContext(None)
+    errorMgr = SaunaErrorMgr(ctx)
+    sd = SimulatedDevices(ctx, ThermalModel(), clock)
+    controller = SaunaController(ctx, errorMgr, sd)
+    ctx.turnSaunaOn()
+    controller.runCycle()
+    assert sd.isHeaterOn()
+
+    failures = [OSError('Serial port disconnected'), StopLoop()]
+
+    def failingRefresh():
+        raise failures.pop(0)
+    monkeypatch.setattr(sd, 'refreshRegisters', failingRefresh)
+    failedTime = clock.now()
+
+    # The first failure is handled, the second one ends the loop
+    with pytest.raises(StopLoop):
+        controller._run()
+
+    assert not sd.isHeaterOn()
+    assert not ctx.isHeaterOn()
+    assert clock.now() - failedTime >= ctx.getControlLoopPeriodSec()
+    assert any(error['type'] == SaunaErrorMgr.ERROR_CRITICAL and 'Serial port disconnected' in error['message']
+               for error in errorMgr.getAllErrors())
@@ -0,0 +1,140 @@
+import time
+from concurrent.futures import Future
+from pymodbus.exceptions import ModbusIOException
+from core.SaunaContext import SaunaContext
+from core.SaunaErrorMgr import SaunaErrorMgr
+from hardware.SaunaDevices import ModbusReadPlanner, RelayBank, SaunaDevices
+from util.VirtualClock import VirtualClock
+
+
+# Only the parts of SaunaDevices waiting for the bus responses, without opening the buses
+def createDevices() -> SaunaDevices:
+    ctx = SaunaContext(None)
+    sd = SaunaDevices.__new__(SaunaDevices)
+    sd._ctx = ctx
+    sd._errorMgr = SaunaErrorMgr(ctx)
+    sd._profiler = None
+    sd._registerShadow = {}
+    return sd
+
+
+def failedRequest(exception: Exception) -> Future:
+    future = Future()
+    future.set_exception(exception)
+    return future
+
+
+def getModbusErrors(sd: SaunaDevices) -> list:
+    return [error['message'] for error in sd._errorMgr.getAllErrors() if error['type'] == SaunaErrorMgr.ERROR_MODBUS]
+
+
+def test_modbus_exception_returns_error_response():
+    sd = createDevices()
+
+    response = sd._waitForResponse(failedRequest(ModbusIOException('No response')), 1, 3)
+
+    assert response.isError()
+    assert len(getModbusErrors(sd)) == 1
+
+
+def test_other_bus_error_returns_error_response():
+    sd = createDevices()
+
+    response = sd._waitForResponse(failedRequest(OSError('Serial port disconnected')), 1, 6)
+
+    assert response.isError()
+    assert getModbusErrors(sd) == ['Serial port disconnected']
+
+
+def test_read_planner_merges_addresses_within_the_gap():
+    planner = ModbusReadPlanner(maxGap=2)
+
+    assert planner.plan({3: [8, 1, 4, 7, 1]}) == [(3, 1, 8)]
+    assert planner.plan({3: [1, 5]}) == [(3, 1, 1), (3, 5, 1)]
+
+
+def test_read_planner_plans_every_slave_on_its_own():
+    planner = ModbusReadPlanner()
+
+    assert planner.plan({2: [5], 1: [0, 3], 4: []}) == [(1, 0, 4), (2, 5, 1)]
+
+
+def test_read_planner_splits_reads_longer_than_the_modbus_limit():
+    planner = ModbusReadPlanner()
+
+    assert planner.plan({1: range(0, 200, 10)}) == [(1, 0, 121), (1, 130, 61)]
+
+
+def test_relay_bank_writes_changes_only():
+    bank = RelayBank(60, VirtualClock())
+    bank.update(0, [False, True, False, False], [0, 1, 2, 3])
+
+    bank.set(0, True)
+    bank.set(1, True)
+    bank.set(3, True)
+
+    # Coils 1 and 2 are known, so one request covers 0...3
+    assert bank.getPendingWrites() == [(0, [True, True, False, True])]
+    bank.commit(0, [True, True, False, True])
+    assert not bank.hasPendingChanges()
+    assert bank.get(3)
+
+
+def test_relay_bank_reasserts_unchanged_coils_after_the_period():
+    clock = VirtualClock()
+    bank = RelayBank(60, clock)
+    bank.update(0, [False], [0])
+    bank.set(0, True)
+    bank.commit(0, [True])
+
+    clock.advance(59)
+    bank.set(0, True)
+    assert not bank.hasPendingChanges()
+
+    clock.advance(1)
+    bank.set(0, True)
+    assert bank.getPendingWrites() == [(0, [True])]
+
+
+def test_relay_bank_rewrites_a_coil_the_module_lost():
+    bank = RelayBank(60, VirtualClock())
+    bank.set(0, True)
+    bank.commit(0, [True])
+
+    # The relay module has been reset
+    bank.update(0, [False], [0])
+    bank.set(0, True)
+
+    assert bank.getPendingWrites() == [(0, [True])]
+
+
+def test_relay_bank_ignores_wall_clock_jumps(monkeypatch):
+    bank = RelayBank(60, VirtualClock())
+    bank.set(0, True)
+    bank.commit(0, [True])
+
+    monkeypatch.setattr(time, 'time', lambda: 2e9)
+    bank.set(0, True)
+
+    assert not bank.hasPendingChanges()
+
+
+def test_register_write_is_reasserted_after_the_period(clock):
+    sd = createDevices()
+    periodSec = sd._ctx.getModbusWriteReassertPeriodSec()
+    assert sd._isRegisterWriteNeeded(3, 100, 2)
+    sd._shadowRegisterWrite(3, 100, 2)
+
+    assert not sd._isRegisterWriteNeeded(3, 100, 2)
+    assert sd._isRegisterWriteNeeded(3, 50, 2)
+    clock.advance(periodSec)
+    assert sd._isRegisterWriteNeeded(3, 100, 2)
+
+
+def test_register_shadow_ignores_wall_clock_jumps(clock, monkeypatch):
+    sd = createDevices()
+    sd._shadowRegisterWrite(3, 100, 2)
+
+    monkeypatch.setattr(time, 'time', lambda: 2e9)
+
+    assert not sd._isRegisterWriteNeeded(3, 100, 2)
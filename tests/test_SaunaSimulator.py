@@ -0,0 +1,82 @@
+import asyncio
+import socket
+import threading
+import time
+import pytest
+from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ModbusException
+from core.SaunaContext import SaunaContext
+from simulator.FaultInjector import FaultInjector
+from simulator.SaunaSimulator import SaunaSimulator
+from simulator.ThermalModel import ThermalModel
+
+
+def getFreePort() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# Serves a simulator over Modbus TCP on a background event loop. Returns the simulator and a connected client.
+@pytest.fixture
+def serve():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    servers = []
+    clients = []
+
+    def start(faultInjector: FaultInjector = None) -> tuple:
+        ctx = SaunaContext(None)
+        simulator = SaunaSimulator(ctx, ThermalModel(), faultInjector)
+        port = getFreePort()
+        servers.append(asyncio.run_coroutine_threadsafe(simulator.serveTcp('127.0.0.1', port), loop))
+        client = ModbusTcpClient('127.0.0.1', port=port, timeout=0.5, retries=0)
+        clients.append(client)
+        deadline = time.monotonic() + 5
+        while not client.connect():
+            assert time.monotonic() < deadline, 'Simulator did not start'
+            time.sleep(0.05)
+        return ctx, simulator, client
+
+    yield start
+    for client in clients:
+        client.close()
+    for server in servers:
+        server.cancel()
+    # Let the cancelled servers close their sockets before the loop stops
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0.1), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def readTempC(ctx: SaunaContext, client: ModbusTcpClient) -> float:
+    response = client.read_holding_registers(ctx.getTempSensorAddr(), count=1, device_id=ctx.getSaunaSensorsDeviceId())
+    assert not response.isError()
+    return response.registers[0] / 10
+
+
+def test_client_reads_the_temperature_and_switches_the_heater(serve):
+    ctx, simulator, client = serve()
+    assert readTempC(ctx, client) == 20
+
+    response = client.write_coil(ctx.getHeaterRelayCoilAddr(), True, device_id=ctx.getRelayModuleDeviceId())
+    assert not response.isError()
+    simulator.step(10 * 60)
+
+    assert readTempC(ctx, client) > 30
+    response = client.read_coils(ctx.getHeaterRelayCoilAddr(), count=1, device_id=ctx.getRelayModuleDeviceId())
+    assert response.bits[0]
+
+
+def test_dead_slave_does_not_respond(serve):
+    ctx = SaunaContext(None)
+    faultInjector = FaultInjector(deadSlaves={ctx.getFanControlModuleDeviceId()}, tcpFraming=True)
+    ctx, simulator, client = serve(faultInjector)
+
+    with pytest.raises(ModbusException):
+        client.read_holding_registers(ctx.getFanStatusAddr(), count=1, device_id=ctx.getFanControlModuleDeviceId())
+
+    assert readTempC(ctx, client) == 20
+    assert faultInjector.droppedResponses == 1
@@ -0,0 +1,41 @@
+from simulator.SimulationEngine import SimulationEngine
+from simulator.ThermalModel import ThermalModel
+
+
+def withoutWallTime(report: dict) -> dict:
+    return {name: value for name, value in report.items() if name not in ('wall_time_sec', 'speedup')}
+
+
+def test_runs_start_from_the_initial_model_state():
+    model = ThermalModel()
+    initialTempC = model.getHotRoomTempC()
+    engine = SimulationEngine({'setHotRoomTargetTempF': 150}, model)
+
+    firstReport = engine.run(0.5)
+    secondReport = engine.run(0.5)
+
+    assert model.getHotRoomTempC() == initialTempC
+    assert firstReport['max_temp_f'] > SimulationEngine._toF(initialTempC)
+    assert withoutWallTime(firstReport) == withoutWallTime(secondReport)
+
+
+def test_default_session_reaches_the_default_target():
+    report = SimulationEngine().run()
+
+    assert report['time_to_target_min'] is not None
+    assert report['health_false_positives'] == 0
+
+
+def test_settings_are_applied():
+    report = SimulationEngine({'setHotRoomTargetTempF': 150, 'setMaxSaunaOnTimeHrs': 1}).run(2)
+
+    assert report['target_temp_f'] == 150
+    assert report['sauna_off_min'] == 60
+
+
+def test_controller_is_released_after_the_run(simulatedControllers):
+    SimulationEngine().run(0.1)
+
+    controllers = simulatedControllers()
+    assert len(controllers) == 1
+    assert controllers[0]() is None
@@ -0,0 +1,17 @@
+from hardware.SystemMetricsCollector import SystemMetricsCollector
+
+
+def test_metrics_are_collected_once_per_interval_without_a_timer(clock):
+    collector = SystemMetricsCollector(5)
+    try:
+        assert collector.collect()
+        assert 'cpu_temp_c' in collector.getMetrics()
+        # Nothing to wake the control loop for
+        assert clock.timers.getNextDeadline() is None
+
+        clock.advance(4)
+        assert not collector.collect()
+        clock.advance(1)
+        assert collector.collect()
+    finally:
+        collector.close()
@@ -0,0 +1,44 @@
+from util.Timer import Timer
+from util.VirtualClock import VirtualClock
+
+
+def test_next_deadline_is_the_earliest_running_timer():
+    clock = VirtualClock()
+    timers = [Timer(interval, clock) for interval in [30, 10, 20]]
+    for timer in timers:
+        timer.start()
+
+    deadlines = []
+    while (deadline := clock.timers.getNextDeadline()) is not None:
+        deadlines.append(deadline)
+        clock.advance(deadline - clock.now())
+    assert deadlines == [10, 20, 30]
+    assert all(timer.isCompleted() for timer in timers)
+
+
+def test_stopped_and_restarted_timers_leave_no_stale_deadline():
+    clock = VirtualClock()
+    stopped = Timer(5, clock)
+    restarted = Timer(10, clock)
+    stopped.start()
+    restarted.start()
+
+    stopped.stop()
+    restarted.restart(30)
+    assert clock.timers.getNextDeadline() == 30
+
+    restarted.setTimeInterval(15)
+    assert clock.timers.getNextDeadline() == 15
+    clock.advance(15)
+    assert clock.timers.getNextDeadline() is None
+
+
+def test_heap_is_compacted_under_frequent_restarts():
+    clock = VirtualClock()
+    timer = Timer(10, clock)
+    for _ in range(1000):
+        timer.start()
+        clock.advance(0.001)
+
+    assert len(clock.timers._heap) <= 66
+    assert clock.timers.getNextDeadline() == timer.getDeadline()
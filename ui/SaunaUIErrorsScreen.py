@@ -5,8 +5,9 @@ from kivy.uix.label import Label
 from kivy.uix.scrollview import ScrollView
 
 class SaunaUIErrorsScreen(Screen):
-    def __init__(self, errorMgr=None, **kwargs):
+    def __init__(self, ctx=None, errorMgr=None, **kwargs):
         super().__init__(**kwargs)
+        self.ctx = ctx
         self.errorMgr = errorMgr
 
         layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
@@ -112,6 +113,43 @@ class SaunaUIErrorsScreen(Screen):
                 timestamp = error['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
                 self.add_error_item(category, message, timestamp)
 
+        self.add_modbus_stats()
+
+    def add_modbus_stats(self):
+        """Add Modbus request counts and latencies per device to the display"""
+        stats = self.ctx.getModbusStats() if self.ctx else None
+        if not stats:
+            return
+
+        header_label = Label(
+            text='Modbus Statistics',
+            font_size='24sp',
+            bold=True,
+            size_hint_y=None,
+            height=50,
+            color=(0.5, 0.8, 1.0, 1)
+        )
+        self.errors_layout.add_widget(header_label)
+
+        for entry in stats.getSnapshot():
+            failures = entry['timeouts'] + entry['connection_errors'] + entry['exception_responses'] \
+                + entry['other_errors']
+            text = (f"Device {entry['slave']} {entry['function']}: {entry['requests']} requests, "
+                    f"{entry['retries']} retries, {failures} failed ({entry['timeouts']} timeouts)\n"
+                    f"p50 {entry['p50_ms']} ms, p95 {entry['p95_ms']} ms, p99 {entry['p99_ms']} ms, "
+                    f"max {entry['max_ms']} ms")
+            stats_label = Label(
+                text=text,
+                font_size='18sp',
+                size_hint_y=None,
+                height=60,
+                color=(0.8, 0.8, 0.8, 1) if failures == 0 else (1, 0.8, 0.4, 1),
+                halign='left',
+                valign='middle'
+            )
+            stats_label.bind(size=stats_label.setter('text_size'))
+            self.errors_layout.add_widget(stats_label)
+
     def add_error_item(self, category, message, timestamp):
         """Add an error item to the display"""
         error_box = BoxLayout(orientation='vertical', size_hint_y=None, height=130, padding=5)
@@ -240,9 +240,11 @@ class SaunaUIFanScreen(Screen):
             self.right_rpm_value.text = f'{right_rpm} RPM'
 
     def on_ok(self, instance):
-        self._ctx.setRightFanEnabled(self.right_fan_btn.active)
-        self._ctx.setLeftFanEnabled(self.left_fan_btn.active)
-        self._ctx.setFanSpeedPct(int(self.speed_slider.value))
-        self._ctx.setFanRunningTimeAfterSaunaOffHrs(int(self.runtime_slider.value))
-        self._ctx.persist()
+        # Apply all fan settings at once with one write
+        self._ctx.updateSettings({
+            'setRightFanEnabled': self.right_fan_btn.active,
+            'setLeftFanEnabled': self.left_fan_btn.active,
+            'setFanSpeedPct': int(self.speed_slider.value),
+            'setFanRunningTimeAfterSaunaOffHrs': int(self.runtime_slider.value)
+        })
         self.manager.current = 'main'
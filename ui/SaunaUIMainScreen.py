@@ -315,6 +315,10 @@ class SaunaUIMainScreen(Screen):
 
         # Update sensor readings every 2 seconds
         Clock.schedule_interval(self.update_sensors, 1)
+        # Follow target and max temperature changes, e.g. from the web, on the Kivy thread
+        self.ctx.subscribe(self.on_target_temp_change,
+                           [('hot_room_temp_control', 'target_temp_f'), ('hot_room_temp_control', 'max_temp_f')],
+                           lambda function: Clock.schedule_once(lambda dt: function()))
         # Update clock every second
         Clock.schedule_interval(self.update_clock, 1)
         # Check for screen timeout every second
@@ -372,11 +376,6 @@ class SaunaUIMainScreen(Screen):
     def update_sensors(self, dt):
         self.update_temperature_display()
         self.humidity_label.text = f'{int(self.ctx.getHotRoomHumidity())}%'
-        target_temp = int(self.ctx.getHotRoomTargetTempF())
-
-        # Update slider if value differs (to reflect external changes)
-        if hasattr(self, 'temp_slider') and self.temp_slider.value != target_temp:
-            self.temp_slider.value = target_temp
 
         # Wake screen if sauna turns on while screen is off
         if self.ctx.isSaunaOn() and self.screen_is_off:
@@ -440,6 +439,14 @@ class SaunaUIMainScreen(Screen):
         else:
             self.sauna_btn.img.source = self.sauna_passive_img_path
 
+    def on_target_temp_change(self, changed_keys):
+        """Update the slider and the target temperature after a config change"""
+        self.temp_slider.max = self.ctx.getHotRoomMaxTempF()
+        target_temp = int(self.ctx.getHotRoomTargetTempF())
+        if self.temp_slider.value != target_temp:
+            self.temp_slider.value = target_temp
+        self.update_temperature_display()
+
     def on_slider_change(self, instance, value):
         """Handle temperature slider value change"""
         self.ctx.setHotRoomTargetTempF(int(value))
@@ -539,5 +546,10 @@ class SaunaControlApp(App):
         sm.add_widget(SaunaUIFanScreen(name='fan', ctx=self.ctx))
         sm.add_widget(SaunaUIWiFiScreen(name='wifi'))
         sm.add_widget(SaunaUISettingsScreen(name='settings', ctx=self.ctx))
-        sm.add_widget(SaunaUIErrorsScreen(name='errors', errorMgr=self.errorMgr))
-        return sm
\ No newline at end of file
+        sm.add_widget(SaunaUIErrorsScreen(name='errors', ctx=self.ctx, errorMgr=self.errorMgr))
+        return sm
+
+    def on_stop(self):
+        # Write the config changes still waiting for the delayed write
+        if self.ctx:
+            self.ctx.flushConfig()
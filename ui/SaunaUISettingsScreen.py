@@ -295,6 +295,21 @@ class SaunaUISettingsScreen(Screen):
         add_setting('Fan Module Governor Address', str(self._ctx.getFanModuleGovernorAddr()))
         add_setting('Fan Module Reset Governor Value', str(self._ctx.getFanModuleResetGovernorValue()))
 
+        # Control Cycle Profile - Read only
+        add_section_header(system_layout, 'Control Cycle Profile')
+        self.cycle_profile_label = Label(
+            text='',
+            font_size='18sp',
+            size_hint_y=None,
+            color=(0.8, 0.8, 0.8, 1),
+            halign='left',
+            valign='top'
+        )
+        self.cycle_profile_label.bind(width=lambda instance, width: setattr(instance, 'text_size', (width, None)))
+        self.cycle_profile_label.bind(texture_size=lambda instance, size: setattr(instance, 'height', size[1]))
+        system_layout.add_widget(self.cycle_profile_label)
+        self.update_cycle_profile(0)
+
         system_scroll.add_widget(system_layout)
         system_tab.add_widget(system_scroll)
         tab_panel.add_widget(system_tab)
@@ -317,6 +332,7 @@ class SaunaUISettingsScreen(Screen):
 
         # Schedule CPU temperature updates
         Clock.schedule_interval(self.update_cpu_temp, 2)
+        Clock.schedule_interval(self.update_cycle_profile, 2)
 
     def toggle_light_checkbox(self, instance):
         """Toggle light checkbox state"""
@@ -346,45 +362,19 @@ class SaunaUISettingsScreen(Screen):
         """Update CPU temperature display"""
         self.cpu_temp_value.text = f'{self._ctx.getCpuTemp():.1f}'
 
+    def update_cycle_profile(self, dt):
+        """Update control cycle stage and Modbus call durations display"""
+        profiler = self._ctx.getCycleProfiler()
+        if not profiler or not profiler.enabled:
+            self.cycle_profile_label.text = 'Profiler is off'
+            return
+        lines = []
+        for entry in profiler.getSnapshot():
+            name = f"    {entry['call']}" if entry['call'] else entry['stage']
+            lines.append(f"{name}: mean {entry['mean_ms']} ms, p95 {entry['p95_ms']} ms, max {entry['max_ms']} ms")
+        self.cycle_profile_label.text = '\n'.join(lines) if lines else 'No cycles profiled yet'
+
     def save_settings(self, instance):
-        # Save temperature settings
-        self._ctx.setHotRoomMaxTempF(int(self.setting_inputs['Max Hot Room Temperature, °F'].text))
-        self._ctx.setTargetTempPresetMedium(int(self.setting_inputs['Preset Medium Hot Room Temperature, °F'].text))
-        self._ctx.setTargetTempPresetHigh(int(self.setting_inputs['Preset High Hot Room Temperature, °F'].text))
-        self._ctx.setWarmUpHysteresisF(int(self.setting_inputs['Warm Up Hysteresis Below Target, °F'].text))
-        self._ctx.setCoolDownHysteresisF(int(self.setting_inputs['Cool Down Hysteresis Below Target, °F'].text))
-        self._ctx.setCoolingGracePeriodMin(int(self.setting_inputs['Hot Room Cooling Grace Period, minutes'].text))
-        self._ctx.setHeaterHealthWarmupTimeMin(int(self.setting_inputs['Heater Health Check Warmup Time, minutes'].text))
-        self._ctx.setHeaterHealthCooldownTimeMin(int(self.setting_inputs['Heater Health Check Cooldown Time, minutes'].text))
-        self._ctx.setHeaterMaxSafeRuntimeMin(int(self.setting_inputs['Heater Max Safe Runtime, minutes'].text))
-        self._ctx.setHeaterCycleOnPeriodMin(int(self.setting_inputs['Heater Cycle On Period, minutes'].text))
-        self._ctx.setHeaterCycleOffPeriodMin(int(self.setting_inputs['Heater Cycle Off Period, minutes'].text))
-        self._ctx.setHeaterHighTempMode(self.high_temp_mode_checkbox.active)
-        self._ctx.setHeaterHighTempThresholdF(int(self.setting_inputs['High Temp Threshold, °F'].text))
-        self._ctx.setHeaterHighTempCycleOnPeriodMin(int(self.setting_inputs['High Temp Cycle On Period, minutes'].text))
-        self._ctx.setHeaterHighTempCycleOffPeriodMin(int(self.setting_inputs['High Temp Cycle Off Period, minutes'].text))
-        self._ctx.setHotRoomLightAutoOnOff(self.light_checkbox.active)
-        self._ctx.setModbusSerialPort(self.setting_inputs['Modbus Serial Port'].text)
-        self._ctx.setModbusSerialBaudRate(int(self.setting_inputs['Modbus Baud Rate'].text))
-        self._ctx.setModbusSerialTimeout(float(self.setting_inputs['Modbus Timeout, seconds'].text))
-        self._ctx.setModbusSerialRetries(int(self.setting_inputs['Modbus Retries'].text))
-        self._ctx.setTempSensorAddr(int(self.setting_inputs['Temperature Sensor Address'].text))
-        self._ctx.setHumiditySensorAddr(int(self.setting_inputs['Humidity Sensor Address'].text))
-        self._ctx.setHeaterRelayCoilAddr(int(self.setting_inputs['Heater Relay Coil Address'].text))
-        self._ctx.setHotRoomLightCoilAddr(int(self.setting_inputs['Hot Room Light Coil Address'].text))
-        self._ctx.setRightFanRelayCoilAddr(int(self.setting_inputs['Right Fan Relay Coil Address'].text))
-        self._ctx.setLeftFanRelayCoilAddr(int(self.setting_inputs['Left Fan Relay Coil Address'].text))
-        self._ctx.setFanModuleRoomTempAddr(int(self.setting_inputs['Fan Module Room Temp Address'].text))
-        self._ctx.setFanStatusAddr(int(self.setting_inputs['Fan Status Address'].text))
-        self._ctx.setFanSpeedAddr(int(self.setting_inputs['Fan Speed Address'].text))
-        self._ctx.setNumberOfFansAddr(int(self.setting_inputs['Number of Fans Address'].text))
-        self._ctx.setFanFaultStatusAddr(int(self.setting_inputs['Fan Fault Status Address'].text))
-        self._ctx.setFanModuleGovernorAddr(int(self.setting_inputs['Fan Module Governor Address'].text))
-        self._ctx.setFanModuleResetGovernorValue(int(self.setting_inputs['Fan Module Reset Governor Value'].text))
-        self._ctx.setDisplayBrightness(int(self.brightness_slider.value))
-        self._ctx.setCpuWarnTempC(int(self.setting_inputs['CPU Temperature Warning Threshold, °C'].text))
-        self._ctx.setMaxSaunaOnTimeHrs(int(self.setting_inputs['Max Sauna On Time, hours'].text))
-        # Save log level
         log_level_str_to_int = {
             'DEBUG': logging.DEBUG,
             'INFO': logging.INFO,
@@ -393,7 +383,50 @@ class SaunaUISettingsScreen(Screen):
             'CRITICAL': logging.CRITICAL
         }
         selected_log_level = log_level_str_to_int.get(self.log_level_spinner.text, logging.WARNING)
-        self._ctx.setLogLevel(selected_log_level)
-        self._ctx.persist()
+        # Apply all settings at once with one write, none of them if a value is invalid
+        try:
+            self._ctx.updateSettings({
+                'setHotRoomMaxTempF': int(self.setting_inputs['Max Hot Room Temperature, °F'].text),
+                'setTargetTempPresetMedium': int(self.setting_inputs['Preset Medium Hot Room Temperature, °F'].text),
+                'setTargetTempPresetHigh': int(self.setting_inputs['Preset High Hot Room Temperature, °F'].text),
+                'setWarmUpHysteresisF': int(self.setting_inputs['Warm Up Hysteresis Below Target, °F'].text),
+                'setCoolDownHysteresisF': int(self.setting_inputs['Cool Down Hysteresis Below Target, °F'].text),
+                'setCoolingGracePeriodMin': int(self.setting_inputs['Hot Room Cooling Grace Period, minutes'].text),
+                'setHeaterHealthWarmupTimeMin': int(self.setting_inputs['Heater Health Check Warmup Time, minutes'].text),
+                'setHeaterHealthCooldownTimeMin': int(self.setting_inputs['Heater Health Check Cooldown Time, minutes'].text),
+                'setHeaterMaxSafeRuntimeMin': int(self.setting_inputs['Heater Max Safe Runtime, minutes'].text),
+                'setHeaterCycleOnPeriodMin': int(self.setting_inputs['Heater Cycle On Period, minutes'].text),
+                'setHeaterCycleOffPeriodMin': int(self.setting_inputs['Heater Cycle Off Period, minutes'].text),
+                'setHeaterHighTempMode': self.high_temp_mode_checkbox.active,
+                'setHeaterHighTempThresholdF': int(self.setting_inputs['High Temp Threshold, °F'].text),
+                'setHeaterHighTempCycleOnPeriodMin': int(self.setting_inputs['High Temp Cycle On Period, minutes'].text),
+                'setHeaterHighTempCycleOffPeriodMin': int(self.setting_inputs['High Temp Cycle Off Period, minutes'].text),
+                'setHotRoomLightAutoOnOff': self.light_checkbox.active,
+                'setModbusSerialPort': self.setting_inputs['Modbus Serial Port'].text,
+                'setModbusSerialBaudRate': int(self.setting_inputs['Modbus Baud Rate'].text),
+                'setModbusSerialTimeout': float(self.setting_inputs['Modbus Timeout, seconds'].text),
+                'setModbusSerialRetries': int(self.setting_inputs['Modbus Retries'].text),
+                'setTempSensorAddr': int(self.setting_inputs['Temperature Sensor Address'].text),
+                'setHumiditySensorAddr': int(self.setting_inputs['Humidity Sensor Address'].text),
+                'setHeaterRelayCoilAddr': int(self.setting_inputs['Heater Relay Coil Address'].text),
+                'setHotRoomLightCoilAddr': int(self.setting_inputs['Hot Room Light Coil Address'].text),
+                'setRightFanRelayCoilAddr': int(self.setting_inputs['Right Fan Relay Coil Address'].text),
+                'setLeftFanRelayCoilAddr': int(self.setting_inputs['Left Fan Relay Coil Address'].text),
+                'setFanModuleRoomTempAddr': int(self.setting_inputs['Fan Module Room Temp Address'].text),
+                'setFanStatusAddr': int(self.setting_inputs['Fan Status Address'].text),
+                'setFanSpeedAddr': int(self.setting_inputs['Fan Speed Address'].text),
+                'setNumberOfFansAddr': int(self.setting_inputs['Number of Fans Address'].text),
+                'setFanFaultStatusAddr': int(self.setting_inputs['Fan Fault Status Address'].text),
+                'setFanModuleGovernorAddr': int(self.setting_inputs['Fan Module Governor Address'].text),
+                'setFanModuleResetGovernorValue': int(self.setting_inputs['Fan Module Reset Governor Value'].text),
+                'setDisplayBrightness': int(self.brightness_slider.value),
+                'setCpuWarnTempC': int(self.setting_inputs['CPU Temperature Warning Threshold, °C'].text),
+                'setMaxSaunaOnTimeHrs': int(self.setting_inputs['Max Sauna On Time, hours'].text),
+                'setLogLevel': selected_log_level
+            })
+        except (TypeError, ValueError) as e:
+            # Stay on the screen to correct the value
+            self._ctx.getLogger().error(f'Settings not saved: {e}')
+            return
 
         self.manager.current = 'main'
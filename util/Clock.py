@@ -0,0 +1,37 @@
+import threading
+import time
+from util.TimerQueue import TimerQueue
+
+
+# Time source of the timers and the control loop. Monotonic, so NTP adjustments and wall clock jumps do not
+# expire or extend running timers. Timers keep their deadlines in the clock's timer queue, which tells the
+# control loop when the next one expires. Tests and simulations replace the default clock with a VirtualClock.
+class Clock:
+
+    _default = None
+
+    def __init__(self):
+        self.timers = TimerQueue(self)
+
+    @classmethod
+    def getDefault(cls) -> 'Clock':
+        if cls._default is None:
+            cls._default = Clock()
+        return cls._default
+
+    # Timers created without a clock use the default clock from now on
+    @classmethod
+    def setDefault(cls, clock: 'Clock') -> None:
+        cls._default = clock
+
+    # Seconds since an arbitrary point, only differences are meaningful
+    def now(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    # Returns True if the event is set within the timeout
+    def waitForEvent(self, event: threading.Event, timeoutSec: float) -> bool:
+        return event.wait(max(0.0, timeoutSec))
@@ -0,0 +1,165 @@
+import itertools
+import logging
+import threading
+import time
+from array import array
+
+
+# Traces user commands from the moment they enter the context to the relay or register write and its read-back.
+# Every command gets an ID and passes through these steps:
+#
+#   issued     - the UI or the web server changed the context
+#   picked up  - the control loop started to process it
+#   written    - the first Modbus write to one of the command's targets after the pickup succeeded
+#   confirmed  - a read of the written device submitted after the write succeeded
+#
+# The targets of a command are the (slave ID, address) pairs it may write, so writes of other commands or of the
+# control loop itself are not attributed to it. A command without targets takes the first write of any device.
+# A command that needs no write (e.g. the relay is in the requested state already) ends when its processing
+# ends. Latencies from issue to each step are kept per command type in fixed-size rings.
+class CommandTracer:
+
+    _logger: logging.Logger = logging.getLogger('sauna-controller')
+
+    # Latency steps
+    STEP_PICKED_UP = 'picked_up'
+    STEP_WRITTEN = 'written'
+    STEP_CONFIRMED = 'confirmed'
+    STEP_APPLIED = 'applied'       # Last step of every command: confirmed or processed without a write
+    STEPS = [STEP_PICKED_UP, STEP_WRITTEN, STEP_CONFIRMED, STEP_APPLIED]
+
+    def __init__(self, samples: int = 256, recentCommands: int = 20):
+        self._samples = samples
+        self._recentCommands = recentCommands
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # Commands waiting for the control loop
+        self._pending = []
+        # Commands picked up by the control loop and not written yet
+        self._active = []
+        # Written commands waiting for the read-back, {slaveId: [command]}
+        self._written = {}
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            # {commandType: {step: entry}}
+            self._entries = {}
+            self._recent = []
+
+    # Returns the ID of the new command. targets - (slave ID, address) pairs the command may write.
+    def begin(self, commandType: str, targets: list = None) -> int:
+        command = {'id': next(self._ids), 'type': commandType, 'issued': time.monotonic(),
+                   'targets': None if targets is None else frozenset(targets)}
+        with self._lock:
+            self._pending.append(command)
+        self._logger.debug(f'Command {command["id"]} {commandType} issued')
+        return command['id']
+
+    # Call when the control loop starts to process the commands issued so far
+    def startProcessing(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for command in self._pending:
+                command[self.STEP_PICKED_UP] = now
+                self._recordStep(command, self.STEP_PICKED_UP)
+            self._active.extend(self._pending)
+            self._pending = []
+
+    # Call when the control loop has written count addresses of a device starting at address
+    def recordWrite(self, slave: int, address: int, count: int = 1) -> None:
+        now = time.monotonic()
+        written = {(slave, address + offset) for offset in range(count)}
+        with self._lock:
+            remaining = []
+            for command in self._active:
+                if command['targets'] is not None and command['targets'].isdisjoint(written):
+                    remaining.append(command)
+                    continue
+                command[self.STEP_WRITTEN] = now
+                command['slave'] = slave
+                self._recordStep(command, self.STEP_WRITTEN)
+                self._written.setdefault(slave, []).append(command)
+                self._logger.debug(f'Command {command["id"]} {command["type"]} written to device {slave} '
+                                   f'after {self._getLatencyMs(command, self.STEP_WRITTEN)} ms')
+            self._active = remaining
+            # Devices that are never read back must not pile up commands
+            if slave in self._written:
+                del self._written[slave][:-self._samples]
+
+    # Call when a read of the device submitted at submitTime succeeded
+    def recordReadBack(self, slave: int, submitTime: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not self._written.get(slave):
+                return
+            waiting = []
+            for command in self._written.get(slave, []):
+                if submitTime < command[self.STEP_WRITTEN]:
+                    waiting.append(command)
+                    continue
+                command[self.STEP_CONFIRMED] = now
+                self._recordStep(command, self.STEP_CONFIRMED)
+                self._finish(command, now)
+            self._written[slave] = waiting
+
+    # Call when the control loop has finished processing. Commands that needed no write end here.
+    def finishProcessing(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for command in self._active:
+                self._finish(command, now)
+            self._active = []
+
+    def _finish(self, command: dict, now: float) -> None:
+        command[self.STEP_APPLIED] = now
+        self._recordStep(command, self.STEP_APPLIED)
+        self._recent.append({'id': command['id'],
+                             'type': command['type'],
+                             'slave': command.get('slave'),
+                             **{f'{step}_ms': self._getLatencyMs(command, step) for step in self.STEPS}})
+        del self._recent[:-self._recentCommands]
+        self._logger.debug(f'Command {command["id"]} {command["type"]} applied after '
+                           f'{self._getLatencyMs(command, self.STEP_APPLIED)} ms')
+
+    def _getLatencyMs(self, command: dict, step: str):
+        if step not in command:
+            return None
+        return round((command[step] - command['issued']) * 1000, 1)
+
+    def _recordStep(self, command: dict, step: str) -> None:
+        steps = self._entries.setdefault(command['type'], {})
+        entry = steps.get(step)
+        if entry is None:
+            entry = {'count': 0, 'latencies': array('f', [0.0] * self._samples)}
+            steps[step] = entry
+        entry['latencies'][entry['count'] % self._samples] = command[step] - command['issued']
+        entry['count'] += 1
+
+    @staticmethod
+    def _percentile(sortedValues: list, pct: float) -> float:
+        if not sortedValues:
+            return 0.0
+        return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * pct / 100))]
+
+    # Returns latency percentiles in milliseconds from issue to every step per command type,
+    # and the latest commands
+    def getSnapshot(self) -> dict:
+        commands = []
+        with self._lock:
+            for commandType, steps in sorted(self._entries.items()):
+                for step in self.STEPS:
+                    entry = steps.get(step)
+                    if entry is None:
+                        continue
+                    latencies = sorted(entry['latencies'][:min(entry['count'], self._samples)])
+                    commands.append({
+                        'type': commandType,
+                        'step': step,
+                        'count': entry['count'],
+                        'p50_ms': round(self._percentile(latencies, 50) * 1000, 1),
+                        'p95_ms': round(self._percentile(latencies, 95) * 1000, 1),
+                        'p99_ms': round(self._percentile(latencies, 99) * 1000, 1),
+                        'max_ms': round(latencies[-1] * 1000, 1)
+                    })
+            return {'commands': commands, 'recent': list(reversed(self._recent))}
@@ -0,0 +1,87 @@
+import threading
+import time
+from array import array
+
+
+# Times the stages of the control cycle and the calls each stage waits for, e.g. Modbus requests.
+# Every stage and call keeps a fixed-size ring of its latest durations, so the histograms roll over the
+# latest samples. A call is attributed to the stage running in the calling thread, calls from other
+# threads are ignored. Recording costs two clock reads and a ring update.
+class CycleProfiler:
+
+    # Upper histogram bucket bounds, the last bucket counts everything above
+    BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+    def __init__(self, enabled: bool = True, samples: int = 256):
+        self.enabled = enabled
+        self._samples = samples
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # {(stage, call): entry}, call is '' for the stage itself
+        self._entries = {}
+
+    # Runs function as the named stage and returns its result
+    def runStage(self, stage: str, function, *args):
+        if not self.enabled:
+            return function(*args)
+        self._local.stage = stage
+        startTime = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self._record(stage, '', time.perf_counter() - startTime)
+            self._local.stage = None
+
+    # Records a call made by the stage running in this thread
+    def recordCall(self, call: str, durationSec: float) -> None:
+        stage = getattr(self._local, 'stage', None)
+        if self.enabled and stage is not None:
+            self._record(stage, call, durationSec)
+
+    def _record(self, stage: str, call: str, durationSec: float) -> None:
+        with self._lock:
+            entry = self._entries.get((stage, call))
+            if entry is None:
+                entry = {'count': 0, 'durations': array('f', [0.0] * self._samples), 'maxSec': 0.0}
+                self._entries[(stage, call)] = entry
+            entry['durations'][entry['count'] % self._samples] = durationSec
+            entry['count'] += 1
+            entry['maxSec'] = max(entry['maxSec'], durationSec)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries = {}
+
+    @staticmethod
+    def _percentile(sortedValues: list, pct: float) -> float:
+        if not sortedValues:
+            return 0.0
+        return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * pct / 100))]
+
+    def _getHistogram(self, durationsMs: list) -> list:
+        histogram = [0] * (len(self.BUCKETS_MS) + 1)
+        bucket = 0
+        for durationMs in durationsMs:
+            while bucket < len(self.BUCKETS_MS) and durationMs > self.BUCKETS_MS[bucket]:
+                bucket += 1
+            histogram[bucket] += 1
+        return histogram
+
+    # Returns a list of dicts sorted by stage, each stage followed by its calls. Durations are in milliseconds,
+    # mean, percentiles and histogram cover the latest samples.
+    def getSnapshot(self) -> list:
+        snapshot = []
+        with self._lock:
+            for (stage, call), entry in sorted(self._entries.items()):
+                durationsMs = sorted(value * 1000 for value in entry['durations'][:min(entry['count'], self._samples)])
+                snapshot.append({
+                    'stage': stage,
+                    'call': call,
+                    'count': entry['count'],
+                    'mean_ms': round(sum(durationsMs) / len(durationsMs), 2),
+                    'p50_ms': round(self._percentile(durationsMs, 50), 2),
+                    'p95_ms': round(self._percentile(durationsMs, 95), 2),
+                    'max_ms': round(entry['maxSec'] * 1000, 2),
+                    'histogram': self._getHistogram(durationsMs)
+                })
+        return snapshot
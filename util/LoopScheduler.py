@@ -0,0 +1,118 @@
+import math
+import threading
+from array import array
+from util.Clock import Clock
+
+
+# Runs a loop at a fixed rate. Cycle deadlines lie on a fixed grid of periodSec, so the loop does not drift
+# when a cycle takes longer or shorter. A cycle still running at its next deadline is an overrun: the next
+# cycle starts right away and deadlines missed completely are skipped. A wake event or a wake time cuts the
+# wait short, so the caller can handle it between cycles without shifting the deadlines.
+# Keeps cycle durations and start jitter (how late a cycle started after its deadline) in fixed-size rings.
+class LoopScheduler:
+
+    def __init__(self, periodSec: float, samples: int = 256, clock: Clock = None):
+        self._clock = clock if clock else Clock.getDefault()
+        self._periodSec = periodSec
+        self._samples = samples
+        self._lock = threading.Lock()
+        self._nextDeadline = None
+        self._cycleStartTime = None
+        # Duration and overrun of the last cycle, kept while its wait is interrupted by wake events
+        self._pendingCycle = None
+        self.reset()
+
+    def setPeriod(self, periodSec: float) -> None:
+        if periodSec != self._periodSec:
+            self._periodSec = periodSec
+            # Start a new grid from the current cycle
+            self._nextDeadline = None
+
+    def getPeriod(self) -> float:
+        return self._periodSec
+
+    def reset(self) -> None:
+        with self._lock:
+            self._cycles = 0
+            self._overruns = 0
+            self._missedCycles = 0
+            self._durations = array('f', [0.0] * self._samples)
+            self._jitters = array('f', [0.0] * self._samples)
+            self._maxDurationSec = 0.0
+            self._maxJitterSec = 0.0
+
+    # Call at the end of every cycle. Sleeps until the next deadline and returns False when the next cycle is due.
+    # Returns True right away if wakeEvent is set before the deadline and clears it, or at wakeTime (clock time,
+    # e.g. the next timer expiry) if it comes first. Call again after handling the wakeup.
+    def waitForNextCycle(self, wakeEvent: threading.Event = None, wakeTime: float = None) -> bool:
+        now = self._clock.now()
+        if self._cycleStartTime is None or self._nextDeadline is None:
+            # First cycle, nothing to measure yet
+            self._startCycle(now + self._periodSec, now)
+            return False
+
+        if self._pendingCycle is None:
+            durationSec = now - self._cycleStartTime
+            overrun = now > self._nextDeadline
+            missedCycles = 0
+            if overrun and self._periodSec > 0:
+                missedCycles = math.floor((now - self._nextDeadline) / self._periodSec)
+                self._nextDeadline += missedCycles * self._periodSec
+            self._pendingCycle = (durationSec, overrun, missedCycles)
+        deadline = self._nextDeadline
+        if now < deadline:
+            waitUntil = min(deadline, wakeTime) if wakeTime is not None else deadline
+            if wakeEvent is None:
+                self._clock.sleep(waitUntil - now)
+            elif self._clock.waitForEvent(wakeEvent, waitUntil - now) and self._clock.now() < deadline:
+                wakeEvent.clear()
+                return True
+            if waitUntil < deadline:
+                return True
+        startTime = self._clock.now()
+        self._record(self._pendingCycle[0], startTime - deadline, self._pendingCycle[1], self._pendingCycle[2])
+        self._startCycle(deadline + self._periodSec, startTime)
+        return False
+
+    def _startCycle(self, nextDeadline: float, startTime: float) -> None:
+        self._nextDeadline = nextDeadline
+        self._cycleStartTime = startTime
+        self._pendingCycle = None
+
+    def _record(self, durationSec: float, jitterSec: float, overrun: bool, missedCycles: int) -> None:
+        with self._lock:
+            index = self._cycles % self._samples
+            self._durations[index] = durationSec
+            self._jitters[index] = jitterSec
+            self._cycles += 1
+            self._overruns += 1 if overrun else 0
+            self._missedCycles += missedCycles
+            self._maxDurationSec = max(self._maxDurationSec, durationSec)
+            self._maxJitterSec = max(self._maxJitterSec, jitterSec)
+
+    @staticmethod
+    def _percentile(sortedValues: list, pct: float) -> float:
+        if not sortedValues:
+            return 0.0
+        return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * pct / 100))]
+
+    # Returns cycle counters, durations and jitter in milliseconds
+    def getSnapshot(self) -> dict:
+        with self._lock:
+            count = min(self._cycles, self._samples)
+            durations = sorted(self._durations[:count])
+            jitters = sorted(self._jitters[:count])
+            lastIndex = (self._cycles - 1) % self._samples
+            return {
+                'period_ms': round(self._periodSec * 1000, 1),
+                'cycles': self._cycles,
+                'overruns': self._overruns,
+                'missed_cycles': self._missedCycles,
+                'last_duration_ms': round(self._durations[lastIndex] * 1000, 1) if self._cycles else 0.0,
+                'duration_p50_ms': round(self._percentile(durations, 50) * 1000, 1),
+                'duration_p95_ms': round(self._percentile(durations, 95) * 1000, 1),
+                'duration_max_ms': round(self._maxDurationSec * 1000, 1),
+                'jitter_p50_ms': round(self._percentile(jitters, 50) * 1000, 1),
+                'jitter_p95_ms': round(self._percentile(jitters, 95) * 1000, 1),
+                'jitter_max_ms': round(self._maxJitterSec * 1000, 1)
+            }
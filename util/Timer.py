@@ -1,4 +1,4 @@
-import time
+from util.Clock import Clock
 
 
 class Timer:
@@ -7,34 +7,47 @@ class Timer:
     _timeInterval = None
     # Active helps to return "not running" when the timer is stopped
     _active = False
+    # None - the default clock at the time of use
+    _clock: Clock = None
 
-    def __init__(self, timeIntervalSec: int =0):
+    def __init__(self, timeIntervalSec: int =0, clock: Clock = None):
         self._timeInterval = timeIntervalSec
+        self._clock = clock
+
+    def _getClock(self) -> Clock:
+        return self._clock if self._clock else Clock.getDefault()
 
     # Returns True if the timer has been started and has not exceeded preset time
     # Note if the timer has been stopped or never started, it will return False
     def isRunning(self) -> bool:
-        return self._active and time.time() - self._startTime < self._timeInterval
+        return self._active and self._getClock().now() - self._startTime < self._timeInterval
 
-    # Returns True if the timer has finished
+    # Returns True if the timer has finished or has not been started
     def isCompleted(self) -> bool:
-        return time.time() - self._startTime >= self._timeInterval
+        return not self._active or self._getClock().now() - self._startTime >= self._timeInterval
+
+    # Returns the clock time the timer expires at, None if it is not running
+    def getDeadline(self):
+        return self._startTime + self._timeInterval if self._active else None
 
     def setTimeInterval(self, interval):
         self._timeInterval = interval
+        if self._active:
+            self._getClock().timers.schedule(self, self.getDeadline())
 
     def restart(self) -> None:
         self.start()
 
     def restart(self, timeInterval: int) -> None:
-        self._startTime = time.time()
         self._timeInterval = timeInterval
-        self._active = True
+        self.start()
 
     def start(self) -> None:
-        self._startTime = time.time()
+        self._startTime = self._getClock().now()
         self._active = True
+        self._getClock().timers.schedule(self, self.getDeadline())
     
     def stop(self) -> None:
         self._startTime = 0
         self._active = False
+        self._getClock().timers.cancel(self)
@@ -0,0 +1,41 @@
+import heapq
+import itertools
+import threading
+
+
+# Deadlines of all running timers of a clock, ordered in a heap. Restarting or stopping a timer leaves its old
+# entry behind, stale entries are skipped when they reach the top and the heap is compacted once they dominate.
+class TimerQueue:
+
+    def __init__(self, clock):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._heap = []
+        self._sequence = itertools.count()
+        # Current deadline of every running timer, {timer: deadline}
+        self._deadlines = {}
+
+    def schedule(self, timer, deadline: float) -> None:
+        with self._lock:
+            self._deadlines[timer] = deadline
+            heapq.heappush(self._heap, (deadline, next(self._sequence), timer))
+            if len(self._heap) > 64 + 2 * len(self._deadlines):
+                self._heap = [(deadline, next(self._sequence), timer) for timer, deadline in self._deadlines.items()]
+                heapq.heapify(self._heap)
+
+    def cancel(self, timer) -> None:
+        with self._lock:
+            self._deadlines.pop(timer, None)
+
+    # Returns the earliest deadline still ahead, None if no timer is running. Expired timers are dropped.
+    def getNextDeadline(self):
+        now = self._clock.now()
+        with self._lock:
+            while self._heap:
+                deadline, _, timer = self._heap[0]
+                if self._deadlines.get(timer) == deadline and deadline > now:
+                    return deadline
+                heapq.heappop(self._heap)
+                if self._deadlines.get(timer) == deadline:
+                    del self._deadlines[timer]
+            return None
@@ -0,0 +1,28 @@
+import threading
+from util.Clock import Clock
+
+
+# Clock that only moves when advanced. Sleeping and waiting advance it at once, so a control loop runs
+# through hours of simulated time in seconds and every run is repeatable.
+class VirtualClock(Clock):
+
+    def __init__(self, startTime: float = 0.0):
+        super().__init__()
+        self._time = startTime
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return self._time
+
+    def advance(self, seconds: float) -> None:
+        with self._lock:
+            self._time += max(0.0, seconds)
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def waitForEvent(self, event: threading.Event, timeoutSec: float) -> bool:
+        if event.is_set():
+            return True
+        self.advance(timeoutSec)
+        return False
@@ -12,6 +12,7 @@ from flask_limiter.errors import RateLimitExceeded
 from werkzeug.utils import secure_filename
 from core.SaunaContext import SaunaContext
 from core.SaunaErrorMgr import SaunaErrorMgr
+from util.CycleProfiler import CycleProfiler
 
 
 class SaunaWebUIServer:
@@ -280,80 +281,51 @@ class SaunaWebUIServer:
         def api_settings_update():
             """Update settings"""
             data = request.json
-            if 'max_temp_f' in data:
-                self._ctx.setHotRoomMaxTempF(int(data['max_temp_f']))
-            if 'preset_medium' in data:
-                self._ctx.setTargetTempPresetMedium(int(data['preset_medium']))
-            if 'preset_high' in data:
-                self._ctx.setTargetTempPresetHigh(int(data['preset_high']))
-            if 'lower_threshold_f' in data:
-                self._ctx.setWarmUpHysteresisF(int(data['lower_threshold_f']))
-            if 'upper_threshold_f' in data:
-                self._ctx.setCoolDownHysteresisF(int(data['upper_threshold_f']))
-            if 'cooling_grace_period' in data:
-                self._ctx.setCoolingGracePeriodMin(int(data['cooling_grace_period']))
-            if 'warmup_time' in data:
-                self._ctx.setHeaterHealthWarmupTimeMin(int(data['warmup_time']))
-            if 'cooldown_time' in data:
-                self._ctx.setHeaterHealthCooldownTimeMin(int(data['cooldown_time']))
-            if 'max_safe_runtime_min' in data:
-                self._ctx.setHeaterMaxSafeRuntimeMin(int(data['max_safe_runtime_min']))
-            if 'cycle_on_period_min' in data:
-                self._ctx.setHeaterCycleOnPeriodMin(int(data['cycle_on_period_min']))
-            if 'cycle_off_period_min' in data:
-                self._ctx.setHeaterCycleOffPeriodMin(int(data['cycle_off_period_min']))
-            if 'high_temp_mode' in data:
-                self._ctx.setHeaterHighTempMode(data['high_temp_mode'])
-            if 'high_temp_threshold_f' in data:
-                self._ctx.setHeaterHighTempThresholdF(int(data['high_temp_threshold_f']))
-            if 'high_temp_cycle_on_period_min' in data:
-                self._ctx.setHeaterHighTempCycleOnPeriodMin(int(data['high_temp_cycle_on_period_min']))
-            if 'high_temp_cycle_off_period_min' in data:
-                self._ctx.setHeaterHighTempCycleOffPeriodMin(int(data['high_temp_cycle_off_period_min']))
-            if 'serial_port' in data:
-                self._ctx.setModbusSerialPort(data['serial_port'])
-            if 'baud_rate' in data:
-                self._ctx.setModbusSerialBaudRate(int(data['baud_rate']))
-            if 'modbus_timeout' in data:
-                self._ctx.setModbusSerialTimeout(float(data['modbus_timeout']))
-            if 'modbus_retries' in data:
-                self._ctx.setModbusSerialRetries(int(data['modbus_retries']))
-            if 'temp_sensor_addr' in data:
-                self._ctx.setTempSensorAddr(int(data['temp_sensor_addr']))
-            if 'humidity_sensor_addr' in data:
-                self._ctx.setHumiditySensorAddr(int(data['humidity_sensor_addr']))
-            if 'heater_relay_coil_addr' in data:
-                self._ctx.setHeaterRelayCoilAddr(int(data['heater_relay_coil_addr']))
-            if 'hot_room_light_coil_addr' in data:
-                self._ctx.setHotRoomLightCoilAddr(int(data['hot_room_light_coil_addr']))
-            if 'right_fan_relay_coil_addr' in data:
-                self._ctx.setRightFanRelayCoilAddr(int(data['right_fan_relay_coil_addr']))
-            if 'left_fan_relay_coil_addr' in data:
-                self._ctx.setLeftFanRelayCoilAddr(int(data['left_fan_relay_coil_addr']))
-            if 'fan_module_room_temp_addr' in data:
-                self._ctx.setFanModuleRoomTempAddr(int(data['fan_module_room_temp_addr']))
-            if 'fan_status_addr' in data:
-                self._ctx.setFanStatusAddr(int(data['fan_status_addr']))
-            if 'fan_speed_addr' in data:
-                self._ctx.setFanSpeedAddr(int(data['fan_speed_addr']))
-            if 'number_of_fans_addr' in data:
-                self._ctx.setNumberOfFansAddr(int(data['number_of_fans_addr']))
-            if 'fan_fault_status_addr' in data:
-                self._ctx.setFanFaultStatusAddr(int(data['fan_fault_status_addr']))
-            if 'fan_module_governor_addr' in data:
-                self._ctx.setFanModuleGovernorAddr(int(data['fan_module_governor_addr']))
-            if 'fan_module_reset_governor_value' in data:
-                self._ctx.setFanModuleResetGovernorValue(int(data['fan_module_reset_governor_value']))
-            if 'light_auto_on_off' in data:
-                self._ctx.setHotRoomLightAutoOnOff(data['light_auto_on_off'])
-            if 'display_brightness' in data:
-                self._ctx.setDisplayBrightness(int(data['display_brightness']))
-            if 'cpu_temp_warn' in data:
-                self._ctx.setCpuWarnTempC(int(data['cpu_temp_warn']))
-            if 'log_level' in data:
-                self._ctx.setLogLevel(int(data['log_level']))
-            if 'max_sauna_on_time_hrs' in data:
-                self._ctx.setMaxSaunaOnTimeHrs(int(data['max_sauna_on_time_hrs']))
+            # Web setting: (context setter, type, None - as sent)
+            settings = {
+                'max_temp_f': ('setHotRoomMaxTempF', int),
+                'preset_medium': ('setTargetTempPresetMedium', int),
+                'preset_high': ('setTargetTempPresetHigh', int),
+                'lower_threshold_f': ('setWarmUpHysteresisF', int),
+                'upper_threshold_f': ('setCoolDownHysteresisF', int),
+                'cooling_grace_period': ('setCoolingGracePeriodMin', int),
+                'warmup_time': ('setHeaterHealthWarmupTimeMin', int),
+                'cooldown_time': ('setHeaterHealthCooldownTimeMin', int),
+                'max_safe_runtime_min': ('setHeaterMaxSafeRuntimeMin', int),
+                'cycle_on_period_min': ('setHeaterCycleOnPeriodMin', int),
+                'cycle_off_period_min': ('setHeaterCycleOffPeriodMin', int),
+                'high_temp_mode': ('setHeaterHighTempMode', None),
+                'high_temp_threshold_f': ('setHeaterHighTempThresholdF', int),
+                'high_temp_cycle_on_period_min': ('setHeaterHighTempCycleOnPeriodMin', int),
+                'high_temp_cycle_off_period_min': ('setHeaterHighTempCycleOffPeriodMin', int),
+                'serial_port': ('setModbusSerialPort', None),
+                'baud_rate': ('setModbusSerialBaudRate', int),
+                'modbus_timeout': ('setModbusSerialTimeout', float),
+                'modbus_retries': ('setModbusSerialRetries', int),
+                'temp_sensor_addr': ('setTempSensorAddr', int),
+                'humidity_sensor_addr': ('setHumiditySensorAddr', int),
+                'heater_relay_coil_addr': ('setHeaterRelayCoilAddr', int),
+                'hot_room_light_coil_addr': ('setHotRoomLightCoilAddr', int),
+                'right_fan_relay_coil_addr': ('setRightFanRelayCoilAddr', int),
+                'left_fan_relay_coil_addr': ('setLeftFanRelayCoilAddr', int),
+                'fan_module_room_temp_addr': ('setFanModuleRoomTempAddr', int),
+                'fan_status_addr': ('setFanStatusAddr', int),
+                'fan_speed_addr': ('setFanSpeedAddr', int),
+                'number_of_fans_addr': ('setNumberOfFansAddr', int),
+                'fan_fault_status_addr': ('setFanFaultStatusAddr', int),
+                'fan_module_governor_addr': ('setFanModuleGovernorAddr', int),
+                'fan_module_reset_governor_value': ('setFanModuleResetGovernorValue', int),
+                'light_auto_on_off': ('setHotRoomLightAutoOnOff', None),
+                'display_brightness': ('setDisplayBrightness', int),
+                'cpu_temp_warn': ('setCpuWarnTempC', int),
+                'log_level': ('setLogLevel', int),
+                'max_sauna_on_time_hrs': ('setMaxSaunaOnTimeHrs', int)
+            }
+            try:
+                self._ctx.updateSettings({setter: convert(data[name]) if convert else data[name]
+                                          for name, (setter, convert) in settings.items() if name in data})
+            except (TypeError, ValueError) as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
             return jsonify({'success': True})
 
         @self._app.route('/api/errors/get')
@@ -388,6 +360,77 @@ class SaunaWebUIServer:
 
             return jsonify({'errors': errors})
 
+        @self._app.route('/api/modbus/stats')
+        @self._login_required
+        def api_modbus_stats():
+            """Get Modbus request counts and latencies per device and function code"""
+            stats = self._ctx.getModbusStats()
+            breaker = self._ctx.getModbusCircuitBreaker()
+            return jsonify({'devices': stats.getSnapshot() if stats else [],
+                            'open_circuits': breaker.getOpenCircuits() if breaker else []})
+
+        @self._app.route('/api/modbus/stats/reset', methods=['POST'])
+        @self._login_required
+        def api_modbus_stats_reset():
+            """Reset Modbus statistics"""
+            stats = self._ctx.getModbusStats()
+            if stats:
+                stats.reset()
+            return jsonify({'success': True})
+
+        @self._app.route('/api/controller/loop/stats')
+        @self._login_required
+        def api_controller_loop_stats():
+            """Get control loop cycle durations, jitter and overruns"""
+            scheduler = self._ctx.getControlLoopScheduler()
+            return jsonify(scheduler.getSnapshot() if scheduler else {})
+
+        @self._app.route('/api/controller/loop/stats/reset', methods=['POST'])
+        @self._login_required
+        def api_controller_loop_stats_reset():
+            """Reset control loop statistics"""
+            scheduler = self._ctx.getControlLoopScheduler()
+            if scheduler:
+                scheduler.reset()
+            return jsonify({'success': True})
+
+        @self._app.route('/api/controller/profile')
+        @self._login_required
+        def api_controller_profile():
+            """Get control cycle stage and Modbus call durations"""
+            profiler = self._ctx.getCycleProfiler()
+            return jsonify({'enabled': profiler.enabled if profiler else False,
+                            'buckets_ms': CycleProfiler.BUCKETS_MS,
+                            'stages': profiler.getSnapshot() if profiler else []})
+
+        @self._app.route('/api/controller/profile/reset', methods=['POST'])
+        @self._login_required
+        def api_controller_profile_reset():
+            """Reset control cycle stage durations"""
+            profiler = self._ctx.getCycleProfiler()
+            if profiler:
+                profiler.reset()
+            return jsonify({'success': True})
+
+        @self._app.route('/api/controller/commands')
+        @self._login_required
+        def api_controller_commands():
+            """Get user command latencies from issue to relay write and read-back"""
+            return jsonify(self._ctx.getCommandTracer().getSnapshot())
+
+        @self._app.route('/api/controller/commands/reset', methods=['POST'])
+        @self._login_required
+        def api_controller_commands_reset():
+            """Reset user command latencies"""
+            self._ctx.getCommandTracer().reset()
+            return jsonify({'success': True})
+
+        @self._app.route('/api/system/metrics')
+        @self._login_required
+        def api_system_metrics():
+            """Get CPU temperature, load, memory and throttling state"""
+            return jsonify(self._ctx.getSystemMetrics())
+
         @self._app.route('/api/errors/clear', methods=['POST'])
         @self._login_required
         def api_errors_clear():